@@ -7,10 +7,9 @@ from .models import Customer, Seller
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'email', 'phone', 'user', 'date_created', 'delete_button')
-    list_filter = ('date_created',)
+    list_select_related = ('user',)
     search_fields = ('name', 'email', 'phone', 'user__username')
     readonly_fields = ('date_created',)
-    date_hierarchy = 'date_created'
     raw_id_fields = ('user',)
     
     def delete_button(self, obj):
@@ -48,10 +47,10 @@ class CustomerAdmin(admin.ModelAdmin):
 @admin.register(Seller)
 class SellerAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'email', 'phone', 'user', 'is_active', 'is_verified', 'is_blocked', 'date_created', 'delete_button')
-    list_filter = ('is_active', 'is_verified', 'is_blocked', 'date_created')
+    list_select_related = ('user',)
+    list_filter = ('is_active', 'is_verified', 'is_blocked')
     search_fields = ('name', 'email', 'phone', 'user__username')
     readonly_fields = ('date_created',)
-    date_hierarchy = 'date_created'
     raw_id_fields = ('user',)
     
     def delete_button(self, obj):
@@ -0,0 +1,78 @@
+"""
+Поток Server-Sent Events с уведомлениями и сменой статусов заказов.
+
+Под ASGI соединение держит только корутина, ожидающая очередь подписки: тысячи
+открытых вкладок не занимают потоков. Под WSGI поток на соединение слишком дорог,
+поэтому ответ сразу закрывается с retry - браузер сам переподключится позже.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from apps.core import events
+from apps.core.instrumentation import query_budget
+from apps.core.models import Notification
+from apps.core.notifications import unread_count
+
+
+# Комментарий-пинг не дает прокси закрыть молчащее соединение
+HEARTBEAT_SECONDS = 15
+# Пауза перед переподключением браузера, мс
+RETRY_MS = 5000
+WSGI_RETRY_MS = 60000
+# Сколько пропущенных уведомлений досылается при переподключении с Last-Event-ID
+REPLAY_LIMIT = 50
+
+
+def missed_notifications(user, last_event_id):
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        return []
+    # Прочитанные в другой вкладке не досылаются: каждое событие notification
+    # увеличивает значок на странице
+    queryset = Notification.objects.filter(user=user, is_read=False, pk__gt=last_id)
+    return list(queryset.order_by('pk')[:REPLAY_LIMIT])
+
+
+async def event_stream(user, unread, last_event_id):
+    # Подписка раньше чтения пропущенного: уведомление, созданное между ними, не теряется
+    async with events.get_broker().subscribe(events.user_channel(user.pk)) as subscription:
+        yield f'retry: {RETRY_MS}\n\n'
+        replayed = 0
+        for notification in await sync_to_async(missed_notifications)(user, last_event_id):
+            replayed = notification.pk
+            yield events.format_event('notification', events.notification_data(notification), notification.pk)
+        # Число непрочитанных уже включает досланные уведомления, поэтому приходит
+        # после них и заменяет значение, увеличенное на странице
+        yield unread
+        while True:
+            try:
+                message = await subscription.get(HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if message['event'] == 'notification' and message['id'] <= replayed:
+                continue
+            yield events.format_event(message['event'], message['data'], message['id'])
+
+
+@query_budget(4)
+async def notification_stream(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    unread = events.format_event('unread', {'count': await sync_to_async(unread_count)(user)})
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(f'retry: {WSGI_RETRY_MS}\n\n{unread}', content_type='text/event-stream')
+
+    response = StreamingHttpResponse(
+        event_stream(user, unread, request.headers.get('Last-Event-ID')), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,82 @@
+"""
+Массовые действия продавца над товарами.
+
+Каждое действие выполняется одним UPDATE по выбранным или отфильтрованным товарам
+продавца, без загрузки моделей и вызова save(). Удаление, как в админке, снимает
+товары с продажи и ставит их в очередь DeletionJob: каскадные строки (просмотры,
+позиции заказов) порциями удаляет команда process_deletions. Изменение цены
+записывается в историю цен, а снижение еще и ставит товары в очередь оповещений по
+избранному - каждое одним bulk_create.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from apps.catalog.alerts import record_price_drops
+from apps.catalog.models import Product
+from apps.catalog.prices import record_price_changes
+from apps.core.deletion import schedule_deletion
+
+
+ACTIONS = {
+    'activate': 'Активировать',
+    'deactivate': 'Снять с продажи',
+    'mark_sold': 'Отметить проданными',
+    'price_percent': 'Изменить цену на %',
+    'price_fixed': 'Изменить цену на сумму',
+    'delete': 'Удалить',
+}
+
+PRICE_ACTIONS = {'price_percent', 'price_fixed'}
+
+
+def price_expression(action, value):
+    price = DecimalField(max_digits=10, decimal_places=2)
+    if action == 'price_percent':
+        changed = F('price') * Value(1 + value / Decimal(100), output_field=price)
+    else:
+        changed = F('price') + Value(value, output_field=price)
+    return Greatest(Round(changed, 2, output_field=price), Value(Decimal('0.00'), output_field=price))
+
+
+def apply_bulk_action(seller, queryset, action, value=None):
+    """Применяет действие к товарам продавца из queryset, возвращает число затронутых товаров"""
+    queryset = queryset.filter(seller=seller).order_by()
+    with transaction.atomic():
+        # Прежние цены нужны истории цен, а при снижении - очереди оповещений по избранному
+        price_action = action in PRICE_ACTIONS
+        if price_action:
+            old_prices = list(queryset.values_list('id', 'price'))
+            product_ids = [pk for pk, _ in old_prices]
+        else:
+            product_ids = list(queryset.values_list('id', flat=True))
+        if not product_ids:
+            return 0
+
+        if action == 'delete':
+            count = queryset.update(is_active=False, updated_at=timezone.now())
+            schedule_deletion(Product.objects.filter(pk__in=product_ids), seller.user)
+        else:
+            if action == 'activate':
+                changes = {'is_active': True}
+            elif action == 'deactivate':
+                changes = {'is_active': False}
+            elif action == 'mark_sold':
+                changes = {'is_sold': True, 'quantity': 0}
+            elif action in PRICE_ACTIONS:
+                changes = {'price': price_expression(action, value)}
+            else:
+                raise ValueError(f'Неизвестное действие: {action}')
+            # update() не обновляет auto_now-поля
+            count = queryset.update(**changes, updated_at=timezone.now())
+            if price_action:
+                record_price_changes(
+                    Product.objects.filter(id__in=product_ids).values_list('id', 'price', 'brand_id', 'category_id'),
+                    dict(old_prices),
+                )
+                if value < 0:
+                    record_price_drops(old_prices)
+    return count
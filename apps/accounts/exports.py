@@ -0,0 +1,227 @@
+"""
+Потоковая выгрузка данных продавца в CSV и XLSX.
+
+Строки читаются через values_list(...).iterator(chunk_size=...) без создания моделей
+и сразу отдаются клиенту, поэтому память не растет с числом строк, а первый байт
+уходит до окончания чтения из базы.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from apps.catalog.models import Product, Review
+from apps.orders.models import OrderItem
+
+
+CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'products': {
+        'title': 'Товары',
+        'columns': [
+            ('id', 'ID'),
+            ('title', 'Название'),
+            ('category__name', 'Категория'),
+            ('brand__name', 'Бренд'),
+            ('size__display_value', 'Размер'),
+            ('price', 'Цена'),
+            ('quantity', 'Количество'),
+            ('condition', 'Состояние'),
+            ('is_active', 'Активен'),
+            ('is_sold', 'Продан'),
+            ('created_at', 'Создан'),
+        ],
+        'queryset': lambda seller: Product.objects.filter(seller=seller).order_by('-created_at'),
+    },
+    'sales': {
+        'title': 'Продажи',
+        'columns': [
+            ('order_id', 'Заказ'),
+            ('order__created_at', 'Дата заказа'),
+            ('order__status', 'Статус'),
+            ('product_id', 'ID товара'),
+            ('product__title', 'Товар'),
+            ('quantity', 'Количество'),
+            ('price', 'Цена'),
+            ('order__customer__name', 'Покупатель'),
+        ],
+        'queryset': lambda seller: OrderItem.objects.filter(product__seller=seller).order_by('-order__created_at'),
+    },
+    'reviews': {
+        'title': 'Отзывы',
+        'columns': [
+            ('created_at', 'Дата'),
+            ('product_id', 'ID товара'),
+            ('product__title', 'Товар'),
+            ('customer__name', 'Покупатель'),
+            ('rating', 'Оценка'),
+            ('comment', 'Комментарий'),
+            ('is_approved', 'Одобрен'),
+        ],
+        'queryset': lambda seller: Review.objects.filter(seller=seller).order_by('-created_at'),
+    },
+}
+
+
+def export_rows(kind, seller):
+    export = EXPORTS[kind]
+    fields = [field for field, _ in export['columns']]
+    return export['queryset'](seller).values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+def export_header(kind):
+    return [label for _, label in EXPORTS[kind]['columns']]
+
+
+def chunked_rows(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def format_value(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if value is None:
+        return ''
+    return value
+
+
+# Ячейки CSV, которые табличный редактор принял бы за формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_value(value):
+    """Строки от пользователей с префиксом формулы экранируются апострофом; в XLSX они inlineStr"""
+    value = format_value(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """Буфер для csv.writer: write возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel распознал UTF-8
+    yield '\ufeff' + writer.writerow(header)
+    for chunk in chunked_rows(rows):
+        yield ''.join(writer.writerow([csv_value(value) for value in row]) for row in chunk)
+
+
+class ZipStream:
+    """Поток без seek для zipfile: накапливает записанные байты до следующего чтения"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def read(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+
+def xlsx_cell(value):
+    value = format_value(value)
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(number, values):
+    return f'<row r="{number}">{"".join(xlsx_cell(value) for value in values)}</row>'
+
+
+def stream_xlsx(title, header, rows):
+    """
+    Минимальная книга XLSX из одного листа со строками inlineStr. zipfile пишет
+    в поток без seek, поэтому архив отдается по частям по мере чтения строк.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(title=escape(title)))
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(xlsx_row(1, header).encode())
+            yield stream.read()
+            number = 1
+            for chunk in chunked_rows(rows):
+                parts = []
+                for row in chunk:
+                    number += 1
+                    parts.append(xlsx_row(number, row))
+                sheet.write(''.join(parts).encode())
+                yield stream.read()
+            sheet.write(b'</sheetData></worksheet>')
+    yield stream.read()
@@ -1,6 +1,9 @@
+import zipfile
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
+from .bulk_actions import ACTIONS, PRICE_ACTIONS
 from .models import Customer, Seller
 from .validators import normalize_phone
 
@@ -117,3 +120,68 @@ class UserLoginForm(AuthenticationForm):
         })
     )
 
+
+
+class ProductImportForm(forms.Form):
+    csv_file = forms.FileField(
+        label='Файл CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-input', 'accept': '.csv,text/csv'})
+    )
+    images = forms.FileField(
+        label='Архив изображений (zip)',
+        required=False,
+        widget=forms.ClearableFileInput(attrs={'class': 'form-input', 'accept': '.zip,application/zip'})
+    )
+    
+    def clean_csv_file(self):
+        csv_file = self.cleaned_data['csv_file']
+        if not csv_file.name.lower().endswith('.csv'):
+            raise forms.ValidationError('Загрузите файл в формате CSV')
+        return csv_file
+    
+    def clean_images(self):
+        images = self.cleaned_data.get('images')
+        if images and not zipfile.is_zipfile(images):
+            raise forms.ValidationError('Архив изображений должен быть в формате zip')
+        if images:
+            images.seek(0)
+        return images
+
+
+class ProductBulkActionForm(forms.Form):
+    action = forms.ChoiceField(
+        label='Действие',
+        choices=list(ACTIONS.items()),
+        widget=forms.Select(attrs={'class': 'form-input'})
+    )
+    value = forms.DecimalField(
+        label='Значение',
+        required=False,
+        max_digits=10,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-input', 'placeholder': '-10', 'step': '0.01'})
+    )
+    scope = forms.ChoiceField(
+        choices=[('selected', 'Выбранные'), ('filtered', 'Все по фильтру')],
+        initial='selected',
+        widget=forms.RadioSelect
+    )
+    ids = forms.TypedMultipleChoiceField(coerce=int, required=False)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Принадлежность товаров продавцу проверяется при выполнении действия
+        self.fields['ids'].valid_value = lambda value: str(value).isdigit()
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        value = cleaned_data.get('value')
+        if action in PRICE_ACTIONS:
+            if value is None:
+                self.add_error('value', 'Укажите, на сколько изменить цену')
+            elif action == 'price_percent' and value <= -100:
+                self.add_error('value', 'Снижение не может быть 100% и более')
+        if cleaned_data.get('scope') == 'selected' and not cleaned_data.get('ids'):
+            raise forms.ValidationError('Выберите товары')
+        return cleaned_data
@@ -0,0 +1,287 @@
+"""
+Массовый импорт товаров продавца из CSV и zip-архива изображений.
+
+Справочники (категории, бренды, размеры) загружаются один раз в словари,
+изображения проверяются и сохраняются в пуле потоков, товары и ProductImage создаются
+через bulk_create порциями, каждая порция - в своей транзакции. Ошибочные строки
+пропускаются и попадают в отчет с номером строки.
+"""
+import csv
+import io
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from pathlib import PurePosixPath
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.validators import DecimalValidator
+from django.db import DatabaseError, transaction
+from PIL import Image, UnidentifiedImageError
+
+from apps.catalog.models import Brand, Category, Product, ProductCondition, ProductImage
+from apps.catalog.prices import record_price_changes
+from apps.catalog.references import get_references
+from apps.core.storage import product_image_storage
+from apps.catalog.utils import bulk_create_with_unique_slugs
+
+
+CHUNK_SIZE = 1000
+IMAGE_WORKERS = 8
+MAX_IMAGE_SIDE = 2000
+# Размер распакованного файла из архива: маленькая запись zip может распаковаться
+# в гигабайты, а читается целиком в памяти, причем в нескольких потоках сразу
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_ERRORS = 1000
+
+# Заголовки CSV: имена полей и подписи колонок выгрузки товаров
+COLUMNS = {
+    'title': ('title', 'Название'),
+    'description': ('description', 'Описание'),
+    'category': ('category', 'Категория'),
+    'brand': ('brand', 'Бренд'),
+    'size': ('size', 'Размер'),
+    'price': ('price', 'Цена'),
+    'quantity': ('quantity', 'Количество'),
+    'condition': ('condition', 'Состояние'),
+    'is_active': ('is_active', 'Активен'),
+    'images': ('images', 'Изображения'),
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'да', '+'}
+
+# Цена проверяется по ограничениям поля: иначе одна строка роняет bulk_create всей порции
+PRICE_FIELD = Product._meta.get_field('price')
+PRICE_VALIDATOR = DecimalValidator(PRICE_FIELD.max_digits, PRICE_FIELD.decimal_places)
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.images = 0
+        self.rows = 0
+        self.errors = []
+        self.duration = 0.0
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def skipped(self):
+        return self.rows - self.created
+
+
+class ProductImporter:
+    def __init__(self, seller, chunk_size=CHUNK_SIZE, workers=IMAGE_WORKERS):
+        self.seller = seller
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.report = ImportReport()
+
+    def run(self, csv_file, images_zip=None):
+        started = time.perf_counter()
+        self.load_references()
+        rows = self.parse(csv_file)
+        self.create_references(rows)
+        archive = zipfile.ZipFile(images_zip) if images_zip else None
+        try:
+            stored = self.store_images(rows, archive)
+        finally:
+            if archive:
+                archive.close()
+        self.create_products(rows, stored)
+        self.report.duration = time.perf_counter() - started
+        return self.report
+
+    def load_references(self):
+        references = get_references()
+        self.categories = {
+            name: (category.pk, category.size_type) for name, category in references.by_name[Category].items()
+        }
+        self.brands = {name: brand.pk for name, brand in references.by_name[Brand].items()}
+        self.sizes = {}
+        for size in references.sizes:
+            self.sizes.setdefault((size.size_type, size.value.lower()), size.pk)
+            self.sizes.setdefault((None, size.value.lower()), size.pk)
+        self.conditions = {}
+        for value, label in ProductCondition.choices:
+            self.conditions[value] = value
+            self.conditions[label.lower()] = value
+
+    def parse(self, csv_file):
+        """Проверяет строки без обращения к базе; возвращает (номер строки, данные) корректных строк"""
+        reader = csv.DictReader(io.TextIOWrapper(csv_file, encoding='utf-8-sig', newline=''))
+        try:
+            fieldnames = reader.fieldnames or []
+        except (UnicodeDecodeError, csv.Error):
+            self.report.error(1, 'Не удалось прочитать заголовок: сохраните CSV в UTF-8')
+            return []
+        headers = {}
+        for field, aliases in COLUMNS.items():
+            for alias in aliases:
+                if alias in fieldnames:
+                    headers[field] = alias
+                    break
+        if 'title' not in headers or 'price' not in headers:
+            self.report.error(1, 'В файле нет обязательных колонок title и price')
+            return []
+
+        rows = []
+        try:
+            for row in reader:
+                self.report.rows += 1
+                values = {field: (row.get(header) or '').strip() for field, header in headers.items()}
+                try:
+                    rows.append((reader.line_num, self.clean(values)))
+                except ValueError as e:
+                    self.report.error(reader.line_num, str(e))
+        except UnicodeDecodeError:
+            # Строки декодируются порциями: уже прочитанные могут быть искажены, файл отклоняется целиком
+            self.report.error(reader.line_num + 1, 'Файл не в кодировке UTF-8: сохраните CSV в UTF-8')
+            return []
+        except csv.Error as e:
+            self.report.error(reader.line_num + 1, f'Не удалось прочитать CSV: {e}')
+            return []
+        return rows
+
+    def clean(self, values):
+        if not values['title']:
+            raise ValueError('Не указано название')
+        try:
+            price = Decimal(values['price'].replace(',', '.').replace(' ', ''))
+        except InvalidOperation:
+            raise ValueError(f"Неверная цена: {values['price']}")
+        if not price.is_finite():
+            raise ValueError(f"Неверная цена: {values['price']}")
+        if price < 0:
+            raise ValueError('Цена не может быть отрицательной')
+        try:
+            PRICE_VALIDATOR(price)
+        except ValidationError:
+            raise ValueError(
+                f"Неверная цена: {values['price']} - не больше {PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places} "
+                f"цифр до запятой и {PRICE_FIELD.decimal_places} после"
+            )
+        quantity = values.get('quantity') or '1'
+        if not quantity.isdigit():
+            raise ValueError(f'Неверное количество: {quantity}')
+        condition = values.get('condition', '').lower() or ProductCondition.GOOD
+        if condition not in self.conditions:
+            raise ValueError(f"Неизвестное состояние: {values['condition']}")
+        active = values.get('is_active', '')
+
+        return {
+            'title': values['title'][:200],
+            'description': values.get('description', ''),
+            'category': values.get('category', ''),
+            'brand': values.get('brand', ''),
+            'size': values.get('size', ''),
+            'price': price,
+            'quantity': int(quantity),
+            'condition': self.conditions[condition],
+            'is_active': active.lower() in TRUE_VALUES if active else True,
+            'images': [name.strip() for name in values.get('images', '').split(';') if name.strip()],
+        }
+
+    def create_references(self, rows):
+        """Недостающие категории и бренды создаются одним bulk_create на справочник"""
+        for model, names, key in (
+            (Category, self.categories, 'category'),
+            (Brand, self.brands, 'brand'),
+        ):
+            missing = {}
+            for _, data in rows:
+                name = data[key]
+                if name and name.lower() not in names:
+                    missing.setdefault(name.lower(), name)
+            if not missing:
+                continue
+            bulk_create_with_unique_slugs(model, [model(name=name) for name in missing.values()])
+            for pk, name in model.objects.filter(name__in=missing.values()).values_list('id', 'name'):
+                names.setdefault(name.lower(), (pk, None) if model is Category else pk)
+
+    def store_images(self, rows, archive):
+        """Проверяет и сохраняет все упомянутые изображения в пуле потоков; имя в архиве -> путь в хранилище"""
+        names = {name for _, data in rows for name in data['images']}
+        if not names:
+            return {}
+        if archive is None:
+            return {name: ValueError('Архив изображений не загружен') for name in names}
+        members = set(archive.namelist())
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(lambda name: self.store_image(archive, members, name), sorted(names))
+            return dict(zip(sorted(names), results))
+
+    def store_image(self, archive, members, name):
+        if name not in members:
+            return ValueError(f'Файл {name} не найден в архиве')
+        size = archive.getinfo(name).file_size
+        if size > MAX_IMAGE_BYTES:
+            return ValueError(f'Файл {name} слишком большой: {size} байт, допустимо до {MAX_IMAGE_BYTES}')
+        try:
+            data = archive.read(name)
+            with Image.open(io.BytesIO(data)) as image:
+                image.verify()
+            with Image.open(io.BytesIO(data)) as image:
+                if max(image.size) > MAX_IMAGE_SIDE:
+                    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+                    buffer = io.BytesIO()
+                    image.convert('RGB').save(buffer, 'JPEG', quality=85)
+                    data = buffer.getvalue()
+                    name = str(PurePosixPath(name).with_suffix('.jpg'))
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, zipfile.BadZipFile) as e:
+            return ValueError(f'Файл {name} не является изображением: {e}')
+        # Хранилище изображений называет файл по хешу: одинаковые фото сохраняются один раз
+        return product_image_storage().save(f'products/images/{PurePosixPath(name).name}', ContentFile(data))
+
+    def create_products(self, rows, stored):
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = []
+            for line, data in rows[start:start + self.chunk_size]:
+                errors = [stored[name] for name in data['images'] if isinstance(stored[name], Exception)]
+                if errors:
+                    self.report.error(line, str(errors[0]))
+                else:
+                    chunk.append((line, data))
+            if not chunk:
+                continue
+            try:
+                with transaction.atomic():
+                    products = Product.objects.bulk_create([self.build(data) for _, data in chunk])
+                    images = ProductImage.objects.bulk_create([
+                        ProductImage(product=product, image=stored[name], order=order, is_main=order == 0)
+                        for product, (_, data) in zip(products, chunk)
+                        for order, name in enumerate(data['images'])
+                    ])
+                    record_price_changes([
+                        (product.pk, product.price, product.brand_id, product.category_id) for product in products
+                    ])
+            except DatabaseError as e:
+                for line, _ in chunk:
+                    self.report.error(line, f'Ошибка сохранения: {e}')
+                continue
+            self.report.created += len(products)
+            self.report.images += len(images)
+
+        # Файлы строк, которые не попали в базу, удаляет collect_media: тот же файл
+        # может быть общим с уже существующими изображениями
+
+    def build(self, data):
+        category_id, size_type = self.categories.get(data['category'].lower(), (None, None))
+        size_key = data['size'].lower()
+        size_id = self.sizes.get((size_type, size_key)) or self.sizes.get((None, size_key))
+        return Product(
+            seller=self.seller,
+            title=data['title'],
+            description=data['description'],
+            category_id=category_id,
+            brand_id=self.brands.get(data['brand'].lower()),
+            size_id=size_id,
+            custom_size=data['size'] if data['size'] and not size_id else None,
+            price=data['price'],
+            quantity=data['quantity'],
+            condition=data['condition'],
+            is_active=data['is_active'],
+        )
@@ -0,0 +1,72 @@
+"""
+Создание и редактирование товара продавцом.
+
+Форма товара и формсет изображений проверяются вместе до записи: категория и
+бренд ищутся один раз (кеш справочников, при промахе - один запрос), недостающие
+создаются уже при сохранении. Товар и изображения записываются в одной транзакции:
+новые изображения - одним bulk_create, измененные - одним bulk_update, удаленные -
+одним DELETE. Главное изображение выбирается по данным формсета, без повторного
+чтения изображений товара.
+"""
+from django.db import transaction
+
+from apps.catalog.forms import ProductForm, ProductImageFormSet
+from apps.catalog.models import Product, ProductImage
+
+
+class ProductEditService:
+    def __init__(self, seller, product=None, data=None, files=None):
+        self.seller = seller
+        self.product = product or Product(seller=seller)
+        self.form = ProductForm(data, files, instance=self.product)
+        self.formset = ProductImageFormSet(data, files, instance=self.product)
+
+    def is_valid(self):
+        # Проверяются обе формы, чтобы показать все ошибки сразу
+        form_valid = self.form.is_valid()
+        return self.formset.is_valid() and form_valid
+
+    @transaction.atomic
+    def save(self):
+        product = self.form.save(commit=False)
+        product.seller = self.seller
+        product.save()
+        self.save_images(product)
+        return product
+
+    def save_images(self, product):
+        deleted_forms = self.formset.deleted_forms
+        deleted = [form.instance.pk for form in deleted_forms if form.instance.pk]
+        created, updated, replaced = [], [], []
+        images = []
+        for form in self.formset.forms:
+            if form in deleted_forms:
+                continue
+            image = form.instance
+            if image.pk:
+                images.append(image)
+                if 'image' in form.changed_data:
+                    replaced.append(image)
+                elif form.has_changed():
+                    updated.append(image)
+            elif form.has_changed():
+                image.product = product
+                images.append(image)
+                created.append(image)
+
+        if images and not any(image.is_main for image in images):
+            # Тот же выбор, что images.first(): порядок, затем время загрузки
+            main = min(images, key=lambda image: (image.order, image.pk is None, image.pk or 0))
+            main.is_main = True
+            if main.pk and main not in replaced and main not in updated:
+                updated.append(main)
+
+        if deleted:
+            ProductImage.objects.filter(product=product, pk__in=deleted).delete()
+        if created:
+            # bulk_create вызывает pre_save полей, файлы сохраняются в хранилище
+            ProductImage.objects.bulk_create(created)
+        if updated:
+            ProductImage.objects.bulk_update(updated, ['order', 'is_main'])
+        for image in replaced:
+            image.save()
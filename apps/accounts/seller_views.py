@@ -1,13 +1,22 @@
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View, FormView
+from django.http import Http404, StreamingHttpResponse
 from django.contrib import messages
 from django.db.models import Count, Avg
-from django.urls import reverse_lazy
+from django.shortcuts import redirect
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from datetime import timedelta
+from .bulk_actions import ACTIONS, apply_bulk_action
+from .exports import EXPORTS, export_header, export_rows, stream_csv, stream_xlsx
+from .forms import ProductBulkActionForm, ProductImportForm
+from .imports import ProductImporter
 from .mixins import SellerRequiredMixin
+from .product_edit import ProductEditService
 from apps.catalog.models import Product, Review, Brand, Category, Size
+from apps.catalog.prices import MARKET_WINDOW, market_price, price_history
+from apps.catalog.references import get_references
 from apps.catalog.forms import (
-    ProductForm, ProductImageFormSet, BrandForm, CategoryForm, SizeForm
+    ProductForm, BrandForm, CategoryForm, SizeForm
 )
 
 
@@ -15,6 +24,7 @@ class SellerPublicView(DetailView):
     template_name = 'accounts/seller_public.html'
     context_object_name = 'seller'
     pk_url_kwarg = 'seller_id'
+    query_budget = 6
     
     def get_queryset(self):
         from .models import Seller
@@ -22,7 +32,7 @@ class SellerPublicView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        seller = self.get_object()
+        seller = self.object
         
         products = Product.objects.filter(
             seller=seller,
@@ -47,6 +57,7 @@ class SellerPublicView(DetailView):
 
 class SellerDashboardView(SellerRequiredMixin, TemplateView):
     template_name = 'accounts/seller_dashboard.html'
+    query_budget = 12
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -84,108 +95,153 @@ class SellerDashboardView(SellerRequiredMixin, TemplateView):
         return context
 
 
+def filter_by_status(queryset, status):
+    if status == 'active':
+        return queryset.filter(is_active=True, is_sold=False)
+    if status == 'sold':
+        return queryset.filter(is_sold=True)
+    if status == 'inactive':
+        return queryset.filter(is_active=False)
+    return queryset
+
+
 class SellerProductListView(SellerRequiredMixin, ListView):
     model = Product
     template_name = 'accounts/seller_products.html'
     context_object_name = 'products'
     paginate_by = 20
+    query_budget = 7
     
     def get_queryset(self):
         seller = self.request.user.seller
         queryset = Product.objects.filter(seller=seller).select_related(
             'category', 'brand'
         ).prefetch_related('images').order_by('-created_at')
-        
-        status = self.request.GET.get('status')
-        if status == 'active':
-            queryset = queryset.filter(is_active=True, is_sold=False)
-        elif status == 'sold':
-            queryset = queryset.filter(is_sold=True)
-        elif status == 'inactive':
-            queryset = queryset.filter(is_active=False)
-        
-        return queryset
+        return filter_by_status(queryset, self.request.GET.get('status'))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['status_filter'] = self.request.GET.get('status', '')
+        context['bulk_form'] = ProductBulkActionForm()
         return context
 
 
-class SellerProductCreateView(SellerRequiredMixin, CreateView):
+class SellerProductBulkActionView(SellerRequiredMixin, View):
+    """Массовые действия над выбранными товарами или всеми товарами текущего фильтра"""
+    query_budget = 17
+    
+    def post(self, request):
+        status = request.POST.get('status', '')
+        redirect_url = reverse('accounts:seller_products') + (f'?status={status}' if status else '')
+        form = ProductBulkActionForm(request.POST)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                messages.error(request, errors[0])
+            return redirect(redirect_url)
+        
+        seller = request.user.seller
+        queryset = filter_by_status(Product.objects.filter(seller=seller), status)
+        if form.cleaned_data['scope'] == 'selected':
+            queryset = queryset.filter(id__in=form.cleaned_data['ids'])
+        action = form.cleaned_data['action']
+        count = apply_bulk_action(seller, queryset, action, form.cleaned_data['value'])
+        messages.success(request, f'{ACTIONS[action]}: товаров - {count}')
+        return redirect(redirect_url)
+
+
+class SellerProductEditMixin(SellerRequiredMixin):
+    """Форма товара и формсет изображений проверяются и сохраняются ProductEditService"""
     model = Product
     form_class = ProductForm
     template_name = 'accounts/seller_product_form.html'
+    success_message = None
+    
+    def get_form(self, form_class=None):
+        data = files = None
+        if self.request.method in ('POST', 'PUT'):
+            data, files = self.request.POST, self.request.FILES
+        self.service = ProductEditService(self.request.user.seller, self.object, data, files)
+        return self.service.form
+    
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object() if self.pk_url_kwarg in kwargs else None
+        form = self.get_form()
+        if self.service.is_valid():
+            return self.form_valid(form)
+        return self.form_invalid(form)
     
     def form_valid(self, form):
-        form.instance.seller = self.request.user.seller
-        response = super().form_valid(form)
-        
-        formset = ProductImageFormSet(self.request.POST, self.request.FILES, instance=self.object)
-        if formset.is_valid():
-            formset.save()
-            if not self.object.images.filter(is_main=True).exists():
-                first_image = self.object.images.first()
-                if first_image:
-                    first_image.is_main = True
-                    first_image.save()
-        
-        messages.success(self.request, 'Товар успешно создан!')
-        return response
+        self.object = self.service.save()
+        messages.success(self.request, self.success_message)
+        return redirect(self.get_success_url())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.POST:
-            context['formset'] = ProductImageFormSet(self.request.POST, self.request.FILES)
-        else:
-            context['formset'] = ProductImageFormSet()
+        context['formset'] = self.service.formset
+        if self.object is not None:
+            context.update(self.market_context(self.object))
         return context
     
+    def market_context(self, product):
+        """Виджет рыночной цены: медианы по бренду и категории и история цены товара"""
+        references = get_references()
+        market_prices = []
+        if product.brand_id:
+            brand = references.get(Brand, product.brand_id)
+            market_prices.append((f'Бренд {brand.name}' if brand else 'Бренд', market_price(brand_id=product.brand_id)))
+        if product.category_id:
+            category = references.get(Category, product.category_id)
+            market_prices.append((
+                f'Категория {category.name}' if category else 'Категория', market_price(category_id=product.category_id),
+            ))
+        return {
+            'market_prices': [(label, price) for label, price in market_prices if price],
+            'market_window_days': MARKET_WINDOW.days,
+            'price_history': price_history(product.pk, timezone.now() - MARKET_WINDOW),
+        }
+    
     def get_success_url(self):
-        return reverse_lazy('accounts:seller_products')
+        return reverse('accounts:seller_products')
 
 
-class SellerProductUpdateView(SellerRequiredMixin, UpdateView):
-    model = Product
-    form_class = ProductForm
-    template_name = 'accounts/seller_product_form.html'
-    
-    def get_queryset(self):
-        return Product.objects.filter(seller=self.request.user.seller)
+class SellerProductCreateView(SellerProductEditMixin, CreateView):
+    success_message = 'Товар успешно создан!'
+    # Сессия и пользователь, товар, цена в истории и все изображения - по одному запросу,
+    # новый бренд или категория - еще до 4 запросов
+    query_budget = 13
+
+
+class SellerProductImportView(SellerRequiredMixin, FormView):
+    """Массовая загрузка товаров из CSV и архива изображений"""
+    form_class = ProductImportForm
+    template_name = 'accounts/seller_product_import.html'
+    # Справочники - 3 запроса, новые бренды/категории - до 5 на справочник, каждая порция - еще 2-4
+    query_budget = 24
     
     def form_valid(self, form):
-        response = super().form_valid(form)
-        
-        formset = ProductImageFormSet(
-            self.request.POST,
-            self.request.FILES,
-            instance=self.object
+        report = ProductImporter(self.request.user.seller).run(
+            form.cleaned_data['csv_file'], form.cleaned_data.get('images')
         )
-        if formset.is_valid():
-            formset.save()
-        
-        messages.success(self.request, 'Товар успешно обновлен!')
-        return response
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        if self.request.POST:
-            context['formset'] = ProductImageFormSet(
-                self.request.POST,
-                self.request.FILES,
-                instance=self.object
-            )
-        else:
-            context['formset'] = ProductImageFormSet(instance=self.object)
-        return context
+        if report.created:
+            messages.success(self.request, f'Загружено товаров: {report.created}')
+        if report.errors:
+            messages.error(self.request, f'Пропущено строк: {report.skipped}')
+        return self.render_to_response(self.get_context_data(form=self.form_class(), report=report))
+
+
+class SellerProductUpdateView(SellerProductEditMixin, UpdateView):
+    success_message = 'Товар успешно обновлен!'
+    # Виджет рыночной цены - история товара и две медианы (без PostgreSQL - по 2 запроса на медиану)
+    query_budget = 12
     
-    def get_success_url(self):
-        return reverse_lazy('accounts:seller_products')
+    def get_queryset(self):
+        return Product.objects.filter(seller=self.request.user.seller)
 
 
 class SellerProductDeleteView(SellerRequiredMixin, DeleteView):
     model = Product
     template_name = 'accounts/seller_product_confirm_delete.html'
+    query_budget = 6
     
     def get_queryset(self):
         return Product.objects.filter(seller=self.request.user.seller)
@@ -200,6 +256,7 @@ class SellerProductDeleteView(SellerRequiredMixin, DeleteView):
 
 class SellerStatsView(SellerRequiredMixin, TemplateView):
     template_name = 'accounts/seller_stats.html'
+    query_budget = 18
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -257,11 +314,37 @@ class SellerStatsView(SellerRequiredMixin, TemplateView):
         return context
 
 
+class SellerExportView(SellerRequiredMixin, View):
+    """Потоковая выгрузка товаров, продаж или отзывов продавца в CSV/XLSX"""
+    query_budget = 4
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    }
+    
+    def get(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in self.content_types:
+            raise Http404('Неизвестный формат выгрузки')
+        
+        header = export_header(kind)
+        rows = export_rows(kind, request.user.seller)
+        if fmt == 'csv':
+            content = stream_csv(header, rows)
+        else:
+            content = stream_xlsx(EXPORTS[kind]['title'], header, rows)
+        
+        response = StreamingHttpResponse(content, content_type=self.content_types[fmt])
+        filename = f'{kind}-{timezone.localdate():%Y-%m-%d}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class SellerBrandCreateView(SellerRequiredMixin, CreateView):
     model = Brand
     form_class = BrandForm
     template_name = 'accounts/seller_reference_form.html'
     success_url = reverse_lazy('accounts:seller_references')
+    query_budget = 4
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -279,6 +362,7 @@ class SellerCategoryCreateView(SellerRequiredMixin, CreateView):
     form_class = CategoryForm
     template_name = 'accounts/seller_reference_form.html'
     success_url = reverse_lazy('accounts:seller_references')
+    query_budget = 5
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -296,6 +380,7 @@ class SellerSizeCreateView(SellerRequiredMixin, CreateView):
     form_class = SizeForm
     template_name = 'accounts/seller_reference_form.html'
     success_url = reverse_lazy('accounts:seller_references')
+    query_budget = 4
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -310,11 +395,13 @@ class SellerSizeCreateView(SellerRequiredMixin, CreateView):
 
 class SellerReferencesView(SellerRequiredMixin, TemplateView):
     template_name = 'accounts/seller_references.html'
+    query_budget = 7
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['brands'] = Brand.objects.all().order_by('name')
-        context['categories'] = Category.objects.filter(parent=None).order_by('name')
-        context['sizes'] = Size.objects.all().order_by('size_type', 'value')
+        references = get_references()
+        context['brands'] = references.brands
+        context['categories'] = references.root_categories
+        context['sizes'] = references.sizes
         return context
 
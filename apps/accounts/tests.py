@@ -1,3 +1,502 @@
+import asyncio
+import csv
+import io
+import zipfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+from PIL import Image as PILImage
+
+from apps.catalog.models import Brand, Category, Product, Review
+from apps.catalog.references import get_references
+from apps.orders.models import Order, OrderItem
+from apps.core import events, notifications
+from apps.core.deletion import run_pending
+from apps.core.models import DeletionJob, Notification, NotificationType
+from apps.core.testing import (
+    TINY_GIF, QueryBudgetMixin, TempMediaMixin, make_brand, make_category, make_customer, make_product,
+    make_seller, make_size,
+)
+from . import imports
+from .product_edit import ProductEditService
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        categories = [make_category() for _ in range(3)]
+        brands = [make_brand() for _ in range(3)]
+        for _ in range(3):
+            make_size()
+        cls.products = [
+            make_product(seller=cls.seller, category=categories[i % 3], brand=brands[i % 3], images=2)
+            for i in range(25)
+        ]
+        cls.customer = make_customer()
+        for product in cls.products[:8]:
+            Review.objects.create(
+                customer=cls.customer, seller=cls.seller, product=product,
+                rating=5, comment='Отлично', is_approved=True,
+            )
+
+    def test_public_pages(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('accounts:login')))
+        self.assertWithinQueryBudget(self.client.get(reverse('accounts:register')))
+        self.assertWithinQueryBudget(self.client.get(reverse('accounts:seller_public', args=[self.seller.pk])))
+
+    def test_auth_flow(self):
+        response = self.client.post(reverse('accounts:register'), {
+            'username': 'newcustomer', 'email': 'new@example.com',
+            'password1': 'Str0ng-pass-123', 'password2': 'Str0ng-pass-123',
+            'role': 'customer', 'name': 'New', 'phone': '8 999 123-45-67',
+        })
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+        self.assertWithinQueryBudget(self.client.post(reverse('accounts:logout')))
+        response = self.client.post(reverse('accounts:login'), {
+            'username': 'newcustomer', 'password': 'Str0ng-pass-123',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget(response)
+
+    def test_profile(self):
+        self.client.force_login(self.customer.user)
+        self.assertWithinQueryBudget(self.client.get(reverse('accounts:profile')))
+
+    def test_seller_cabinet(self):
+        self.client.force_login(self.seller.user)
+        product = self.products[0]
+        for url in [
+            reverse('accounts:seller_dashboard'),
+            reverse('accounts:seller_products'),
+            reverse('accounts:seller_products') + '?status=active',
+            reverse('accounts:seller_product_create'),
+            reverse('accounts:seller_product_import'),
+            reverse('accounts:seller_product_edit', args=[product.pk]),
+            reverse('accounts:seller_product_delete', args=[product.pk]),
+            reverse('accounts:seller_stats'),
+            reverse('accounts:seller_references'),
+            reverse('accounts:seller_brand_create'),
+            reverse('accounts:seller_category_create'),
+            reverse('accounts:seller_size_create'),
+        ]:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(self.client.get(url))
+
+
+class NotificationInboxTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        Notification.objects.bulk_create([
+            Notification(user=cls.customer.user, notification_type=NotificationType.ORDER_STATUS, title=f'Заказ {n}')
+            for n in range(25)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.customer.user)
+
+    def test_inbox(self):
+        response = self.client.get(reverse('accounts:notifications'))
+        self.assertWithinQueryBudget(response)
+        self.assertContains(response, '<span class="badge" data-unread-badge>25</span>', html=True)
+        self.assertEqual(len(response.context['notifications']), 20)
+        self.assertWithinQueryBudget(self.client.get(reverse('accounts:notifications') + '?page=2'))
+
+    def test_unread_counter(self):
+        user = self.customer.user
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(user), 25)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.notify(user, NotificationType.NEW_MESSAGE, 'Новое сообщение')
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(user), 26)
+
+        notification = Notification.objects.filter(user=user).first()
+        response = self.client.post(
+            reverse('accounts:notification_read', args=[notification.pk]), {'next': reverse('orders:order_list')},
+        )
+        self.assertRedirects(response, reverse('orders:order_list'), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(notifications.unread_count(user), 25)
+
+        with self.assertNumQueries(1):
+            notifications.mark_all_read(user)
+        self.assertEqual(notifications.unread_count(user), 0)
+        self.assertFalse(Notification.objects.filter(user=user, read_at__isnull=True).exists())
+        self.assertWithinQueryBudget(self.client.post(reverse('accounts:notifications_read_all')))
+
+
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.old = Notification.objects.create(
+            user=cls.customer.user, notification_type=NotificationType.NEW_MESSAGE, title='Старое',
+        )
+        Notification.objects.create(
+            user=cls.customer.user, notification_type=NotificationType.NEW_MESSAGE, title='Прочитанное', is_read=True,
+        )
+        cls.missed = Notification.objects.create(
+            user=cls.customer.user, notification_type=NotificationType.NEW_MESSAGE, title='Пропущенное',
+        )
+
+    def setUp(self):
+        # Счетчик непрочитанных мог остаться в кеше от прошлого теста с тем же pk
+        cache.clear()
+
+    def test_wsgi_fallback_asks_to_reconnect_later(self):
+        self.client.force_login(self.customer.user)
+        response = self.client.get(reverse('accounts:notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertContains(response, 'retry: 60000')
+        self.assertContains(response, 'event: unread\ndata: {"count": 2}')
+
+    async def test_stream(self):
+        await self.async_client.aforce_login(self.customer.user)
+        response = await self.async_client.get(
+            reverse('accounts:notification_stream'), headers={'Last-Event-ID': str(self.old.pk)},
+        )
+        # Поток читается в задаче и закрывается ее отменой, как при разрыве
+        # соединения в ASGIHandler: отмена доходит до event_stream и снимает подписку
+        chunks = asyncio.Queue()
+
+        async def read():
+            async for chunk in response.streaming_content:
+                await chunks.put(chunk)
+
+        reader = asyncio.create_task(read())
+        self.assertEqual(await asyncio.wait_for(chunks.get(), 1), b'retry: 5000\n\n')
+        # Досылается только непрочитанное, счетчик - после него
+        replayed = await asyncio.wait_for(chunks.get(), 1)
+        self.assertIn(f'id: {self.missed.pk}'.encode(), replayed)
+        self.assertIn('Пропущенное'.encode(), replayed)
+        self.assertIn(b'event: unread\ndata: {"count": 2}', await asyncio.wait_for(chunks.get(), 1))
+
+        events.publish(self.customer.user.pk, 'order_status', {'order': 1, 'label': 'Отправлен'})
+        chunk = await asyncio.wait_for(chunks.get(), 1)
+        self.assertTrue(chunk.startswith(b'event: order_status\n'))
+
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(events.get_broker()._subscribers, {})
+
+
+class SellerExportTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        cls.products = [make_product(seller=cls.seller, title=f'Товар {n}') for n in range(5)]
+        make_product(title='Чужой товар')
+        customer = make_customer(name='Покупатель')
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, product=cls.products[0], quantity=1, price=cls.products[0].price)
+        Review.objects.create(
+            customer=customer, seller=cls.seller, product=cls.products[0], rating=5, comment='Отлично, <спасибо>',
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller.user)
+
+    def export(self, kind, fmt):
+        response = self.client.get(reverse('accounts:seller_export', args=[kind, fmt]))
+        self.assertWithinQueryBudget(response)
+        self.assertTrue(response.streaming)
+        self.assertIn(f'{kind}-', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('products', 'csv').decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:2], ['ID', 'Название'])
+        self.assertEqual(sorted(row[1] for row in rows[1:]), [f'Товар {n}' for n in range(5)])
+
+        rows = list(csv.reader(io.StringIO(self.export('sales', 'csv').decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][4], 'Товар 0')
+        self.assertEqual(rows[1][-1], 'Покупатель')
+
+    def test_csv_formulas(self):
+        product = make_product(seller=self.seller, title='=HYPERLINK("http://example.com")')
+        Review.objects.create(
+            customer=make_customer(), seller=self.seller, product=product, rating=1, comment='-2+3',
+        )
+        rows = list(csv.reader(io.StringIO(self.export('reviews', 'csv').decode('utf-8-sig'))))
+        # Свежий отзыв - первый; число в числовой колонке не экранируется
+        self.assertEqual(
+            (rows[1][2], rows[1][4], rows[1][5]), ('\'=HYPERLINK("http://example.com")', '1', "'-2+3"),
+        )
+
+    def test_xlsx(self):
+        with zipfile.ZipFile(io.BytesIO(self.export('reviews', 'xlsx'))) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row '), 2)
+        self.assertIn('Отлично, &lt;спасибо&gt;', sheet)
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get(reverse('accounts:seller_export', args=['orders', 'csv'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('accounts:seller_export', args=['products', 'pdf'])).status_code, 404)
+
+
+class SellerProductImportTests(QueryBudgetMixin, TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        cls.category = make_category(name='Кроссовки')
+        cls.size = make_size(value='42', display_value='42')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller.user)
+
+    def upload(self, rows, images=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['title', 'category', 'brand', 'size', 'price', 'quantity', 'condition', 'images'])
+        writer.writerows(rows)
+        data = {'csv_file': SimpleUploadedFile('products.csv', buffer.getvalue().encode())}
+        if images is not None:
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w') as zf:
+                for name, content in images.items():
+                    zf.writestr(name, content)
+            data['images'] = SimpleUploadedFile('images.zip', archive.getvalue())
+        response = self.client.post(reverse('accounts:seller_product_import'), data)
+        self.assertWithinQueryBudget(response)
+        return response.context['report']
+
+    def test_import(self):
+        report = self.upload([
+            ['Air Max', 'кроссовки', 'Nike', '42', '9990', '2', 'new', 'a.gif;b.gif'],
+            ['Худи', 'Одежда', 'Nike', 'XXL', '4500,50', '', 'Хорошее', ''],
+        ], images={'a.gif': TINY_GIF, 'b.gif': TINY_GIF})
+
+        self.assertEqual((report.created, report.images, report.errors), (2, 2, []))
+        air_max = Product.objects.get(title='Air Max')
+        self.assertEqual((air_max.seller, air_max.category, air_max.size), (self.seller, self.category, self.size))
+        self.assertEqual(air_max.quantity, 2)
+        self.assertEqual([image.is_main for image in air_max.images.order_by('order')], [True, False])
+        self.assertEqual(list(air_max.price_changes.values_list('price', flat=True)), [Decimal('9990')])
+        hoodie = Product.objects.get(title='Худи')
+        self.assertEqual((hoodie.custom_size, hoodie.condition, str(hoodie.price)), ('XXL', 'good', '4500.50'))
+        self.assertEqual(hoodie.category, Category.objects.get(name='Одежда'))
+        self.assertEqual(Brand.objects.filter(name='Nike').count(), 1)
+
+    def test_row_errors(self):
+        report = self.upload([
+            ['', '', '', '', '100', '1', 'new', ''],
+            ['Цена', '', '', '', 'дорого', '1', 'new', ''],
+            ['Состояние', '', '', '', '100', '1', 'как новый', ''],
+            ['Без файла', '', '', '', '100', '1', 'new', 'missing.gif'],
+            ['Не картинка', '', '', '', '100', '1', 'new', 'text.gif'],
+            ['Не число', '', '', '', 'nan', '1', 'new', ''],
+            ['Бесконечность', '', '', '', 'Infinity', '1', 'new', ''],
+            ['Длинная цена', '', '', '', '123456789012345', '1', 'new', ''],
+            ['Доли копеек', '', '', '', '10,005', '1', 'new', ''],
+            ['Верный', '', '', '', '100', '1', 'new', 'ok.gif'],
+        ], images={'text.gif': b'not an image', 'ok.gif': TINY_GIF})
+
+        self.assertEqual((report.rows, report.created, report.skipped), (10, 1, 9))
+        self.assertEqual(sorted(line for line, _ in report.errors), [2, 3, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(list(Product.objects.filter(seller=self.seller).values_list('title', flat=True)), ['Верный'])
+
+
+    def test_unreadable_files(self):
+        data = 'title,price\nКуртка,100\n'.encode('cp1251')
+        response = self.client.post(
+            reverse('accounts:seller_product_import'), {'csv_file': SimpleUploadedFile('products.csv', data)},
+        )
+        self.assertEqual(response.status_code, 200)
+        report = response.context['report']
+        self.assertEqual(report.created, 0)
+        self.assertIn('UTF-8', report.errors[0][1])
+
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (10, 10)).save(buffer, 'GIF')
+        # 100 пикселей больше двойного предела: Pillow отказывается открывать файл
+        with mock.patch.object(PILImage, 'MAX_IMAGE_PIXELS', 10):
+            report = self.upload(
+                [['Огромное фото', '', '', '', '100', '1', 'new', 'bomb.gif']], images={'bomb.gif': buffer.getvalue()},
+            )
+        self.assertEqual((report.created, [line for line, _ in report.errors]), (0, [2]))
+
+        # Размер проверяется по заголовку записи, до распаковки
+        with mock.patch.object(imports, 'MAX_IMAGE_BYTES', 100):
+            report = self.upload(
+                [['Большое фото', '', '', '', '100', '1', 'new', 'big.gif']], images={'big.gif': b'\0' * 1000},
+            )
+        self.assertEqual(report.errors, [(2, 'Файл big.gif слишком большой: 1000 байт, допустимо до 100')])
+
+
+class SellerProductEditTests(QueryBudgetMixin, TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        cls.category = make_category(name='Кроссовки')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller.user)
+
+    def image(self, name):
+        return SimpleUploadedFile(name, TINY_GIF, content_type='image/gif')
+
+    def product_data(self, **extra):
+        return {
+            'title': 'Air Max', 'description': 'Описание', 'price': '9990', 'quantity': 1, 'condition': 'new',
+            'is_active': 'on', 'category_name': 'кроссовки', 'brand_name': 'Nike', **extra,
+        }
+
+    def formset_data(self, images=()):
+        data = {
+            'images-TOTAL_FORMS': 3, 'images-INITIAL_FORMS': len(images),
+            'images-MIN_NUM_FORMS': 0, 'images-MAX_NUM_FORMS': 1000,
+            # Пустые формы отправляют значение порядка по умолчанию
+            **{f'images-{n}-order': 0 for n in range(3)},
+        }
+        for n, image in enumerate(images):
+            data.update({f'images-{n}-id': image.pk, f'images-{n}-order': image.order})
+            if image.is_main:
+                data[f'images-{n}-is_main'] = 'on'
+        return data
+
+    def test_create(self):
+        data = {**self.product_data(), **self.formset_data(), 'images-1-order': 1, 'images-2-order': 0}
+        files = {'images-1-image': self.image('b.gif'), 'images-2-image': self.image('a.gif')}
+        service = ProductEditService(self.seller, data=data, files=files)
+        # Категория - из кеша справочников, новый бренд - один поиск по имени
+        with self.assertNumQueries(1):
+            self.assertTrue(service.is_valid(), (service.form.errors, service.formset.errors))
+        self.assertFalse(Brand.objects.filter(name='Nike').exists())
+        # Бренд (подбор slug, вставка), товар, цена в истории, изображения одним INSERT и точки сохранения
+        with self.assertNumQueries(9):
+            product = service.save()
+
+        self.assertEqual((product.seller, product.category, product.brand.name), (self.seller, self.category, 'Nike'))
+        self.assertEqual(
+            [(image.order, image.is_main) for image in product.images.all()], [(0, True), (1, False)],
+        )
+
+    def test_update(self):
+        product = make_product(seller=self.seller, category=self.category, images=3)
+        first, second, third = product.images.all()
+        data = {
+            **self.product_data(price='8990', brand_name=''), **self.formset_data([first, second, third]),
+            'images-0-DELETE': 'on', 'images-1-order': 5,
+        }
+        service = ProductEditService(self.seller, product, data, {'images-2-image': self.image('new.gif')})
+        # Изображения товара для формсета и проверка первичных ключей форм
+        with self.assertNumQueries(1):
+            self.assertTrue(service.is_valid())
+        # Товар, новая цена в истории, DELETE, bulk_update, замена файла и точки сохранения
+        with self.assertNumQueries(7):
+            service.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.price, Decimal('8990'))
+        # Главное изображение удалено: главным становится первое по порядку из оставшихся
+        self.assertEqual(
+            [(image.pk, image.order, image.is_main) for image in product.images.all()],
+            [(third.pk, 2, True), (second.pk, 5, False)],
+        )
+
+    def test_invalid_formset_keeps_product(self):
+        product = make_product(seller=self.seller, title='Старое название')
+        data = {**self.product_data(), **self.formset_data()}
+        response = self.client.post(reverse('accounts:seller_product_edit', args=[product.pk]), {
+            **data, 'images-0-image': SimpleUploadedFile('bad.gif', b'not an image'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertTrue(response.context['formset'].errors[0])
+        product.refresh_from_db()
+        self.assertEqual(product.title, 'Старое название')
+
+    def test_views(self):
+        response = self.client.post(reverse('accounts:seller_product_create'), {
+            **self.product_data(), **self.formset_data(), 'images-0-image': self.image('a.gif'),
+        })
+        self.assertRedirects(response, reverse('accounts:seller_products'), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+        product = Product.objects.get(seller=self.seller)
+        self.assertTrue(product.images.get().is_main)
+        # Новый бренд сбросил кеш справочников; его заново строит первый же запрос каталога
+        get_references()
+
+        response = self.client.post(reverse('accounts:seller_product_edit', args=[product.pk]), {
+            **self.product_data(title='Air Max 90'), **self.formset_data(product.images.all()),
+        })
+        self.assertRedirects(response, reverse('accounts:seller_products'), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(Product.objects.get(pk=product.pk).title, 'Air Max 90')
+
+
+class SellerProductBulkActionTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        cls.products = [make_product(seller=cls.seller, price=Decimal('1000.00')) for _ in range(4)]
+        cls.other = make_product(price=Decimal('1000.00'))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller.user)
+
+    def bulk(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('accounts:seller_product_bulk'), data)
+        self.assertRedirects(response, reverse('accounts:seller_products') + (
+            f"?status={data['status']}" if data.get('status') else ''
+        ), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def test_selected_scoped_to_seller(self):
+        ids = [self.products[0].pk, self.products[1].pk, self.other.pk]
+        self.bulk(action='deactivate', scope='selected', ids=ids)
+
+        self.assertEqual(set(Product.objects.filter(is_active=False).values_list('pk', flat=True)), set(ids[:2]))
+        self.other.refresh_from_db()
+        self.assertTrue(self.other.is_active)
+
+    def test_price_and_filtered_scope(self):
+        self.products[0].is_active = False
+        self.products[0].save()
+        self.bulk(action='price_percent', value='-15', scope='filtered', status='active')
+        self.bulk(action='price_fixed', value='-900', scope='filtered', status='inactive')
+
+        prices = dict(Product.objects.filter(seller=self.seller).values_list('id', 'price'))
+        self.assertEqual(prices[self.products[0].pk], Decimal('100.00'))
+        self.assertEqual(prices[self.products[1].pk], Decimal('850.00'))
+        self.bulk(action='price_fixed', value='-5000', scope='filtered')
+        self.assertFalse(Product.objects.filter(seller=self.seller, price__gt=0).exists())
+
+    def test_mark_sold_and_delete(self):
+        self.bulk(action='mark_sold', scope='selected', ids=[self.products[0].pk])
+        self.products[0].refresh_from_db()
+        self.assertEqual((self.products[0].is_sold, self.products[0].quantity), (True, 0))
+
+        self.bulk(action='delete', scope='filtered', status='sold')
+        # Товар сразу снят с продажи, строки удаляет process_deletions
+        self.products[0].refresh_from_db()
+        self.assertFalse(self.products[0].is_active)
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.object_ids, job.requested_by), ([str(self.products[0].pk)], self.seller.user))
+
+        run_pending()
+        self.assertEqual(Product.objects.filter(seller=self.seller).count(), 3)
+        self.assertTrue(Product.objects.filter(pk=self.other.pk).exists())
 
-# Create your tests here.
+    def test_invalid(self):
+        self.bulk(action='price_percent', scope='filtered')
+        self.bulk(action='activate', scope='selected')
+        self.assertEqual(set(Product.objects.values_list('is_active', 'price')), {(True, Decimal('1000.00'))})
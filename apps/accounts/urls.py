@@ -1,13 +1,25 @@
 from django.urls import path
-from .views import RegisterView, CustomLoginView, CustomLogoutView, ProfileView
+from .async_views import notification_stream
+from .views import (
+    RegisterView,
+    CustomLoginView,
+    CustomLogoutView,
+    ProfileView,
+    NotificationListView,
+    NotificationReadView,
+    NotificationReadAllView
+)
 from .seller_views import (
     SellerPublicView,
     SellerDashboardView,
     SellerProductListView,
+    SellerProductBulkActionView,
     SellerProductCreateView,
+    SellerProductImportView,
     SellerProductUpdateView,
     SellerProductDeleteView,
     SellerStatsView,
+    SellerExportView,
     SellerReferencesView,
     SellerBrandCreateView,
     SellerCategoryCreateView,
@@ -21,6 +33,10 @@ urlpatterns = [
     path('login/', CustomLoginView.as_view(), name='login'),
     path('logout/', CustomLogoutView.as_view(), name='logout'),
     path('profile/', ProfileView.as_view(), name='profile'),
+    path('notifications/', NotificationListView.as_view(), name='notifications'),
+    path('notifications/<int:pk>/read/', NotificationReadView.as_view(), name='notification_read'),
+    path('notifications/read-all/', NotificationReadAllView.as_view(), name='notifications_read_all'),
+    path('notifications/stream/', notification_stream, name='notification_stream'),
     
     # Публичная страница продавца
     path('seller/<int:seller_id>/', SellerPublicView.as_view(), name='seller_public'),
@@ -28,10 +44,13 @@ urlpatterns = [
     # Личный кабинет продавца (только для продавцов)
     path('seller/dashboard/', SellerDashboardView.as_view(), name='seller_dashboard'),
     path('seller/products/', SellerProductListView.as_view(), name='seller_products'),
+    path('seller/products/bulk/', SellerProductBulkActionView.as_view(), name='seller_product_bulk'),
     path('seller/products/create/', SellerProductCreateView.as_view(), name='seller_product_create'),
+    path('seller/products/import/', SellerProductImportView.as_view(), name='seller_product_import'),
     path('seller/products/<int:pk>/edit/', SellerProductUpdateView.as_view(), name='seller_product_edit'),
     path('seller/products/<int:pk>/delete/', SellerProductDeleteView.as_view(), name='seller_product_delete'),
     path('seller/stats/', SellerStatsView.as_view(), name='seller_stats'),
+    path('seller/export/<slug:kind>.<slug:fmt>', SellerExportView.as_view(), name='seller_export'),
     path('seller/references/', SellerReferencesView.as_view(), name='seller_references'),
     path('seller/references/brand/create/', SellerBrandCreateView.as_view(), name='seller_brand_create'),
     path('seller/references/category/create/', SellerCategoryCreateView.as_view(), name='seller_category_create'),
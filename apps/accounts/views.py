@@ -2,9 +2,13 @@ from django.shortcuts import redirect
 from django.contrib.auth import login
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import CreateView, TemplateView
+from django.views import View
+from django.views.generic import CreateView, ListView, TemplateView
 from django.urls import reverse_lazy
 from django.contrib import messages
+from django.utils.http import url_has_allowed_host_and_scheme
+from apps.core import notifications
+from apps.core.models import Notification
 from .forms import UserRegistrationForm, UserLoginForm
 
 
@@ -12,6 +16,7 @@ class RegisterView(CreateView):
     form_class = UserRegistrationForm
     template_name = 'accounts/register.html'
     success_url = reverse_lazy('accounts:profile')
+    query_budget = 12
     
     def dispatch(self, request, *args, **kwargs):
         if request.user.is_authenticated:
@@ -30,6 +35,7 @@ class CustomLoginView(LoginView):
     form_class = UserLoginForm
     redirect_authenticated_user = True
     success_url = reverse_lazy('accounts:profile')
+    query_budget = 9
     
     def form_valid(self, form):
         user = form.get_user()
@@ -44,6 +50,7 @@ class CustomLoginView(LoginView):
 class CustomLogoutView(LogoutView):
     next_page = reverse_lazy('accounts:login')
     http_method_names = ['get', 'post', 'options']
+    query_budget = 4
     
     def dispatch(self, request, *args, **kwargs):
         messages.success(request, 'Вы успешно вышли из системы.')
@@ -53,6 +60,7 @@ class CustomLogoutView(LogoutView):
 class ProfileView(LoginRequiredMixin, TemplateView):
 
     template_name = 'accounts/profile.html'
+    query_budget = 4
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -63,3 +71,38 @@ class ProfileView(LoginRequiredMixin, TemplateView):
         context['seller'] = getattr(user, 'seller', None)
         
         return context
+
+
+class NotificationListView(LoginRequiredMixin, ListView):
+    template_name = 'accounts/notifications.html'
+    context_object_name = 'notifications'
+    paginate_by = 20
+    query_budget = 6
+
+    def get_queryset(self):
+        # Порядок совпадает с индексом (user, is_read, -created_at): непрочитанные сверху
+        return Notification.objects.filter(user=self.request.user).order_by('is_read', '-created_at')
+
+
+class NotificationReadView(LoginRequiredMixin, View):
+    """Отмечает уведомление прочитанным и переходит по его ссылке"""
+    http_method_names = ['post']
+    query_budget = 5
+
+    def post(self, request, pk):
+        notifications.mark_read(request.user, pk)
+        link = request.POST.get('next', '')
+        if link and url_has_allowed_host_and_scheme(link, allowed_hosts={request.get_host()}):
+            return redirect(link)
+        return redirect('accounts:notifications')
+
+
+class NotificationReadAllView(LoginRequiredMixin, View):
+    http_method_names = ['post']
+    query_budget = 5
+
+    def post(self, request):
+        updated = notifications.mark_all_read(request.user)
+        if updated:
+            messages.success(request, 'Все уведомления отмечены прочитанными')
+        return redirect('accounts:notifications')
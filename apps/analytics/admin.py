@@ -1,17 +1,20 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
+from apps.core.admin_tools import LargeTableAdminMixin
 from .models import ProductView, SearchQuery, ProductAnalytics
 
 
 @admin.register(ProductView)
-class ProductViewAdmin(admin.ModelAdmin):
+class ProductViewAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Админка для просмотров товаров"""
     list_display = ('id', 'product', 'customer', 'ip_address', 'viewed_at', 'delete_button')
-    list_filter = ('viewed_at', 'product__category', 'product__seller')
+    # Product.__str__ показывает размер
+    list_select_related = ('product__size', 'customer')
+    list_filter = ('viewed_at',)
     search_fields = ('product__title', 'customer__name', 'customer__email', 'ip_address')
     readonly_fields = ('viewed_at',)
-    date_hierarchy = 'viewed_at'
+    raw_id_fields = ('product', 'customer')
     list_per_page = 50
     
     def delete_button(self, obj):
@@ -27,13 +30,14 @@ class ProductViewAdmin(admin.ModelAdmin):
 
 
 @admin.register(SearchQuery)
-class SearchQueryAdmin(admin.ModelAdmin):
+class SearchQueryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Админка для поисковых запросов"""
     list_display = ('id', 'query', 'customer', 'results_count', 'clicked_product', 'searched_at', 'delete_button')
-    list_filter = ('searched_at', 'results_count')
+    list_select_related = ('customer', 'clicked_product__size')
+    list_filter = ('searched_at',)
     search_fields = ('query', 'customer__name', 'customer__email', 'clicked_product__title')
     readonly_fields = ('searched_at',)
-    date_hierarchy = 'searched_at'
+    raw_id_fields = ('customer', 'clicked_product')
     list_per_page = 50
     
     def delete_button(self, obj):
@@ -49,7 +53,7 @@ class SearchQueryAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductAnalytics)
-class ProductAnalyticsAdmin(admin.ModelAdmin):
+class ProductAnalyticsAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Админка для аналитики товаров"""
     list_display = (
         'id', 
@@ -64,10 +68,10 @@ class ProductAnalyticsAdmin(admin.ModelAdmin):
         'updated_at',
         'delete_button'
     )
-    list_filter = ('updated_at', 'last_viewed_at', 'product__category', 'product__seller')
+    list_select_related = ('product__size',)
     search_fields = ('product__title', 'product__seller__name')
     readonly_fields = ('updated_at',)
-    date_hierarchy = 'updated_at'
+    raw_id_fields = ('product',)
     list_per_page = 50
     
     def delete_button(self, obj):
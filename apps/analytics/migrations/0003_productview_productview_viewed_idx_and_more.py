@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_seller_slug'),
+        ('analytics', '0002_alter_productview_options'),
+        ('catalog', '0003_alter_brand_logo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productview',
+            index=models.Index(fields=['-viewed_at'], name='productview_viewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productview',
+            index=models.Index(fields=['product', '-viewed_at'], name='productview_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchquery',
+            index=models.Index(fields=['-searched_at'], name='searchquery_searched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchquery',
+            index=models.Index(fields=['query', '-searched_at'], name='searchquery_query_idx'),
+        ),
+    ]
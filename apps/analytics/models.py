@@ -12,6 +12,10 @@ class ProductView(models.Model):
         ordering = ['-viewed_at']
         verbose_name = "Просмотры товара"
         verbose_name_plural = "Просмотры товаров"
+        indexes = [
+            models.Index(fields=['-viewed_at'], name='productview_viewed_idx'),
+            models.Index(fields=['product', '-viewed_at'], name='productview_product_idx'),
+        ]
     
     def __str__(self):
         return f"View {self.id} - {self.product.title}"
@@ -35,6 +39,10 @@ class SearchQuery(models.Model):
         ordering = ['-searched_at']
         verbose_name = "Поисковый запрос"
         verbose_name_plural = "Поисковые запросы"
+        indexes = [
+            models.Index(fields=['-searched_at'], name='searchquery_searched_idx'),
+            models.Index(fields=['query', '-searched_at'], name='searchquery_query_idx'),
+        ]
     
     def __str__(self):
         return f"Search: {self.query}"
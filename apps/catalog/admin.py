@@ -2,7 +2,25 @@ from django.contrib import admin
 from django.contrib import messages
 from django.utils.html import format_html
 from django.urls import reverse
+from apps.core.admin_tools import BackgroundDeleteAdminMixin
 from .models import Wishlist, Size, Category, Brand, Product, ProductImage, Review
+from .utils import save_with_unique_slug
+
+
+class UniqueSlugAdminMixin:
+    """Пустой slug подбирается автоматически, как в формах кабинета продавца"""
+    
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        form.base_fields['slug'].required = False
+        form.base_fields['slug'].help_text = 'Оставьте пустым, чтобы сформировать из названия'
+        return form
+    
+    def save_model(self, request, obj, form, change):
+        if obj.slug:
+            super().save_model(request, obj, form, change)
+        else:
+            save_with_unique_slug(obj)
 
 
 @admin.register(Size)
@@ -25,12 +43,12 @@ class SizeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(UniqueSlugAdminMixin, admin.ModelAdmin):
     """Админка для категорий"""
     list_display = ('id', 'name', 'slug', 'parent', 'size_type', 'delete_button')
+    list_select_related = ('parent',)
     list_filter = ('size_type', 'parent')
     search_fields = ('name', 'slug')
-    prepopulated_fields = {'slug': ('name',)}
     raw_id_fields = ('parent',)
     
     def delete_button(self, obj):
@@ -71,11 +89,10 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Brand)
-class BrandAdmin(admin.ModelAdmin):
+class BrandAdmin(UniqueSlugAdminMixin, admin.ModelAdmin):
     """Админка для брендов"""
     list_display = ('id', 'name', 'slug', 'delete_button')
     search_fields = ('name', 'slug')
-    prepopulated_fields = {'slug': ('name',)}
     
     def delete_button(self, obj):
         """Кнопка удаления в списке"""
@@ -112,17 +129,18 @@ class ProductImageInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(BackgroundDeleteAdminMixin, admin.ModelAdmin):
     """Админка для товаров"""
     list_display = (
         'id', 'title', 'seller', 'category', 'brand', 'price', 
         'quantity', 'condition', 'is_active', 'is_sold', 
         'legit_check', 'created_at', 'delete_button'
     )
-    list_filter = ('is_active', 'is_sold', 'legit_check', 'condition', 'category', 'brand', 'created_at')
+    # Product.__str__ (подпись флажка действий) показывает размер
+    list_select_related = ('seller', 'category', 'brand', 'size')
+    list_filter = ('is_active', 'is_sold', 'legit_check', 'category', 'brand')
     search_fields = ('title', 'description', 'seller__name')
     readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
     raw_id_fields = ('seller', 'category', 'brand', 'size')
     inlines = [ProductImageInline]
     
@@ -156,28 +174,23 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
     
-    def get_deleted_objects(self, objs, request):
-        """Показывает связанные объекты, которые будут удалены"""
-        from django.contrib.admin.utils import NestedObjects
-        from django.db import router
-        
-        collector = NestedObjects(using=router.db_for_write(objs[0]))
-        collector.collect(objs)
-        
-        to_delete = collector.nested()
-        protected = collector.protected
-        model_count = {model._meta.verbose_name_plural: len(objs) for model, objs in collector.model_objs.items()}
-        
-        return to_delete, model_count, protected
+    def schedule_deletion(self, request, queryset):
+        # Товар снимается с продажи сразу, строки удаляются в фоне
+        job = super().schedule_deletion(request, queryset)
+        Product.objects.filter(pk__in=job.object_ids).update(is_active=False)
+        return job
 
 
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     """Админка для изображений товаров"""
     list_display = ('id', 'product', 'order', 'is_main', 'created_at', 'delete_button')
-    list_filter = ('is_main', 'created_at')
+    list_select_related = ('product__size',)
+    list_filter = ('is_main',)
     search_fields = ('product__title',)
     raw_id_fields = ('product',)
+    # Порядок модели (order, created_at) не индексирован
+    ordering = ('-id',)
     
     def delete_button(self, obj):
         """Кнопка удаления в списке"""
@@ -195,10 +208,11 @@ class ProductImageAdmin(admin.ModelAdmin):
 class WishlistAdmin(admin.ModelAdmin):
     """Админка для избранного"""
     list_display = ('id', 'customer', 'product', 'added_at', 'delete_button')
-    list_filter = ('added_at',)
+    list_select_related = ('customer', 'product__size')
     search_fields = ('customer__name', 'product__title')
-    date_hierarchy = 'added_at'
     raw_id_fields = ('customer', 'product')
+    # Порядок модели -added_at не индексирован
+    ordering = ('-id',)
     
     def delete_button(self, obj):
         """Кнопка удаления в списке"""
@@ -215,10 +229,10 @@ class WishlistAdmin(admin.ModelAdmin):
 class ReviewAdmin(admin.ModelAdmin):
     """Админка для отзывов"""
     list_display = ('id', 'customer', 'seller', 'rating', 'is_approved', 'created_at', 'delete_button')
-    list_filter = ('rating', 'is_approved', 'created_at')
+    list_select_related = ('customer', 'seller')
+    list_filter = ('is_approved',)
     search_fields = ('customer__name', 'seller__name', 'comment')
     readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
     raw_id_fields = ('customer', 'seller')
     
     def delete_button(self, obj):
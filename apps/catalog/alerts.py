@@ -0,0 +1,120 @@
+"""
+Оповещения из избранного о снижении цены и возвращении товара в продажу.
+
+Изменение записывается в ProductAlert в транзакции продавца: одна строка на товар,
+пакетное действие - один bulk_create, поэтому запрос продавца не ждет рассылки.
+Рассылку выполняет send_alerts (команда send_product_alerts): очередь разбирается
+порциями по BATCH_SIZE, добавивших товары порции в избранное находит один запрос
+по индексу wishlist(product_id), а уведомления пишутся сервисом уведомлений
+порциями bulk_create - товар в избранном у десятков тысяч покупателей не требует
+запроса на каждого.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.urls import reverse
+
+from apps.core import notifications
+from apps.core.models import NotificationType
+from .models import AlertKind, Product, ProductAlert, Wishlist
+
+
+BATCH_SIZE = 500
+# Такое же непрочитанное оповещение за этот срок повторно не создается
+ALERT_WINDOW = timedelta(days=1)
+
+
+class AlertReport:
+    def __init__(self):
+        self.alerts = 0
+        self.products = 0
+        self.recipients = 0
+
+
+def product_alerts(product):
+    """Оповещения для товара, измененного через save()"""
+    old_price = getattr(product, '_loaded_price', None)
+    old_quantity = getattr(product, '_loaded_quantity', None)
+    product._loaded_price = product.price
+    product._loaded_quantity = product.quantity
+    alerts = []
+    if old_price is not None and product.price < old_price:
+        alerts.append(ProductAlert(product=product, kind=AlertKind.PRICE_DROP, old_price=old_price))
+    if old_quantity == 0 and product.quantity > 0:
+        alerts.append(ProductAlert(product=product, kind=AlertKind.BACK_IN_STOCK))
+    return alerts
+
+
+def record_price_drops(old_prices):
+    """old_prices - пары (id, цена до снижения) из пакетного изменения"""
+    ProductAlert.objects.bulk_create([
+        ProductAlert(product_id=pk, kind=AlertKind.PRICE_DROP, old_price=price)
+        for pk, price in old_prices if price > 0
+    ], batch_size=notifications.CHUNK_SIZE)
+
+
+def send_alerts(batch_size=BATCH_SIZE):
+    report = AlertReport()
+    last_pk = 0
+    while True:
+        alerts = list(ProductAlert.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not alerts:
+            return report
+        last_pk = alerts[-1].pk
+        with transaction.atomic():
+            messages = alert_messages(alerts)
+            report.recipients += notify_wishlisters(messages)
+            ProductAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).delete()
+        report.alerts += len(alerts)
+        report.products += len(messages)
+        if len(alerts) < batch_size:
+            return report
+
+
+def alert_messages(alerts):
+    """{id товара: (тип, заголовок, текст)} для товаров, которые все еще в продаже"""
+    drops, restocks = {}, set()
+    for alert in alerts:
+        if alert.kind == AlertKind.PRICE_DROP:
+            # Первая запись хранит цену до серии снижений
+            drops.setdefault(alert.product_id, alert.old_price)
+        else:
+            restocks.add(alert.product_id)
+
+    products = Product.objects.filter(
+        pk__in=drops.keys() | restocks, is_active=True, is_sold=False, quantity__gt=0,
+    ).only('id', 'title', 'price')
+    messages = {}
+    for product in products:
+        if product.pk in drops and product.price < drops[product.pk]:
+            messages[product.pk] = (
+                NotificationType.PRICE_DROP, f'Цена снижена: {product.title}',
+                f'{drops[product.pk]} ₽ → {product.price} ₽',
+            )
+        elif product.pk in restocks:
+            messages[product.pk] = (
+                NotificationType.BACK_IN_STOCK, f'Снова в наличии: {product.title}', f'{product.price} ₽',
+            )
+    return messages
+
+
+def notify_wishlisters(messages):
+    """Один запрос на порцию товаров; возвращает число адресатов"""
+    if not messages:
+        return 0
+    rows = Wishlist.objects.filter(product_id__in=messages).order_by('product_id').values_list(
+        'product_id', 'customer__user_id',
+    )
+    recipients = 0
+    with notifications.batch() as batch:
+        for product_id, group in groupby(rows.iterator(chunk_size=notifications.CHUNK_SIZE), key=itemgetter(0)):
+            user_ids = [user_id for _, user_id in group]
+            notification_type, title, message = messages[product_id]
+            batch.add(
+                user_ids, notification_type, title, message,
+                link=reverse('catalog:product_detail', args=[product_id]), window=ALERT_WINDOW,
+            )
+            recipients += len(user_ids)
+    return recipients
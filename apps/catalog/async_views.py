@@ -0,0 +1,150 @@
+"""
+Асинхронные версии представлений каталога для запуска под ASGI (ASYNC_VIEWS=True).
+Пока представление ждет базу, поток воркера свободен; независимые запросы
+запускаются одновременно через asyncio.gather.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.paginator import InvalidPage, Page
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404, redirect
+from django.views.generic.detail import SingleObjectMixin
+
+from apps.core.instrumentation import query_budget
+from . import views
+from .models import Brand, Category, Product, Wishlist
+from .references import get_references
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def wants_json(request):
+    return (
+        request.headers.get('Accept', '').startswith('application/json')
+        or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    )
+
+
+def respond(request, level, message, redirect_to, status=200, **data):
+    """JSON для fetch-запросов, сообщение и редирект для обычных ссылок"""
+    if wants_json(request):
+        return JsonResponse({'ok': level != messages.ERROR, 'message': message, **data}, status=status)
+    messages.add_message(request, level, message)
+    return redirect(redirect_to)
+
+
+async def get_customer(request):
+    user = await request.auser()
+    # Шаблон и контекст-процессоры обращаются к request.user: не загружаем пользователя второй раз
+    request.user = user
+    if not user.is_authenticated:
+        return user, None
+    # Через дескриптор, чтобы user.customer закешировался и для шаблона
+    return user, await sync_to_async(getattr)(user, 'customer', None)
+
+
+class ProductListView(views.ProductListView):
+    async def get(self, request, *args, **kwargs):
+        # Снимок справочников может потребовать запросов: загружаем до синхронного get_queryset
+        self.references = await sync_to_async(get_references)()
+        queryset = self.get_queryset()
+        paginator = self.get_paginator(queryset, self.paginate_by)
+        page_number = request.GET.get('page') or 1
+        try:
+            number = int(page_number)
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise Http404('Неверный номер страницы')
+        bottom = (number - 1) * paginator.per_page
+
+        total, products = await asyncio.gather(
+            queryset.acount(),
+            alist(queryset[bottom:bottom + paginator.per_page]),
+        )
+        # Количество уже посчитано, Paginator не должен делать COUNT синхронно
+        paginator.count = total
+        try:
+            page = Page(products, paginator.validate_number(number), paginator)
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        self.object_list = products
+        context = {
+            'view': self,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': products,
+            self.context_object_name: products,
+            **self.get_filter_context(),
+        }
+        return self.render_to_response(context)
+
+
+class ProductDetailView(views.ProductDetailView):
+    async def get(self, request, *args, **kwargs):
+        self.object, (_, customer) = await asyncio.gather(
+            aget_object_or_404(self.get_queryset(), pk=kwargs['pk']),
+            get_customer(request),
+        )
+        in_wishlist, similar_products = await asyncio.gather(
+            self.in_wishlist(customer),
+            alist(self.get_similar_products()),
+        )
+        # Контекст без запросов: минуем синхронный get_context_data родителя
+        context = SingleObjectMixin.get_context_data(self, object=self.object)
+        context['in_wishlist'] = in_wishlist
+        context['similar_products'] = similar_products
+        return self.render_to_response(context)
+
+    async def in_wishlist(self, customer):
+        if customer is None:
+            return False
+        return await Wishlist.objects.filter(customer=customer, product=self.object).aexists()
+
+
+@query_budget(8)
+async def toggle_wishlist(request, product_id):
+    user, customer = await get_customer(request)
+    if not user.is_authenticated:
+        return respond(request, messages.ERROR, 'Необходимо войти в систему', 'accounts:login', status=401)
+    if customer is None:
+        return respond(request, messages.ERROR, 'Только клиенты могут добавлять товары в избранное',
+                       'catalog:product_list', status=403)
+
+    product = await aget_object_or_404(Product, id=product_id, is_active=True)
+    wishlist_item, created = await Wishlist.objects.aget_or_create(customer=customer, product=product)
+    if not created:
+        await wishlist_item.adelete()
+        message = 'Товар удален из избранного'
+    else:
+        message = 'Товар добавлен в избранное'
+    return respond(request, messages.SUCCESS, message,
+                   request.META.get('HTTP_REFERER', 'catalog:product_list'), in_wishlist=created)
+
+
+@query_budget(1)
+async def autocomplete_category(request):
+    query = request.GET.get('q', '').strip()
+    if len(query) < 1:
+        return JsonResponse({'results': []})
+
+    categories = Category.objects.filter(name__icontains=query)[:10]
+    results = [{'id': cat.id, 'text': cat.name} async for cat in categories]
+    return JsonResponse({'results': results})
+
+
+@query_budget(1)
+async def autocomplete_brand(request):
+    query = request.GET.get('q', '').strip()
+    if len(query) < 1:
+        return JsonResponse({'results': []})
+
+    brands = Brand.objects.filter(name__icontains=query)[:10]
+    results = [{'id': brand.id, 'text': brand.name} async for brand in brands]
+    return JsonResponse({'results': results})
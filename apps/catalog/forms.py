@@ -1,5 +1,8 @@
 from django import forms
+from django.utils.functional import cached_property
 from .models import Product, ProductImage, Category, Brand, Size
+from .references import ReferenceChoiceField, get_references
+from .utils import create_with_unique_slug, save_with_unique_slug, unique_slug
 
 
 class ProductForm(forms.ModelForm):
@@ -59,71 +62,53 @@ class ProductForm(forms.ModelForm):
             'is_active': forms.CheckboxInput(attrs={'class': 'form-checkbox'}),
             'legit_check': forms.CheckboxInput(attrs={'class': 'form-checkbox'}),
         }
+        field_classes = {'size': ReferenceChoiceField}
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['size'].queryset = Size.objects.all()
         self.fields['size'].required = False
         self.fields['custom_size'].required = False
+        self.category = self.brand = None
         
         if self.instance and self.instance.pk:
-            if self.instance.category:
-                self.fields['category_name'].initial = self.instance.category.name
-            if self.instance.brand:
-                self.fields['brand_name'].initial = self.instance.brand.name
+            references = get_references()
+            if self.instance.category_id:
+                category = references.get(Category, self.instance.category_id) or self.instance.category
+                self.fields['category_name'].initial = category.name
+            if self.instance.brand_id:
+                brand = references.get(Brand, self.instance.brand_id) or self.instance.brand
+                self.fields['brand_name'].initial = brand.name
+    
+    def find_reference(self, model, name):
+        """Ищет по имени в кеше справочников, при промахе - в базе"""
+        return get_references().get_by_name(model, name) or model.objects.filter(name__iexact=name).first()
     
     def clean_category_name(self):
         category_name = self.cleaned_data.get('category_name', '').strip()
-        if not category_name:
-            return category_name
-        
-        try:
-            category = Category.objects.get(name__iexact=category_name)
-            return category_name
-        except Category.DoesNotExist:
-            from django.utils.text import slugify
-            slug = slugify(category_name)
-            counter = 1
-            while Category.objects.filter(slug=slug).exists():
-                slug = f"{slugify(category_name)}-{counter}"
-                counter += 1
-            category = Category.objects.create(name=category_name, slug=slug)
-            return category_name
+        if category_name:
+            self.category = self.find_reference(Category, category_name)
+        return category_name
     
     def clean_brand_name(self):
         brand_name = self.cleaned_data.get('brand_name', '').strip()
-        if not brand_name:
-            return brand_name
-        
-        try:
-            brand = Brand.objects.get(name__iexact=brand_name)
-            return brand_name
-        except Brand.DoesNotExist:
-            from django.utils.text import slugify
-            slug = slugify(brand_name)
-            counter = 1
-            while Brand.objects.filter(slug=slug).exists():
-                slug = f"{slugify(brand_name)}-{counter}"
-                counter += 1
-            brand = Brand.objects.create(name=brand_name, slug=slug)
-            return brand_name
+        if brand_name:
+            self.brand = self.find_reference(Brand, brand_name)
+        return brand_name
+    
+    def create_missing_references(self):
+        """Новые категория и бренд создаются при сохранении, а не при проверке формы"""
+        if self.category is None and self.cleaned_data.get('category_name'):
+            self.category = create_with_unique_slug(Category, name=self.cleaned_data['category_name'])
+        if self.brand is None and self.cleaned_data.get('brand_name'):
+            self.brand = create_with_unique_slug(Brand, name=self.cleaned_data['brand_name'])
     
     def save(self, commit=True):
         product = super().save(commit=False)
-        
-        category_name = self.cleaned_data.get('category_name', '').strip()
-        if category_name:
-            try:
-                product.category = Category.objects.get(name__iexact=category_name)
-            except Category.DoesNotExist:
-                pass
-        
-        brand_name = self.cleaned_data.get('brand_name', '').strip()
-        if brand_name:
-            try:
-                product.brand = Brand.objects.get(name__iexact=brand_name)
-            except Brand.DoesNotExist:
-                pass
+        self.create_missing_references()
+        if self.category:
+            product.category = self.category
+        if self.brand:
+            product.brand = self.brand
         
         if commit:
             product.save()
@@ -147,10 +132,47 @@ class ProductImageForm(forms.ModelForm):
         }
 
 
+class LoadedImageChoiceField(forms.ModelChoiceField):
+    """
+    Поле id формы изображения: значение ищется среди изображений товара, уже
+    загруженных формсетом, а не отдельным запросом на каждую форму.
+    """
+    
+    def __init__(self, images, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.images = images
+    
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, ProductImage):
+            return value
+        try:
+            return self.images[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+
+
+class BaseProductImageFormSet(forms.BaseInlineFormSet):
+    @cached_property
+    def loaded_images(self):
+        return {image.pk: image for image in self.get_queryset()}
+    
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        field = form.fields[self._pk_field.name]
+        form.fields[self._pk_field.name] = LoadedImageChoiceField(
+            self.loaded_images, field.queryset, initial=field.initial, required=False, widget=field.widget,
+        )
+
+
 ProductImageFormSet = forms.inlineformset_factory(
     Product,
     ProductImage,
     form=ProductImageForm,
+    formset=BaseProductImageFormSet,
     extra=3,
     can_delete=True
 )
@@ -173,11 +195,13 @@ class BrandForm(forms.ModelForm):
     
     def save(self, commit=True):
         brand = super().save(commit=False)
-        if not brand.slug:
-            from django.utils.text import slugify
-            brand.slug = slugify(brand.name)
         if commit:
-            brand.save()
+            if brand.slug:
+                brand.save()
+            else:
+                save_with_unique_slug(brand)
+        elif not brand.slug:
+            brand.slug = unique_slug(Brand, brand.name)
         return brand
 
 
@@ -193,26 +217,22 @@ class CategoryForm(forms.ModelForm):
             'parent': forms.Select(attrs={'class': 'form-input'}),
             'size_type': forms.Select(attrs={'class': 'form-input'}),
         }
+        field_classes = {'parent': ReferenceChoiceField}
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['parent'].queryset = Category.objects.all()
         self.fields['parent'].required = False
         self.fields['size_type'].required = False
     
     def save(self, commit=True):
         category = super().save(commit=False)
-        if not category.slug:
-            from django.utils.text import slugify
-            base_slug = slugify(category.name)
-            slug = base_slug
-            counter = 1
-            while Category.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            category.slug = slug
         if commit:
-            category.save()
+            if category.slug:
+                category.save()
+            else:
+                save_with_unique_slug(category)
+        elif not category.slug:
+            category.slug = unique_slug(Category, category.name)
         return category
 
 
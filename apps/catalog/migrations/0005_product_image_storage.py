@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 15:47
+
+import apps.core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_product_product_listed_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=apps.core.storage.product_image_storage, upload_to='products/images/'),
+        ),
+    ]
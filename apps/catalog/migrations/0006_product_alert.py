@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 16:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('price_drop', 'Снижение цены'), ('back_in_stock', 'Снова в наличии')], max_length=20)),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Оповещение по избранному',
+                'verbose_name_plural': 'Оповещения по избранному',
+            },
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models import DEFERRED, Q
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+
+from apps.core.storage import product_image_storage
 
 
 class Wishlist(models.Model):
@@ -119,6 +123,36 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        indexes = [
+            # Каталог: только активные непроданные товары, сортировка по дате или цене
+            models.Index(
+                fields=['-created_at'],
+                name='product_listed_created_idx',
+                condition=Q(is_active=True, is_sold=False),
+            ),
+            models.Index(
+                fields=['price'],
+                name='product_listed_price_idx',
+                condition=Q(is_active=True, is_sold=False),
+            ),
+            models.Index(
+                fields=['category', '-created_at'],
+                name='product_listed_category_idx',
+                condition=Q(is_active=True, is_sold=False),
+            ),
+            models.Index(
+                fields=['brand', '-created_at'],
+                name='product_listed_brand_idx',
+                condition=Q(is_active=True, is_sold=False),
+            ),
+            # Кабинет и публичная страница продавца
+            models.Index(fields=['seller', '-created_at'], name='product_seller_created_idx'),
+            models.Index(
+                fields=['seller', '-created_at'],
+                name='product_seller_listed_idx',
+                condition=Q(is_active=True, is_sold=False),
+            ),
+        ]
     
     @property
     def display_size(self):
@@ -128,13 +162,25 @@ class Product(models.Model):
             return self.size.display_value
         return "Не указан"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Цена и остаток на момент загрузки: по ним post_save находит снижение цены
+        # и возвращение в продажу для оповещений из избранного, а вместе с брендом и
+        # категорией - изменения для истории цен
+        instance._loaded_price = instance.__dict__.get('price')
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        instance._loaded_brand_id = instance.__dict__.get('brand_id', DEFERRED)
+        instance._loaded_category_id = instance.__dict__.get('category_id', DEFERRED)
+        return instance
+
     def __str__(self):
         return f"{self.title} - {self.display_size}"
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/images/')
+    image = models.ImageField(upload_to='products/images/', storage=product_image_storage)
     order = models.PositiveIntegerField(default=0, help_text="Порядок отображения")
     is_main = models.BooleanField(default=False, help_text="Главное изображение")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -148,6 +194,59 @@ class ProductImage(models.Model):
         return f"Изображение {self.id} для {self.product.title}"
 
 
+class AlertKind(models.TextChoices):
+    PRICE_DROP = 'price_drop', 'Снижение цены'
+    BACK_IN_STOCK = 'back_in_stock', 'Снова в наличии'
+
+
+class ProductAlert(models.Model):
+    """
+    Изменение товара, о котором нужно оповестить добавивших его в избранное.
+    Запись - один короткий INSERT в запросе продавца; рассылку выполняет
+    команда send_product_alerts.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=AlertKind.choices)
+    # Цена до снижения; текущая берется из товара в момент рассылки
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Оповещение по избранному"
+        verbose_name_plural = "Оповещения по избранному"
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: товар {self.product_id}"
+
+
+class PriceChange(models.Model):
+    """
+    История цен товара, только добавление: строка пишется при выставлении товара
+    и при каждом изменении цены, неизменная цена не повторяется. Бренд и категория
+    копируются из товара на момент изменения, поэтому медианы по ним считаются по
+    индексам этой таблицы, без соединения с товарами и заказами. Историю старше
+    месяца прореживает команда compact_price_history.
+    """
+    # Отдельные индексы внешних ключей не нужны: их покрывают составные индексы ниже
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_changes', db_index=False)
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, related_name='+', db_index=False)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+', db_index=False)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Изменение цены"
+        verbose_name_plural = "История цен"
+        indexes = [
+            models.Index(fields=['product', 'changed_at'], name='pricechange_product_idx'),
+            models.Index(fields=['brand', 'changed_at'], name='pricechange_brand_idx'),
+            models.Index(fields=['category', 'changed_at'], name='pricechange_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"Товар {self.product_id}: {self.price} ({self.changed_at:%d.%m.%Y})"
+
+
 class Review(models.Model):
     customer = models.ForeignKey('accounts.Customer', on_delete=models.CASCADE, related_name='reviews')
     seller = models.ForeignKey('accounts.Seller', on_delete=models.CASCADE, related_name='reviews')
@@ -163,3 +262,10 @@ class Review(models.Model):
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+        indexes = [
+            models.Index(
+                fields=['seller', '-created_at'],
+                name='review_seller_approved_idx',
+                condition=Q(is_approved=True),
+            ),
+        ]
@@ -0,0 +1,170 @@
+"""
+История цен товаров и рыночная цена по бренду и категории.
+
+В PriceChange попадают только изменения: цена при выставлении товара, каждая
+новая цена после save() или пакетного действия продавца и перенос товара в другой
+бренд или категорию. Цена на любой момент -
+последняя строка до него, поэтому график товара читается по индексу
+(product, changed_at), а рыночная цена - медиана последних цен товаров бренда или
+категории за MARKET_WINDOW по индексам (brand, changed_at) и (category, changed_at),
+без обхода заказов. compact_history (команда compact_price_history) оставляет в
+истории старше COMPACT_AFTER одну цену товара за день и убирает повторы.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connections, models, transaction
+from django.db.models import DEFERRED, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import PriceChange
+
+
+CHUNK_SIZE = 1000
+MARKET_WINDOW = timedelta(days=90)
+COMPACT_AFTER = timedelta(days=30)
+CENT = Decimal('0.01')
+
+
+class Median(models.Aggregate):
+    """PERCENTILE_CONT(0.5) есть только в PostgreSQL; на других базах median() берет число строк и средние строки"""
+    function = 'PERCENTILE_CONT'
+    name = 'Median'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = models.FloatField()
+
+
+class MarketPrice:
+    def __init__(self, median=None, count=0):
+        self.median = median
+        # Число товаров, по последним ценам которых посчитана медиана
+        self.count = count
+
+    def __bool__(self):
+        return bool(self.count)
+
+
+def price_change(product, created):
+    """
+    Строка истории для товара, сохраненного через save(); None, если не менялись ни
+    цена, ни бренд с категорией: последняя строка определяет, в чью рыночную цену
+    входит товар
+    """
+    old_price = getattr(product, '_loaded_price', None)
+    price_changed = old_price is not None and product.price != old_price
+    moved = any(
+        getattr(product, f'_loaded_{field}', DEFERRED) not in (DEFERRED, getattr(product, field))
+        for field in ('brand_id', 'category_id')
+    )
+    product._loaded_brand_id = product.brand_id
+    product._loaded_category_id = product.category_id
+    if not (created or price_changed or moved):
+        return None
+    return PriceChange(
+        product=product, brand_id=product.brand_id, category_id=product.category_id, price=product.price,
+    )
+
+
+def record_price_changes(rows, old_prices=None):
+    """
+    rows - (id, цена, бренд, категория) после пакетного изменения или создания,
+    old_prices - {id: цена до изменения}; товары с прежней ценой пропускаются.
+    """
+    old_prices = old_prices or {}
+    PriceChange.objects.bulk_create([
+        PriceChange(product_id=pk, price=price, brand_id=brand_id, category_id=category_id)
+        for pk, price, brand_id, category_id in rows if old_prices.get(pk) != price
+    ], batch_size=CHUNK_SIZE)
+
+
+def price_history(product_id, since=None):
+    """[(время изменения, цена)] товара по возрастанию времени"""
+    queryset = PriceChange.objects.filter(product_id=product_id)
+    if since is not None:
+        queryset = queryset.filter(changed_at__gte=since)
+    return list(queryset.order_by('changed_at', 'pk').values_list('changed_at', 'price'))
+
+
+def latest_prices(since, brand_id=None, category_id=None):
+    """Последние цены товаров бренда и/или категории, выставленные или измененные с since"""
+    queryset = PriceChange.objects.filter(changed_at__gte=since)
+    if brand_id is not None:
+        queryset = queryset.filter(brand_id=brand_id)
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    later = PriceChange.objects.filter(
+        Q(changed_at__gt=OuterRef('changed_at')) | Q(changed_at=OuterRef('changed_at'), pk__gt=OuterRef('pk')),
+        product_id=OuterRef('product_id'),
+    )
+    return queryset.filter(~Exists(later))
+
+
+def median(queryset, field='price'):
+    if connections[queryset.db].vendor == 'postgresql':
+        result = queryset.aggregate(median=Median(field), count=models.Count('pk'))
+        value, count = result['median'], result['count']
+    else:
+        # Без PERCENTILE_CONT: число строк и одна-две средние строки по порядку
+        count = queryset.count()
+        if not count:
+            return MarketPrice()
+        middle = list(queryset.order_by(field).values_list(field, flat=True)[(count - 1) // 2:count // 2 + 1])
+        value = sum(middle) / len(middle)
+    if value is None:
+        return MarketPrice()
+    return MarketPrice(Decimal(value).quantize(CENT), count)
+
+
+def market_price(brand_id=None, category_id=None, window=MARKET_WINDOW):
+    return median(latest_prices(timezone.now() - window, brand_id, category_id))
+
+
+def compact_history(before=None, chunk_size=CHUNK_SIZE):
+    """
+    В истории старше before оставляет последнюю цену товара за каждый день и
+    удаляет строки, повторяющие предыдущую оставленную цену. Товары
+    обрабатываются порциями по chunk_size, каждая порция - в своей транзакции.
+    Возвращает число удаленных строк.
+    """
+    before = before or timezone.now() - COMPACT_AFTER
+    old = PriceChange.objects.filter(changed_at__lt=before)
+    deleted = 0
+    last_product_id = 0
+    while True:
+        product_ids = list(
+            old.filter(product_id__gt=last_product_id).order_by('product_id')
+            .values_list('product_id', flat=True).distinct()[:chunk_size]
+        )
+        if not product_ids:
+            return deleted
+        last_product_id = product_ids[-1]
+        rows = old.filter(product_id__in=product_ids).order_by('product_id', 'changed_at', 'pk').values_list(
+            'pk', 'product_id', 'changed_at', 'price', 'brand_id', 'category_id',
+        )
+        stale = []
+        for _, group in groupby(rows.iterator(chunk_size=CHUNK_SIZE), key=itemgetter(1)):
+            stale.extend(redundant_changes(list(group)))
+        with transaction.atomic():
+            for start in range(0, len(stale), CHUNK_SIZE):
+                deleted += PriceChange.objects.filter(pk__in=stale[start:start + CHUNK_SIZE]).delete()[0]
+
+
+def redundant_changes(rows):
+    """
+    Первичные ключи лишних строк истории одного товара, rows упорядочены по времени.
+    Повтор - та же цена при тех же бренде и категории.
+    """
+    stale = []
+    kept = None
+    for n, (pk, _, changed_at, *values) in enumerate(rows):
+        following = rows[n + 1] if n + 1 < len(rows) else None
+        if following and timezone.localdate(following[2]) == timezone.localdate(changed_at):
+            # За день остается последняя цена
+            stale.append(pk)
+        elif values == kept:
+            stale.append(pk)
+        else:
+            kept = values
+    return stale
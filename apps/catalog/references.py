@@ -0,0 +1,145 @@
+"""
+Кеш справочников (бренды, категории, размеры) в памяти процесса.
+
+Справочники меняются редко, а нужны почти каждой странице каталога и каждой форме
+продавца. Снимок загружается тремя запросами и живет в процессе, пока не изменится
+версия в кеше Django: сигналы post_save/post_delete увеличивают версию, и остальные
+процессы перечитывают снимок при следующем обращении. Версию видят все процессы
+только при общем кеше (CACHE_REDIS_URL), поэтому снимок к тому же живет не дольше
+SNAPSHOT_TTL секунд: без общего кеша изменения из другого процесса появляются с этой
+задержкой.
+"""
+import threading
+import time
+
+from django import forms
+from django.core.cache import cache
+from django.forms.models import ModelChoiceIterator
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from .models import Brand, Category, Size
+
+
+VERSION_KEY = 'catalog:references:version'
+SNAPSHOT_TTL = 60
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class References:
+    """Неизменяемый снимок справочников: списки и индексы по id, slug и имени без учета регистра"""
+
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.brands = list(Brand.objects.order_by('name'))
+        self.categories = list(Category.objects.select_related('parent').order_by('name'))
+        self.sizes = list(Size.objects.all())
+        self.root_categories = [category for category in self.categories if category.parent_id is None]
+
+        self.options = {}
+        self.by_id = {}
+        self.by_slug = {}
+        self.by_name = {}
+        for model, objects in ((Brand, self.brands), (Category, self.categories), (Size, self.sizes)):
+            self.by_id[model] = {obj.pk: obj for obj in objects}
+            if model is not Size:
+                self.by_slug[model] = {obj.slug: obj for obj in objects}
+                names = self.by_name[model] = {}
+                for obj in objects:
+                    names.setdefault(obj.name.lower(), obj)
+
+    def is_current(self, version):
+        return self.version == version and time.monotonic() - self.built_at < SNAPSHOT_TTL
+
+    def items(self, model):
+        return {Brand: self.brands, Category: self.categories, Size: self.sizes}[model]
+
+    def get(self, model, pk):
+        return self.by_id[model].get(pk)
+
+    def get_by_slug(self, model, slug):
+        return self.by_slug[model].get(slug)
+
+    def get_by_name(self, model, name):
+        return self.by_name[model].get(name.strip().lower())
+
+    def options_html(self, model, selected=''):
+        """
+        <option> для фильтров каталога: фрагмент строится один раз на снимок,
+        выбранное значение отмечается заменой строки вместо рендеринга цикла в шаблоне
+        """
+        html = self.options.get(model)
+        if html is None:
+            html = self.options[model] = format_html_join(
+                '', '<option value="{}">{}</option>', ((obj.slug, obj.name) for obj in self.items(model)),
+            )
+        if selected:
+            option = format_html('<option value="{}">', selected)
+            html = html.replace(option, option[:-1] + ' selected>', 1)
+        return mark_safe(html)
+
+
+def current_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def get_references():
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot is None or not snapshot.is_current(version):
+        with _lock:
+            if _snapshot is None or not _snapshot.is_current(version):
+                _snapshot = References(version)
+            snapshot = _snapshot
+    return snapshot
+
+
+def invalidate_references(**kwargs):
+    """Обработчик сигналов; вызывается и явно после bulk_create/update, которые сигналов не шлют"""
+    global _snapshot
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+    _snapshot = None
+
+
+class ReferenceChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in get_references().items(self.queryset.model):
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(get_references().items(self.queryset.model)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(get_references().items(self.queryset.model))
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """
+    Выбор бренда, категории или размера: варианты и проверка значения берутся из кеша
+    справочников, а не из queryset поля. Ограничения queryset не учитываются.
+    """
+    iterator = ReferenceChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            return value
+        try:
+            obj = get_references().get(self.queryset.model, int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        return obj
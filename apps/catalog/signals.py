@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .alerts import product_alerts
+from .models import Brand, Category, Product, ProductAlert, Size
+from .prices import price_change
+from .references import invalidate_references
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Size)
+def reference_changed(sender, **kwargs):
+    # Сразу - для текущего процесса, после фиксации - чтобы другие процессы
+    # не закешировали снимок до коммита
+    invalidate_references()
+    transaction.on_commit(invalidate_references)
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, **kwargs):
+    # До product_alerts: она запоминает новую цену как загруженную
+    change = price_change(instance, created)
+    if change:
+        change.save()
+    # Снижение цены и возвращение в продажу ставятся в очередь оповещений по избранному
+    alerts = product_alerts(instance)
+    if alerts:
+        ProductAlert.objects.bulk_create(alerts)
@@ -1,3 +1,460 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.bulk_actions import apply_bulk_action
+from apps.accounts.models import Seller
+from apps.accounts.seller_views import SellerProductListView
+from apps.analytics.models import ProductView, SearchQuery
+from apps.core.models import DeletionJob, Notification, NotificationType
+from apps.core.testing import (
+    QueryBudgetMixin, TempMediaMixin, make_brand, make_category, make_customer, make_product,
+    make_seller, make_size, make_user, views_urlconf,
+)
+from . import alerts, prices, references, utils
+from .forms import BrandForm, ProductForm
+from .models import AlertKind, Brand, Category, PriceChange, Product, ProductAlert, Review, Wishlist
+from .views import ProductListView
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запросов проверяется на SQLite')
+class ProductIndexUsageTests(TestCase):
+    """Горячие запросы каталога должны использовать составные индексы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('seller', password='pass')
+        cls.seller = Seller.objects.create(user=user, name='Seller', email='s@example.com', phone='+79991234567')
+        cls.factory = RequestFactory()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def catalog_queryset(self, **params):
+        view = ProductListView()
+        view.setup(self.factory.get('/catalog/', params))
+        return view.get_queryset()
+
+    def seller_queryset(self, **params):
+        request = self.factory.get('/accounts/seller/products/', params)
+        request.user = self.seller.user
+        view = SellerProductListView()
+        view.setup(request)
+        return view.get_queryset()
+
+    def test_catalog_newest(self):
+        self.assertUsesIndex(self.catalog_queryset(), 'product_listed_created_idx')
+
+    def test_catalog_by_price(self):
+        self.assertUsesIndex(self.catalog_queryset(sort='price_asc'), 'product_listed_price_idx')
+        self.assertUsesIndex(self.catalog_queryset(sort='price_desc'), 'product_listed_price_idx')
+
+    def test_catalog_by_category(self):
+        self.assertUsesIndex(self.catalog_queryset(category='shoes'), 'product_listed_category_idx')
+
+    def test_catalog_by_brand(self):
+        self.assertUsesIndex(self.catalog_queryset(brand='nike'), 'product_listed_brand_idx')
+
+    def test_seller_products(self):
+        self.assertUsesIndex(self.seller_queryset(), 'product_seller_created_idx')
+        self.assertUsesIndex(self.seller_queryset(status='sold'), 'product_seller_created_idx')
+
+    def test_seller_public_products(self):
+        queryset = Product.objects.filter(seller=self.seller, is_active=True, is_sold=False)
+        self.assertUsesIndex(queryset, 'product_seller_listed_idx')
+
+    def test_seller_reviews(self):
+        queryset = Review.objects.filter(seller=self.seller, is_approved=True).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'review_seller_approved_idx')
+
+    def test_analytics_tables(self):
+        self.assertUsesIndex(ProductView.objects.all()[:50], 'productview_viewed_idx')
+        self.assertUsesIndex(ProductView.objects.filter(product_id=1), 'productview_product_idx')
+        self.assertUsesIndex(SearchQuery.objects.all()[:50], 'searchquery_searched_idx')
+        self.assertUsesIndex(SearchQuery.objects.filter(query='nike'), 'searchquery_query_idx')
+
+
+class CatalogQueryBudgetTests(QueryBudgetMixin, TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = make_category()
+        cls.brand = make_brand()
+        size = make_size()
+        seller = make_seller()
+        cls.products = [
+            make_product(seller=seller, category=cls.category, brand=cls.brand, size=size, images=2)
+            for _ in range(30)
+        ]
+        cls.customer = make_customer()
+        for product in cls.products[:10]:
+            Wishlist.objects.create(customer=cls.customer, product=product)
+
+    def test_product_list(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('catalog:product_list')))
+        self.assertWithinQueryBudget(self.client.get(reverse('catalog:product_list'), {
+            'q': 'Product', 'category': self.category.slug, 'brand': self.brand.slug, 'sort': 'price_asc',
+        }))
+
+    def test_product_detail(self):
+        url = reverse('catalog:product_detail', args=[self.products[0].pk])
+        self.assertWithinQueryBudget(self.client.get(url))
+        self.client.force_login(self.customer.user)
+        self.assertWithinQueryBudget(self.client.get(url))
+
+    def test_wishlist(self):
+        self.client.force_login(self.customer.user)
+        self.assertWithinQueryBudget(self.client.get(reverse('catalog:wishlist')))
+        url = reverse('catalog:toggle_wishlist', args=[self.products[-1].pk])
+        self.assertWithinQueryBudget(self.client.post(url))
+        self.assertWithinQueryBudget(self.client.post(url))
+
+    def test_autocomplete(self):
+        for name in ('catalog:autocomplete_category', 'catalog:autocomplete_brand'):
+            response = self.client.get(reverse(name), {'q': 'a'})
+            self.assertWithinQueryBudget(response)
+
+
+@override_settings(ROOT_URLCONF=views_urlconf(use_async=True))
+class AsyncCatalogViewsTests(QueryBudgetMixin, TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = make_category()
+        cls.brand = make_brand(name='Nike')
+        seller = make_seller()
+        cls.products = [
+            make_product(seller=seller, category=cls.category, brand=cls.brand, images=1)
+            for _ in range(30)
+        ]
+        cls.customer = make_customer()
+        Wishlist.objects.create(customer=cls.customer, product=cls.products[0])
+
+    def product_ids(self, response):
+        return [product.pk for product in response.context['products']]
+
+    def test_product_list_matches_sync(self):
+        params = {'brand': self.brand.slug, 'sort': 'price_asc', 'page': 2}
+        response = self.client.get(reverse('catalog:product_list'), params)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.context['page_obj'].number, 2)
+        with override_settings(ROOT_URLCONF=views_urlconf(use_async=False)):
+            expected = self.client.get(reverse('catalog:product_list'), params)
+        self.assertEqual(self.product_ids(response), self.product_ids(expected))
+        self.assertEqual(response.context['paginator'].count, 30)
+
+    def test_product_list_invalid_page(self):
+        for page in ('0', 'abc', '99'):
+            with self.subTest(page=page):
+                self.assertEqual(self.client.get(reverse('catalog:product_list'), {'page': page}).status_code, 404)
+
+    def test_product_detail(self):
+        self.client.force_login(self.customer.user)
+        response = self.client.get(reverse('catalog:product_detail', args=[self.products[0].pk]))
+        self.assertWithinQueryBudget(response)
+        self.assertTrue(response.context['in_wishlist'])
+        self.assertEqual(len(response.context['similar_products']), 4)
+
+    def test_toggle_wishlist_json(self):
+        url = reverse('catalog:toggle_wishlist', args=[self.products[1].pk])
+        self.assertEqual(self.client.post(url, HTTP_ACCEPT='application/json').status_code, 401)
+
+        self.client.force_login(self.customer.user)
+        response = self.client.post(url, HTTP_ACCEPT='application/json')
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.json()['in_wishlist'], True)
+        self.assertFalse(self.client.post(url, HTTP_ACCEPT='application/json').json()['in_wishlist'])
+        self.assertRedirects(self.client.post(url), reverse('catalog:product_list'), fetch_redirect_response=False)
+
+    def test_autocomplete(self):
+        response = self.client.get(reverse('catalog:autocomplete_brand'), {'q': 'nik'})
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.json()['results'], [{'id': self.brand.pk, 'text': 'Nike'}])
+
+    async def test_asgi_request(self):
+        response = await self.async_client.get(reverse('catalog:product_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 24)
+
+
+class SlugAllocationTests(TestCase):
+    def test_next_free_suffix_in_one_query(self):
+        make_brand(name='Nike', slug='nike')
+        make_brand(name='Nike SB', slug='nike-1')
+        make_brand(name='Other', slug='other')
+        with self.assertNumQueries(1):
+            self.assertEqual(utils.allocate_slugs(Brand, ['NIKE', 'nike', 'Кроссовки']), ['nike-2', 'nike-3', 'krossovki'])
+
+    def test_forms(self):
+        make_category(name='Обувь', slug='obuv')
+        form = ProductForm(data={
+            'title': 'Air Max', 'description': 'Описание', 'price': '100', 'quantity': 1, 'condition': 'new',
+            'category_name': 'обувь ', 'brand_name': 'Новый бренд',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        # Проверка формы ничего не создает: новый бренд появляется при сохранении
+        self.assertFalse(Brand.objects.exists())
+        form.save(commit=False)
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Brand.objects.get(name='Новый бренд').slug, 'novyy-brend')
+
+        form = BrandForm(data={'name': 'Новый бренд'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().slug, 'novyy-brend-1')
+
+    def test_retry_when_slug_taken_concurrently(self):
+        make_brand(name='Adidas', slug='adidas')
+        # Первый подбор видит устаревшее состояние, как параллельный запрос до вставки
+        with mock.patch.object(utils, 'unique_slug', side_effect=['adidas', 'adidas-1']):
+            brand = utils.create_with_unique_slug(Brand, name='Adidas')
+        self.assertEqual(brand.slug, 'adidas-1')
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        references.invalidate_references()
+
+    def test_snapshot_reused_until_reference_changes(self):
+        brand = make_brand(name='Stone Island')
+        size = make_size(value='L', display_value='L')
+        with self.assertNumQueries(3):
+            references.get_references()
+        with self.assertNumQueries(0):
+            snapshot = references.get_references()
+            self.assertEqual(snapshot.get_by_name(Brand, ' stone island'), brand)
+            self.assertIn(f'value="{size.pk}"', str(ProductForm()['size']))
+            form = ProductForm(data={
+                'title': 'Куртка', 'description': 'Описание', 'price': '100', 'quantity': 1,
+                'condition': 'new', 'size': size.pk, 'brand_name': 'STONE ISLAND',
+            })
+        # Остается только проверка внешнего ключа в Model.full_clean
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual((form.cleaned_data['size'], form.brand), (size, brand))
+
+        brand.name = 'Stone Island Shadow'
+        brand.save()
+        self.assertIsNone(references.get_references().get_by_name(Brand, 'stone island'))
+
+    def test_snapshot_expires(self):
+        snapshot = references.get_references()
+        # Справочник изменен в другом процессе: версия в кеше этого процесса прежняя
+        Brand.objects.bulk_create([Brand(name='Acne Studios', slug='acne-studios')])
+        self.assertIs(references.get_references(), snapshot)
+        with mock.patch.object(references.time, 'monotonic', return_value=snapshot.built_at + references.SNAPSHOT_TTL):
+            self.assertIsNotNone(references.get_references().get_by_name(Brand, 'acne studios'))
+
+    def test_unknown_choice(self):
+        form = ProductForm(data={'title': 'X', 'price': '1', 'quantity': 1, 'condition': 'new', 'size': 999999})
+        self.assertIn('size', form.errors)
+
+
+class ProductAlertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        cls.product = make_product(seller=cls.seller, price=Decimal('1000.00'))
+        cls.sold_out = make_product(seller=cls.seller, quantity=0)
+        cls.customers = [make_customer() for _ in range(3)]
+        for customer in cls.customers:
+            Wishlist.objects.create(customer=customer, product=cls.product)
+        Wishlist.objects.create(customer=cls.customers[0], product=cls.sold_out)
+
+    def send(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return alerts.send_alerts()
+
+    def test_price_drop_on_save(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = Decimal('800.00')
+        product.save()
+        product.price = Decimal('700.00')
+        product.save()
+        product.title = 'Куртка'
+        product.save()
+        self.assertEqual(ProductAlert.objects.filter(kind=AlertKind.PRICE_DROP).count(), 2)
+
+        # Очередь, товары, избранное, удаление очереди, недавние уведомления, вставка и точка сохранения
+        with self.assertNumQueries(8):
+            report = self.send()
+        self.assertEqual((report.alerts, report.products, report.recipients), (2, 1, 3))
+        self.assertFalse(ProductAlert.objects.exists())
+        notifications = Notification.objects.filter(notification_type=NotificationType.PRICE_DROP)
+        self.assertEqual(
+            sorted(notifications.values_list('user_id', flat=True)),
+            sorted(customer.user_id for customer in self.customers),
+        )
+        self.assertEqual(notifications[0].message, '1000.00 ₽ → 700.00 ₽')
+        self.assertEqual(notifications[0].link, reverse('catalog:product_detail', args=[product.pk]))
+
+        # Повтор, пока прошлое оповещение не прочитано, не рассылается
+        ProductAlert.objects.create(product=product, kind=AlertKind.PRICE_DROP, old_price=Decimal('1000.00'))
+        self.send()
+        self.assertEqual(notifications.count(), 3)
+
+    def test_back_in_stock(self):
+        product = Product.objects.get(pk=self.sold_out.pk)
+        product.quantity = 2
+        product.save()
+        self.send()
+        notification = Notification.objects.get(notification_type=NotificationType.BACK_IN_STOCK)
+        self.assertEqual(notification.user_id, self.customers[0].user_id)
+
+    def test_bulk_price_drop(self):
+        queryset = Product.objects.filter(pk=self.product.pk)
+        apply_bulk_action(self.seller, queryset, 'price_percent', Decimal('10'))
+        self.assertFalse(ProductAlert.objects.exists())
+        apply_bulk_action(self.seller, queryset, 'price_fixed', Decimal('-500'))
+        self.assertEqual(ProductAlert.objects.get().old_price, Decimal('1100.00'))
+
+        # Товар сняли с продажи до рассылки - оповещать не о чем
+        apply_bulk_action(self.seller, queryset, 'deactivate')
+        report = self.send()
+        self.assertEqual((report.alerts, report.recipients), (1, 0))
+        self.assertFalse(Notification.objects.exists())
+
+
+class PriceHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_seller()
+        cls.brand = make_brand()
+        cls.category = make_category()
+        cls.product = make_product(seller=cls.seller, brand=cls.brand, category=cls.category, price=Decimal('1000.00'))
+
+    def history(self, product):
+        return [price for _, price in prices.price_history(product.pk)]
+
+    def test_save_records_changes_only(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = Decimal('900.00')
+        product.save()
+        product.title = 'Куртка'
+        product.save()
+        self.assertEqual(self.history(product), [Decimal('1000.00'), Decimal('900.00')])
+        change = PriceChange.objects.latest('changed_at')
+        self.assertEqual((change.brand, change.category), (self.brand, self.category))
+
+    def test_move_to_other_category(self):
+        other = make_category()
+        make_product(category=other, price=Decimal('100.00'))
+        product = Product.objects.get(pk=self.product.pk)
+        product.category = other
+        product.save()
+        product.title = 'Куртка'
+        product.save()
+
+        # Цена прежняя, но товар теперь входит в рыночную цену новой категории
+        self.assertEqual(self.history(product), [Decimal('1000.00'), Decimal('1000.00')])
+        self.assertFalse(prices.market_price(category_id=self.category.pk))
+        market = prices.market_price(category_id=other.pk)
+        self.assertEqual((market.median, market.count), (Decimal('550.00'), 2))
+
+    def test_bulk_price_change(self):
+        free = make_product(seller=self.seller, price=Decimal('0.00'))
+        queryset = Product.objects.filter(pk__in=[self.product.pk, free.pk])
+        apply_bulk_action(self.seller, queryset, 'price_percent', Decimal('10'))
+        apply_bulk_action(self.seller, queryset, 'deactivate')
+        self.assertEqual(self.history(self.product), [Decimal('1000.00'), Decimal('1100.00')])
+        # Нулевая цена после наценки не изменилась - в истории только цена при выставлении
+        self.assertEqual(self.history(free), [Decimal('0.00')])
+
+    def test_market_price(self):
+        for price in ['100.00', '200.00', '400.00']:
+            make_product(brand=self.brand, price=Decimal(price))
+        make_product(category=self.category, price=Decimal('50.00'))
+        # Учитывается только последняя цена товара
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = Decimal('300.00')
+        product.save()
+
+        with self.assertNumQueries(2 if connection.vendor != 'postgresql' else 1):
+            brand = prices.market_price(brand_id=self.brand.pk)
+        self.assertEqual((brand.median, brand.count), (Decimal('250.00'), 4))
+        category = prices.market_price(category_id=self.category.pk)
+        self.assertEqual((category.median, category.count), (Decimal('175.00'), 2))
+        self.assertFalse(prices.market_price(brand_id=make_brand().pk))
+
+        # Цена, выставленная до окна, в рыночную не входит
+        PriceChange.objects.filter(price=Decimal('50.00')).update(changed_at=timezone.now() - timedelta(days=120))
+        self.assertEqual(prices.market_price(category_id=self.category.pk).count, 1)
+
+    def test_compaction(self):
+        day = timezone.now() - timedelta(days=60)
+        other = make_product()
+        PriceChange.objects.all().delete()
+        PriceChange.objects.bulk_create([
+            PriceChange(product=self.product, price=Decimal('100.00'), changed_at=day),
+            # В течение следующего дня цену снизили и вернули: после прореживания это повтор
+            PriceChange(product=self.product, price=Decimal('80.00'), changed_at=day + timedelta(days=1)),
+            PriceChange(product=self.product, price=Decimal('100.00'), changed_at=day + timedelta(days=1, hours=1)),
+            PriceChange(product=self.product, price=Decimal('90.00'), changed_at=day + timedelta(days=3)),
+            PriceChange(product=self.product, price=Decimal('95.00'), changed_at=day + timedelta(days=3, hours=1)),
+            # Та же цена в другой категории - не повтор
+            PriceChange(product=self.product, price=Decimal('95.00'), changed_at=day + timedelta(days=5)),
+            PriceChange(
+                product=self.product, price=Decimal('95.00'), category=self.category, changed_at=day + timedelta(days=6),
+            ),
+            # Свежая история не прореживается
+            PriceChange(product=self.product, price=Decimal('70.00'), changed_at=timezone.now() - timedelta(hours=2)),
+            PriceChange(product=self.product, price=Decimal('75.00'), changed_at=timezone.now() - timedelta(hours=1)),
+            PriceChange(product=other, price=Decimal('10.00'), changed_at=day),
+        ])
+
+        out = io.StringIO()
+        call_command('compact_price_history', '--chunk-size', '1', stdout=out)
+        self.assertIn('Удалено строк истории цен: 4', out.getvalue())
+        self.assertEqual(
+            self.history(self.product), [Decimal(price) for price in ['100.00', '95.00', '95.00', '70.00', '75.00']],
+        )
+        self.assertEqual(self.history(other), [Decimal('10.00')])
+
+    def test_seller_widget(self):
+        make_product(brand=self.brand, price=Decimal('600.00'))
+        self.client.force_login(self.seller.user)
+        response = self.client.get(reverse('accounts:seller_product_edit', args=[self.product.pk]))
+        self.assertContains(response, f'Бренд {self.brand.name}: медиана 800.00 ₽, товаров: 2')
+        self.assertContains(response, f'Категория {self.category.name}: медиана 1000.00 ₽, товаров: 1')
+
+
+class ProductAdminDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = make_user(is_staff=True, is_superuser=True)
+        cls.product = make_product()
+        ProductView.objects.bulk_create([ProductView(product=cls.product, ip_address='127.0.0.1') for _ in range(15)])
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+        self.url = reverse('admin:catalog_product_delete', args=[self.product.pk])
+
+    def test_confirmation_shows_counts_and_sample(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Просмотры товаров: 15')
+        self.assertContains(response, '… и еще 5')
+
+    def test_delete_is_queued(self):
+        response = self.client.post(self.url, {'post': 'yes'})
+        self.assertRedirects(response, reverse('admin:catalog_product_changelist'), fetch_redirect_response=False)
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.model, job.object_ids), ('catalog.product', [str(self.product.pk)]))
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.is_active)
+
+        call_command('process_deletions', stdout=io.StringIO())
+        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
+        self.assertFalse(ProductView.objects.exists())
+
+    def test_delete_selected_action(self):
+        self.client.post(reverse('admin:catalog_product_changelist'), {
+            'action': 'delete_selected', '_selected_action': [self.product.pk], 'post': 'yes',
+        })
+        self.assertEqual(DeletionJob.objects.get().object_ids, [str(self.product.pk)])
+        self.assertTrue(Product.objects.filter(pk=self.product.pk).exists())
@@ -1,25 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from .views import (
-    ProductListView,
-    ProductDetailView,
-    CategoryListView,
-    BrandListView,
-    WishlistView,
-    toggle_wishlist,
-    autocomplete_category,
-    autocomplete_brand
-)
+from . import async_views, views
 
 app_name = 'catalog'
 
-urlpatterns = [
-    path('', ProductListView.as_view(), name='product_list'),
-    path('product/<int:pk>/', ProductDetailView.as_view(), name='product_detail'),
-    path('categories/', CategoryListView.as_view(), name='category_list'),
-    path('brands/', BrandListView.as_view(), name='brand_list'),
-    path('wishlist/', WishlistView.as_view(), name='wishlist'),
-    path('wishlist/toggle/<int:product_id>/', toggle_wishlist, name='toggle_wishlist'),
-    path('autocomplete/category/', autocomplete_category, name='autocomplete_category'),
-    path('autocomplete/brand/', autocomplete_brand, name='autocomplete_brand'),
-]
 
+def build_urlpatterns(use_async):
+    """Под ASGI (ASYNC_VIEWS=True) каталог и избранное обслуживаются асинхронными представлениями"""
+    module = async_views if use_async else views
+    return [
+        path('', module.ProductListView.as_view(), name='product_list'),
+        path('product/<int:pk>/', module.ProductDetailView.as_view(), name='product_detail'),
+        path('categories/', views.CategoryListView.as_view(), name='category_list'),
+        path('brands/', views.BrandListView.as_view(), name='brand_list'),
+        path('wishlist/', views.WishlistView.as_view(), name='wishlist'),
+        path('wishlist/toggle/<int:product_id>/', module.toggle_wishlist, name='toggle_wishlist'),
+        path('autocomplete/category/', module.autocomplete_category, name='autocomplete_category'),
+        path('autocomplete/brand/', module.autocomplete_brand, name='autocomplete_brand'),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.ASYNC_VIEWS)
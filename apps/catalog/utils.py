@@ -0,0 +1,91 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .references import invalidate_references
+
+
+SLUG_ATTEMPTS = 3
+# Больше префиксов в одном OR - дешевле прочитать все slug справочника
+MAX_PREFIX_LOOKUPS = 100
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+
+def base_slug(model, name):
+    max_length = model._meta.get_field('slug').max_length
+    # Запас под суффикс "-N"
+    return slugify(name.lower().translate(TRANSLIT))[:max_length - 6].strip('-') or model._meta.model_name
+
+
+def allocate_slugs(model, names):
+    """
+    Свободные slug для списка названий одним запросом: читаются только slug с нужными
+    префиксами, суффикс подбирается в памяти. Повторяющиеся основы получают разные суффиксы.
+    """
+    bases = [base_slug(model, name) for name in names]
+    distinct = set(bases)
+    queryset = model.objects.all()
+    if len(distinct) <= MAX_PREFIX_LOOKUPS:
+        prefixes = Q()
+        for base in distinct:
+            prefixes |= Q(slug__startswith=base)
+        queryset = queryset.filter(prefixes)
+    taken = set(queryset.values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, counter = base, 1
+        while slug in taken:
+            slug = f'{base}-{counter}'
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def unique_slug(model, name):
+    return allocate_slugs(model, [name])[0]
+
+
+def save_with_unique_slug(instance, attempts=SLUG_ATTEMPTS):
+    """
+    Сохраняет бренд или категорию со свободным slug. Если параллельный запрос успел занять
+    тот же slug, уникальный индекс вернет IntegrityError, и slug подбирается заново.
+    """
+    model = type(instance)
+    for attempt in range(attempts):
+        instance.slug = unique_slug(model, instance.name)
+        try:
+            with transaction.atomic():
+                instance.save()
+            return instance
+        except IntegrityError:
+            if attempt == attempts - 1 or not model.objects.filter(slug=instance.slug).exists():
+                raise
+
+
+def create_with_unique_slug(model, **fields):
+    return save_with_unique_slug(model(**fields))
+
+
+def bulk_create_with_unique_slugs(model, objects, attempts=SLUG_ATTEMPTS):
+    for attempt in range(attempts):
+        for obj, slug in zip(objects, allocate_slugs(model, [obj.name for obj in objects])):
+            obj.slug = slug
+        try:
+            with transaction.atomic():
+                created = model.objects.bulk_create(objects)
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+        else:
+            # bulk_create не отправляет post_save
+            invalidate_references()
+            return created
+
@@ -4,7 +4,9 @@ from django.db.models import Q
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.http import JsonResponse
+from apps.core.instrumentation import query_budget
 from .models import Product, Category, Brand, Wishlist
+from .references import get_references
 
 
 class ProductListView(ListView):
@@ -12,10 +14,11 @@ class ProductListView(ListView):
     template_name = 'catalog/product_list.html'
     context_object_name = 'products'
     paginate_by = 24
+    query_budget = 5
     
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True, is_sold=False).select_related(
-            'category', 'brand', 'seller'
+            'category', 'brand', 'seller', 'size'
         ).prefetch_related('images')
         
         search_query = self.request.GET.get('q')
@@ -26,13 +29,17 @@ class ProductListView(ListView):
                 Q(brand__name__icontains=search_query)
             )
         
+        # Slug -> id по кешу справочников: фильтр по индексу товаров без JOIN
+        references = self.get_references()
         category_slug = self.request.GET.get('category')
         if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+            category = references.get_by_slug(Category, category_slug)
+            queryset = queryset.filter(category=category) if category else queryset.filter(category__slug=category_slug)
         
         brand_slug = self.request.GET.get('brand')
         if brand_slug:
-            queryset = queryset.filter(brand__slug=brand_slug)
+            brand = references.get_by_slug(Brand, brand_slug)
+            queryset = queryset.filter(brand=brand) if brand else queryset.filter(brand__slug=brand_slug)
         
         condition = self.request.GET.get('condition')
         if condition:
@@ -52,20 +59,36 @@ class ProductListView(ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['brands'] = Brand.objects.all()
-        context['search_query'] = self.request.GET.get('q', '')
-        context['selected_category'] = self.request.GET.get('category', '')
-        context['selected_brand'] = self.request.GET.get('brand', '')
-        context['selected_condition'] = self.request.GET.get('condition', '')
-        context['sort_by'] = self.request.GET.get('sort', 'created_at')
+        context.update(self.get_filter_context())
         return context
+    
+    def get_references(self):
+        if not hasattr(self, 'references'):
+            self.references = get_references()
+        return self.references
+    
+    def get_filter_context(self):
+        references = self.get_references()
+        selected_category = self.request.GET.get('category', '')
+        selected_brand = self.request.GET.get('brand', '')
+        return {
+            'categories': references.categories,
+            'brands': references.brands,
+            'category_options': references.options_html(Category, selected_category),
+            'brand_options': references.options_html(Brand, selected_brand),
+            'search_query': self.request.GET.get('q', ''),
+            'selected_category': selected_category,
+            'selected_brand': selected_brand,
+            'selected_condition': self.request.GET.get('condition', ''),
+            'sort_by': self.request.GET.get('sort', 'created_at'),
+        }
 
 
 class ProductDetailView(DetailView):
     model = Product
     template_name = 'catalog/product_detail.html'
     context_object_name = 'product'
+    query_budget = 11
     
     def get_queryset(self):
         return Product.objects.filter(is_active=True).select_related(
@@ -74,7 +97,7 @@ class ProductDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
+        product = self.object
         
         in_wishlist = False
         if self.request.user.is_authenticated and hasattr(self.request.user, 'customer'):
@@ -84,45 +107,53 @@ class ProductDetailView(DetailView):
             ).exists()
         
         context['in_wishlist'] = in_wishlist
+        context['similar_products'] = self.get_similar_products()
         
-        similar_products = Product.objects.filter(
-            category=product.category,
+        return context
+    
+    def get_similar_products(self):
+        return Product.objects.filter(
+            category=self.object.category,
             is_active=True,
             is_sold=False
-        ).exclude(id=product.id)[:4]
-        context['similar_products'] = similar_products
-        
-        return context
+        ).exclude(id=self.object.id).prefetch_related('images')[:4]
 
 
 class CategoryListView(ListView):
     model = Category
     template_name = 'catalog/category_list.html'
     context_object_name = 'categories'
+    query_budget = 3
     
     def get_queryset(self):
-        return Category.objects.filter(parent=None)
+        return get_references().root_categories
 
 
 class BrandListView(ListView):
     model = Brand
     template_name = 'catalog/brand_list.html'
     context_object_name = 'brands'
+    query_budget = 3
+    
+    def get_queryset(self):
+        return get_references().brands
 
 
 class WishlistView(LoginRequiredMixin, ListView):
     model = Wishlist
     template_name = 'catalog/wishlist.html'
     context_object_name = 'wishlist_items'
+    query_budget = 6
     
     def get_queryset(self):
         if hasattr(self.request.user, 'customer'):
             return Wishlist.objects.filter(
                 customer=self.request.user.customer
-            ).select_related('product').prefetch_related('product__images')
+            ).select_related('product__brand', 'product__size').prefetch_related('product__images')
         return Wishlist.objects.none()
 
 
+@query_budget(8)
 def toggle_wishlist(request, product_id):
     if not request.user.is_authenticated:
         messages.error(request, 'Необходимо войти в систему')
@@ -149,6 +180,7 @@ def toggle_wishlist(request, product_id):
     return redirect(request.META.get('HTTP_REFERER', 'catalog:product_list'))
 
 
+@query_budget(1)
 def autocomplete_category(request):
     query = request.GET.get('q', '').strip()
     if len(query) < 1:
@@ -159,6 +191,7 @@ def autocomplete_category(request):
     return JsonResponse({'results': results})
 
 
+@query_budget(1)
 def autocomplete_brand(request):
     query = request.GET.get('q', '').strip()
     if len(query) < 1:
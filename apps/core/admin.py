@@ -1,18 +1,21 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Notification
+from .admin_tools import LargeTableAdminMixin
+from .models import DeletionJob, Notification
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Админка для уведомлений"""
     list_display = ('id', 'user', 'notification_type', 'title', 'is_read', 'created_at', 'read_at', 'delete_button')
-    list_filter = ('notification_type', 'is_read', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('is_read',)
     search_fields = ('user__username', 'user__email', 'title', 'message')
     readonly_fields = ('created_at',)
-    date_hierarchy = 'created_at'
     raw_id_fields = ('user',)
+    # Индекс created_at есть только в паре с пользователем
+    ordering = ('-id',)
     
     def delete_button(self, obj):
         """Кнопка удаления в списке"""
@@ -37,3 +40,14 @@ class NotificationAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    """Админка для удалений в фоне"""
+    list_display = ('id', 'model', 'requested_by', 'created_at', 'started_at', 'finished_at')
+    list_select_related = ('requested_by',)
+    readonly_fields = ('model', 'object_ids', 'requested_by', 'deleted', 'created_at', 'started_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False
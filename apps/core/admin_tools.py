@@ -0,0 +1,116 @@
+"""
+Админка для таблиц с десятками миллионов строк.
+
+Список изменений Django на каждой странице делает COUNT(*) по отфильтрованному
+queryset и еще один по всей таблице для надписи «N из M». На таблицах событий
+(просмотры, поиски, уведомления) это полный проход по таблице. LargeTableAdminMixin
+убирает второй подсчет, а EstimatedCountPaginator заменяет первый оценкой.
+
+BackgroundDeleteAdminMixin заменяет дерево удаляемых объектов отчетом
+apps.core.deletion и ставит само удаление в очередь.
+"""
+from django.contrib import messages
+from django.contrib.admin.utils import quote
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponseRedirect
+from django.urls import NoReverseMatch, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils.text import capfirst
+
+from .deletion import deletion_impact, schedule_deletion
+
+
+# Точный подсчет не читает больше строк; дальние страницы открывают фильтрами и поиском
+COUNT_LIMIT = 10000
+
+
+def estimated_table_rows(queryset):
+    """Оценка числа строк таблицы из статистики PostgreSQL; None, если оценки нет"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.has_filters():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1: таблицу еще не анализировали
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Без фильтров число строк берется из pg_class.reltuples, иначе считается не
+    дальше COUNT_LIMIT строк: COUNT(*) по подзапросу с LIMIT читает не больше лимита.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_table_rows(self.object_list)
+        if estimate is not None and estimate > COUNT_LIMIT:
+            return estimate
+        return self.object_list.order_by()[:COUNT_LIMIT].count()
+
+
+class LargeTableAdminMixin:
+    paginator = EstimatedCountPaginator
+    # Без «N из M»: общее число строк таблицы - еще один полный COUNT(*)
+    show_full_result_count = False
+
+
+class BackgroundDeleteAdminMixin:
+    """
+    Подтверждение удаления показывает число строк по моделям и не больше
+    SAMPLE_SIZE объектов каждой; удаление выполняет команда process_deletions.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        queryset = objs if hasattr(objs, 'query') else self.model._base_manager.filter(pk__in=[obj.pk for obj in objs])
+        impact = deletion_impact(queryset)
+        perms_needed = set()
+
+        to_delete = []
+        for model, count in impact.deleted.items():
+            if self.admin_site.is_registered(model) and not (
+                self.admin_site.get_model_admin(model).has_delete_permission(request)
+            ):
+                perms_needed.add(model._meta.verbose_name)
+            to_delete.extend(self.describe(model, count, impact.samples[model]))
+        for model, count in impact.detached.items():
+            to_delete.append(f'{capfirst(model._meta.verbose_name_plural)}: {count} останутся без ссылки')
+        protected = [
+            item for model, count in impact.protected.items()
+            for item in self.describe(model, count, impact.samples[model])
+        ]
+        return to_delete, impact.model_count, perms_needed, protected
+
+    def describe(self, model, count, sample):
+        items = [self.object_link(obj) for obj in sample]
+        if count > len(sample):
+            items.append(f'… и еще {count - len(sample)}')
+        return [f'{capfirst(model._meta.verbose_name_plural)}: {count}', items]
+
+    def object_link(self, obj):
+        opts = obj._meta
+        try:
+            url = reverse(f'{self.admin_site.name}:{opts.app_label}_{opts.model_name}_change', args=[quote(obj.pk)])
+        except NoReverseMatch:
+            return f'{capfirst(opts.verbose_name)}: {obj}'
+        return format_html('{}: <a href="{}">{}</a>', capfirst(opts.verbose_name), url, obj)
+
+    def schedule_deletion(self, request, queryset):
+        return schedule_deletion(queryset, request.user)
+
+    def delete_model(self, request, obj):
+        self.schedule_deletion(request, self.model._base_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        self.schedule_deletion(request, queryset)
+
+    def response_delete(self, request, obj_display, obj_id):
+        self.message_user(request, f'Удаление «{obj_display}» поставлено в очередь', messages.SUCCESS)
+        return HttpResponseRedirect(reverse(
+            f'{self.admin_site.name}:{self.opts.app_label}_{self.opts.model_name}_changelist',
+        ))
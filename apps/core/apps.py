@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'apps.core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import install_template_profiler
+        install_template_profiler()
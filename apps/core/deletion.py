@@ -0,0 +1,130 @@
+"""
+Удаление объектов с большим числом связанных строк.
+
+Collector Django перед удалением загружает все каскадные строки в память, а
+страница подтверждения в админке строит из них полное дерево: у популярного
+товара это миллионы просмотров и минуты работы. Здесь то же удаление разбито на
+две части:
+
+- deletion_impact считает каскадные строки одним COUNT на связь и загружает
+  из каждой модели не больше SAMPLE_SIZE объектов для показа;
+- schedule_deletion ставит удаление в очередь DeletionJob, а команда
+  process_deletions удаляет строки порциями по CHUNK_SIZE от листьев к корню:
+  каждая порция - короткая транзакция, которая не держит блокировки минутами.
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+from .models import DeletionJob
+
+
+SAMPLE_SIZE = 10
+CHUNK_SIZE = 5000
+# Глубина обхода каскадных связей для отчета
+MAX_DEPTH = 4
+
+PROTECT = (models.PROTECT, models.RESTRICT)
+
+
+class DeletionImpact:
+    def __init__(self):
+        # {модель: число строк}, в порядке обхода (корневая модель первой)
+        self.deleted = {}
+        self.detached = {}
+        self.protected = {}
+        # {модель: не больше SAMPLE_SIZE объектов}
+        self.samples = {}
+
+    def add(self, counts, model, queryset, count, sample_size):
+        counts[model] = counts.get(model, 0) + count
+        samples = self.samples.setdefault(model, [])
+        if len(samples) < sample_size:
+            # __str__ связанных моделей обычно читает свои внешние ключи
+            samples.extend(queryset.select_related()[:sample_size - len(samples)])
+
+    @property
+    def model_count(self):
+        return {model._meta.verbose_name_plural: count for model, count in self.deleted.items()}
+
+
+def related_querysets(queryset):
+    """(связь, queryset строк, ссылающихся на queryset) для каждой обратной связи модели"""
+    for relation in get_candidate_relations_to_delete(queryset.model._meta):
+        related = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': queryset})
+        yield relation, related
+
+
+def deletion_impact(queryset, sample_size=SAMPLE_SIZE):
+    impact = DeletionImpact()
+    impact.add(impact.deleted, queryset.model, queryset, queryset.count(), sample_size)
+    collect_impact(impact, queryset, sample_size, depth=1)
+    return impact
+
+
+def collect_impact(impact, queryset, sample_size, depth):
+    for relation, related in related_querysets(queryset):
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+        count = related.count()
+        if not count:
+            continue
+        model = relation.related_model
+        if relation.on_delete is models.CASCADE:
+            impact.add(impact.deleted, model, related, count, sample_size)
+            if depth < MAX_DEPTH:
+                collect_impact(impact, related, sample_size, depth + 1)
+        elif relation.on_delete in PROTECT:
+            impact.add(impact.protected, model, related, count, sample_size)
+        else:
+            impact.add(impact.detached, model, related, count, sample_size)
+
+
+def schedule_deletion(queryset, user=None):
+    return DeletionJob.objects.create(
+        model=queryset.model._meta.label_lower,
+        object_ids=[str(pk) for pk in queryset.values_list('pk', flat=True)],
+        requested_by=user if user and user.is_authenticated else None,
+    )
+
+
+def delete_in_chunks(queryset, chunk_size=CHUNK_SIZE, path=()):
+    """
+    Удаляет строки queryset и все каскадные, начиная с листьев; возвращает
+    {метка модели: удалено строк}. К моменту удаления родителей дочерних строк
+    уже нет, и Collector не загружает их в память. Циклические связи (дерево
+    категорий) дочищает сам Collector.
+    """
+    deleted = Counter()
+    path = (*path, queryset.model)
+    for relation, related in related_querysets(queryset):
+        if relation.on_delete is models.CASCADE and relation.related_model not in path:
+            deleted.update(delete_in_chunks(related, chunk_size, path))
+
+    manager = queryset.model._base_manager
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            _, counts = manager.filter(pk__in=pks).delete()
+        deleted.update(counts)
+
+
+def run_job(job, chunk_size=CHUNK_SIZE):
+    model = apps.get_model(job.model)
+    job.started_at = timezone.now()
+    job.save(update_fields=['started_at'])
+    deleted = delete_in_chunks(model._base_manager.filter(pk__in=job.object_ids), chunk_size)
+    job.deleted = dict(deleted)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['deleted', 'finished_at'])
+    return job
+
+
+def run_pending(chunk_size=CHUNK_SIZE):
+    jobs = list(DeletionJob.objects.filter(finished_at__isnull=True).order_by('pk'))
+    return [run_job(job, chunk_size) for job in jobs]
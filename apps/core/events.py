@@ -0,0 +1,178 @@
+"""
+Публикация событий пользователю для потока Server-Sent Events.
+
+Брокер доставляет словари-события подписчикам канала (user:<id>). publish синхронный
+и вызывается из любого потока (обработчики сигналов, on_commit), подписка асинхронная:
+каждое открытое SSE-соединение - это корутина и asyncio.Queue, без потока на клиента.
+
+InMemoryBroker работает в пределах одного процесса (разработка, тесты, один воркер
+uvicorn). Если страницы обслуживают другие процессы (gunicorn, несколько воркеров),
+нужен EVENTS_BROKER = 'apps.core.events.RedisBroker' (pip install "onyx[redis]"):
+publish уходит в Redis, а каждый процесс держит одну подписку на все каналы и
+раздает события своим локальным подписчикам.
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+# Медленный клиент теряет самые старые события, а не копит их в памяти процесса
+QUEUE_SIZE = 100
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    def __init__(self, loop, maxsize=QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Цикл событий подписчика уже закрыт
+            pass
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        """Следующее событие; TimeoutError, если за timeout секунд ничего не пришло"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InMemoryBroker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def publish_many(self, messages):
+        for channel, message in messages:
+            self.publish(channel, message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel)
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+class RedisBroker(InMemoryBroker):
+    prefix = 'onyx:events:'
+
+    def __init__(self, url=None):
+        import redis
+
+        super().__init__()
+        self.url = url or settings.EVENTS_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message, default=str))
+
+    def publish_many(self, messages):
+        # Рассылка многим пользователям - один обмен с Redis
+        with self.client.pipeline(transaction=False) as pipeline:
+            for channel, message in messages:
+                pipeline.publish(self.prefix + channel, json.dumps(message, default=str))
+            pipeline.execute()
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        async with super().subscribe(channel) as subscription:
+            yield subscription
+
+    async def listen(self):
+        """Одна подписка процесса на все каналы; события раздаются локальным подписчикам"""
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(self.prefix + '*')
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                channel = message['channel'].decode()[len(self.prefix):]
+                InMemoryBroker.publish(self, channel, json.loads(message['data']))
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'EVENTS_BROKER':
+        _broker = None
+
+
+def publish(user_id, event, data, event_id=None):
+    get_broker().publish(user_channel(user_id), {'event': event, 'id': event_id, 'data': data})
+
+
+def publish_notifications(notifications):
+    get_broker().publish_many(
+        (user_channel(notification.user_id), {
+            'event': 'notification',
+            'id': notification.pk,
+            'data': notification_data(notification),
+        })
+        for notification in notifications
+    )
+
+
+def notification_data(notification):
+    return {
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'link': notification.link,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def format_event(event, data, event_id=None):
+    """Кадр text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,141 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.base import Template
+
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql):
+    """Нормализует SQL: литералы и списки IN схлопываются, чтобы запросы N+1 совпадали"""
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LIST.sub('(...)', sql)
+
+
+def query_budget(limit):
+    """Объявляет бюджет запросов для view-функции"""
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is not None:
+        return getattr(view_class, 'query_budget', None)
+    return getattr(view_func, 'query_budget', None)
+
+
+# Столько одинаковых запросов за один HTTP-запрос уже похоже на N+1
+DUPLICATE_WARNING_THRESHOLD = 5
+
+
+class QueryStats:
+    """Статистика SQL и рендеринга шаблонов за один запрос; используется как execute_wrapper"""
+
+    def __init__(self):
+        self.count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self.view_name = None
+        self.budget = None
+        self.templates = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    @property
+    def suspicious(self):
+        return any(count >= DUPLICATE_WARNING_THRESHOLD for count in self.fingerprints.values())
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+_template_profile = ContextVar('template_profile', default=None)
+
+
+class TemplateProfile:
+    """
+    Время рендеринга по шаблонам за один запрос. total - вместе с вложенными
+    шаблонами (include), self - только собственные узлы шаблона.
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self.stack = []
+
+    def enter(self):
+        self.stack.append(0.0)
+
+    def leave(self, name, elapsed):
+        children = self.stack.pop()
+        if self.stack:
+            self.stack[-1] += elapsed
+        entry = self.templates.setdefault(name, {'count': 0, 'total': 0.0, 'self': 0.0})
+        entry['count'] += 1
+        entry['total'] += elapsed
+        entry['self'] += elapsed - children
+
+    def slowest(self, limit=10):
+        """[(шаблон, число рендеров, total, self)] по убыванию собственного времени"""
+        rows = [(name, entry['count'], entry['total'], entry['self']) for name, entry in self.templates.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)[:limit]
+
+
+@contextmanager
+def profile_templates(profile):
+    token = _template_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _template_profile.reset(token)
+
+
+def install_template_profiler():
+    """
+    Оборачивает Template.render: его вызывают и корневой шаблон, и каждый {% include %}.
+    Вне profile_templates обертка стоит одного ContextVar.get.
+    """
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    def profiled_render(self, context):
+        profile = _template_profile.get()
+        if profile is None:
+            return render(self, context)
+        profile.enter()
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.leave(self.origin.template_name or self.origin.name, time.perf_counter() - started)
+
+    profiled_render.profiled = True
+    Template.render = profiled_render
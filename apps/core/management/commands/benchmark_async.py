@@ -0,0 +1,135 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from apps.catalog.models import Brand, Product
+from apps.core.testing import views_urlconf
+
+
+def percentile(samples, q):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность синхронных (WSGI, пул потоков) и асинхронных '
+        '(ASGI, одна очередь событий) представлений каталога при одинаковой конкурентности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16, help='Потоков для WSGI и задач для ASGI')
+        parser.add_argument('--requests', type=int, default=300, help='Запросов на сценарий')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(is_active=True, is_sold=False).order_by('-created_at').first()
+        brand = Brand.objects.first()
+        if product is None or brand is None:
+            raise CommandError('Нет данных для замеров: сначала запустите generate_data')
+        connections.close_all()
+
+        scenarios = [
+            ('product_list', 'catalog:product_list', [], {}),
+            ('product_search', 'catalog:product_list', [], {'q': product.title.split()[0], 'sort': 'price_asc'}),
+            ('product_detail', 'catalog:product_detail', [product.pk], {}),
+            ('autocomplete_brand', 'catalog:autocomplete_brand', [], {'q': brand.name[:2]}),
+        ]
+        self.stdout.write(
+            f"{'scenario':<20}{'mode':>6}{'rps':>10}{'p50, ms':>10}{'p95, ms':>10}{'errors':>8}"
+        )
+        results = {}
+        for name, url_name, url_args, params in scenarios:
+            for mode in ('sync', 'async'):
+                with override_settings(
+                    ROOT_URLCONF=views_urlconf(use_async=mode == 'async'),
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                    QUERY_INSTRUMENTATION=False,
+                ):
+                    url = reverse(url_name, args=url_args)
+                    if mode == 'sync':
+                        result = self.run_sync(url, params, options['concurrency'], options['requests'])
+                    else:
+                        result = asyncio.run(self.run_async(url, params, options['concurrency'], options['requests']))
+                results.setdefault(name, {})[mode] = result
+                self.stdout.write(
+                    f"{name:<20}{mode:>6}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}"
+                    f"{result['p95_ms']:>10.1f}{result['errors']:>8}"
+                )
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'concurrency': options['concurrency'],
+                'database': connections['default'].vendor,
+                'results': results,
+            }, ensure_ascii=False, indent=2))
+
+    def summarize(self, timings, errors, duration):
+        return {
+            'rps': round(len(timings) / duration, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'errors': errors,
+        }
+
+    def run_sync(self, url, params, concurrency, total):
+        """WSGI: каждый поток держит свое соединение и ждет базу синхронно"""
+        remaining = iter(range(total))
+        lock = threading.Lock()
+        timings = []
+        errors = 0
+
+        def worker():
+            nonlocal errors
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    started = time.perf_counter()
+                    status = client.get(url, params).status_code
+                    with lock:
+                        timings.append((time.perf_counter() - started) * 1000)
+                        errors += status >= 400
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(concurrency)]:
+                future.result()
+        return self.summarize(timings, errors, time.perf_counter() - started)
+
+    async def run_async(self, url, params, concurrency, total):
+        """ASGI: задачи делят одну очередь событий, ORM выполняется через sync_to_async"""
+        remaining = iter(range(total))
+        timings = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            client = AsyncClient()
+            while next(remaining, None) is not None:
+                started = time.perf_counter()
+                response = await client.get(url, params)
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+        await sync_to_async(connections.close_all)()
+        return self.summarize(timings, errors, duration)
@@ -0,0 +1,109 @@
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.accounts.models import Customer
+from apps.catalog.models import Product
+from apps.orders.models import CartItem
+from .run_benchmarks import percentile
+
+
+PROFILES = [
+    # Исходная конфигурация: сессии в базе, сообщения в cookie с откатом в сессию
+    ('db', 'django.contrib.sessions.backends.db', 'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('db+cookie_messages', 'django.contrib.sessions.backends.db',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('cached_db', 'django.contrib.sessions.backends.cached_db',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('cookie', 'django.contrib.sessions.backends.signed_cookies',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+]
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-sessions',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает накладные расходы на сессии и сообщения в сценарии корзины '
+        '(добавить, открыть корзину, удалить, открыть корзину) для каждого SESSION_PROFILE. '
+        'Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть положительным')
+        product = Product.objects.filter(is_active=True, is_sold=False, quantity__gte=1).order_by('-created_at').first()
+        customer = Customer.objects.exclude(user__seller__isnull=False).first()
+        if product is None or customer is None:
+            raise CommandError('Нет данных для замеров: сначала запустите generate_data')
+
+        self.stdout.write(f"{'profile':<22}{'p50, ms':>10}{'p95, ms':>10}{'SQL':>8}{'session SQL':>14}")
+        results = {}
+        # Свой кеш в памяти процесса: общий кеш (CACHE_REDIS_URL) не очищается и не
+        # получает сессий и счетчиков из откатываемых замеров
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], QUERY_INSTRUMENTATION=False, CACHES=BENCHMARK_CACHES,
+        ):
+            for name, engine, storage in PROFILES:
+                with override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=storage), transaction.atomic():
+                    cache.clear()
+                    results[name] = self.measure(customer, product, options['iterations'], options['warmup'])
+                    transaction.set_rollback(True)
+                result = results[name]
+                self.stdout.write(
+                    f"{name:<22}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                    f"{result['queries']:>8}{result['session_queries']:>14}"
+                )
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'database': connection.vendor,
+                'results': results,
+            }, ensure_ascii=False, indent=2))
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def measure(self, customer, product, iterations, warmup):
+        client = Client()
+        client.force_login(customer.user)
+        cart_url = reverse('orders:cart')
+        timings = []
+        queries = []
+        session_queries = []
+        for n in range(warmup + iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                client.post(reverse('orders:add_to_cart', args=[product.pk]))
+                client.get(cart_url)
+                item = CartItem.objects.filter(cart__customer=customer, product=product).values_list('pk', flat=True)[0]
+                client.post(reverse('orders:remove_from_cart', args=[item]))
+                client.get(cart_url)
+                elapsed = time.perf_counter() - started
+            if n >= warmup:
+                timings.append(elapsed * 1000)
+                # Поиск позиции корзины - часть замера, а не сценария
+                queries.append(len(context) - 1)
+                session_queries.append(sum('django_session' in query['sql'] for query in context.captured_queries))
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': max(queries),
+            'session_queries': max(session_queries),
+        }
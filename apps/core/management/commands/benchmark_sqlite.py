@@ -0,0 +1,142 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+STOCK_OPTIONS = {
+    'init_command': '',
+    'transaction_mode': 'DEFERRED',
+    'timeout': 5,
+}
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность читателей и писателей SQLite в стандартном и продакшен-профиле'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность каждого прогона, секунды')
+        parser.add_argument('--products', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        profiles = [
+            ('stock', STOCK_OPTIONS),
+            ('production', settings.SQLITE_PRODUCTION_OPTIONS),
+        ]
+        self.stdout.write(
+            f"{'profile':<12}{'reads/s':>12}{'writes/s':>12}{'busy errors':>14}{'max write, ms':>16}"
+        )
+        for name, db_options in profiles:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / 'bench.sqlite3'
+                self.prepare(path, options['products'])
+                result = self.run_profile(path, db_options, options)
+            self.stdout.write(
+                f"{name:<12}{result['reads'] / options['duration']:>12.0f}"
+                f"{result['writes'] / options['duration']:>12.0f}"
+                f"{result['errors']:>14}{result['max_write'] * 1000:>16.1f}"
+            )
+
+    def prepare(self, path, products):
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE product (
+                id INTEGER PRIMARY KEY,
+                seller_id INTEGER NOT NULL,
+                price DECIMAL NOT NULL,
+                quantity INTEGER NOT NULL,
+                is_active BOOL NOT NULL,
+                is_sold BOOL NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX product_listed_created_idx ON product (created_at DESC)
+                WHERE is_active AND NOT is_sold;
+            CREATE TABLE order_item (
+                id INTEGER PRIMARY KEY,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                price DECIMAL NOT NULL
+            );
+        """)
+        conn.executemany(
+            'INSERT INTO product (seller_id, price, quantity, is_active, is_sold, created_at) '
+            "VALUES (?, ?, ?, 1, 0, datetime('now', ?))",
+            ((i % 100, 100 + i % 5000, 1000, f'-{i} seconds') for i in range(products)),
+        )
+        conn.commit()
+        conn.close()
+
+    def connect(self, path, db_options):
+        conn = sqlite3.connect(path, timeout=db_options['timeout'], isolation_level=None, check_same_thread=False)
+        for statement in db_options['init_command'].split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def run_profile(self, path, db_options, options):
+        result = {'reads': 0, 'writes': 0, 'errors': 0, 'max_write': 0.0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+        products = options['products']
+
+        def reader(index):
+            conn = self.connect(path, db_options)
+            reads = 0
+            offset = 0
+            while time.perf_counter() < deadline:
+                conn.execute(
+                    'SELECT id, price FROM product WHERE is_active AND NOT is_sold '
+                    'ORDER BY created_at DESC LIMIT 24 OFFSET ?',
+                    (offset,),
+                ).fetchall()
+                offset = (offset + 24 * (index + 1)) % 2400
+                reads += 1
+            conn.close()
+            with lock:
+                result['reads'] += reads
+
+        def writer(index):
+            conn = self.connect(path, db_options)
+            writes = errors = 0
+            max_write = 0.0
+            product_id = index + 1
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    # Оформление заказа: чтение остатка и запись в одной транзакции
+                    conn.execute(f"BEGIN {db_options['transaction_mode']}")
+                    quantity, price = conn.execute(
+                        'SELECT quantity, price FROM product WHERE id = ?', (product_id,)
+                    ).fetchone()
+                    conn.execute('UPDATE product SET quantity = ? WHERE id = ?', (quantity - 1 or 1000, product_id))
+                    conn.execute(
+                        'INSERT INTO order_item (product_id, quantity, price) VALUES (?, 1, ?)',
+                        (product_id, price),
+                    )
+                    conn.execute('COMMIT')
+                    writes += 1
+                    max_write = max(max_write, time.perf_counter() - started)
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    errors += 1
+                product_id = (product_id + options['writers']) % products + 1
+            conn.close()
+            with lock:
+                result['writes'] += writes
+                result['errors'] += errors
+                result['max_write'] = max(result['max_write'], max_write)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истекшие сессии порциями по индексу expire_date. В отличие от clearsessions '
+        'не держит блокировку таблицы одним большим DELETE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Строк за транзакцию')
+        parser.add_argument('--pause', type=float, default=0, help='Пауза между порциями, секунд')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE.endswith('signed_cookies'):
+            self.stdout.write('Сессии хранятся в cookie, в базе чистить нечего')
+            return
+
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now).order_by()
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:options['chunk_size']])
+            if not keys:
+                break
+            with transaction.atomic():
+                # Сессию могли продлить между выборкой и удалением
+                deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено истекших сессий: {deleted}'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.media import DELETE_WORKERS, GRACE_HOURS, collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из MEDIA_ROOT файлы, на которые не ссылается ни одна строка базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=GRACE_HOURS,
+            help='Не трогать файлы, созданные или переиспользованные за последние N часов',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+        parser.add_argument('--workers', type=int, default=DELETE_WORKERS, help='Потоков удаления')
+
+    def handle(self, *args, **options):
+        report = collect_garbage(
+            grace_hours=options['grace_hours'], dry_run=options['dry_run'], workers=options['workers'],
+        )
+
+        if options['verbosity'] > 1:
+            for name, _ in report.orphans:
+                self.stdout.write(f'  {name}')
+        for name, error in report.errors:
+            self.stdout.write(self.style.WARNING(f'  {name}: {error}'))
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(f'Файлов: {report.files}, ссылок в базе: {report.references}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов без ссылок: {len(report.orphans) - len(report.errors)} '
+            f'({report.freed / 1024 / 1024:.1f} МБ)'
+        ))
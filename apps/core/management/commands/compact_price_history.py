@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.catalog.prices import CHUNK_SIZE, COMPACT_AFTER, compact_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Прореживает историю цен старше --days дней: за день остается последняя цена товара, '
+        'повторы предыдущей цены удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=COMPACT_AFTER.days)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Товаров за транзакцию')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--days и --chunk-size должны быть положительными')
+        deleted = compact_history(timezone.now() - timedelta(days=options['days']), options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено строк истории цен: {deleted}'))
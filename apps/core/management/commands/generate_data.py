@@ -0,0 +1,351 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from apps.accounts.models import Customer, Seller
+from apps.analytics.models import ProductView, SearchQuery
+from apps.catalog.models import (
+    Brand, Category, PriceChange, Product, ProductCondition, ProductImage, Review, Size, SizeType, Wishlist,
+)
+from apps.catalog.references import invalidate_references
+from apps.orders.models import (
+    Cart, CartItem, Order, OrderItem, OrderStatus, Payment, PaymentMethod, PaymentStatus,
+)
+
+
+# Количество сущностей на один товар
+RATIOS = {
+    'sellers': 0.01,
+    'customers': 0.1,
+    'wishlists': 0.5,
+    'carts': 0.02,
+    'orders': 0.05,
+    'reviews': 0.05,
+    'views': 5,
+    'searches': 1,
+}
+
+CATEGORY_TREE = {
+    ('Одежда', SizeType.CLOTHING): {
+        'Верх': ['Футболки', 'Худи', 'Свитшоты', 'Рубашки'],
+        'Верхняя одежда': ['Куртки', 'Пуховики', 'Пальто'],
+        'Низ': ['Джинсы', 'Брюки', 'Шорты'],
+    },
+    ('Обувь', SizeType.SHOES): {
+        'Кроссовки': ['Беговые', 'Баскетбольные', 'Лайфстайл'],
+        'Ботинки': ['Челси', 'Дезерты'],
+    },
+    ('Аксессуары', SizeType.ACCESSORIES): {
+        'Сумки': ['Рюкзаки', 'Шопперы'],
+        'Головные уборы': ['Кепки', 'Шапки'],
+    },
+}
+
+SIZES = {
+    SizeType.CLOTHING: ['XS', 'S', 'M', 'L', 'XL', 'XXL'],
+    SizeType.SHOES: [str(size) for size in range(36, 47)],
+    SizeType.ACCESSORIES: ['ONE SIZE'],
+}
+
+WORDS = [
+    'oversize', 'vintage', 'limited', 'classic', 'retro', 'archive', 'black', 'white', 'grey',
+    'logo', 'cotton', 'leather', 'denim', 'wool', 'sample', 'collab', 'basic', 'heavy',
+]
+
+IMAGE_POOL_SIZE = 24
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@contextmanager
+def created_at_writable(*models):
+    """Отключает auto_now_add, чтобы раскидать даты создания по прошлому"""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетический набор данных маркетплейса заданного масштаба'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Число товаров; остальное масштабируется от него')
+        parser.add_argument('--brands', type=int, default=300)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365, help='Глубина истории, дней')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now()
+        self.days = options['days']
+        products = options['products']
+        counts = {name: max(1, int(products * ratio)) for name, ratio in RATIOS.items()}
+
+        with created_at_writable(Product, ProductImage, Review, CartItem, Order, OrderItem, Payment, Cart):
+            self.step('справочники', self.create_references, options['brands'])
+            self.step('пользователи', self.create_users, counts['sellers'], counts['customers'])
+            self.step('товары', self.create_products, products)
+            self.step('изображения', self.create_images)
+            self.step('история цен', self.create_price_history)
+            self.step('избранное', self.create_wishlists, counts['wishlists'])
+            self.step('корзины', self.create_carts, counts['carts'])
+            self.step('заказы', self.create_orders, counts['orders'])
+            self.step('отзывы', self.create_reviews, counts['reviews'])
+        self.step('просмотры', self.create_views, counts['views'])
+        self.step('поиски', self.create_searches, counts['searches'])
+
+    def step(self, title, func, *args):
+        started = time.perf_counter()
+        created = func(*args)
+        self.stdout.write(f'{title}: {created} за {time.perf_counter() - started:.1f} с')
+
+    def bulk_create(self, model, objects, **kwargs):
+        created = 0
+        for chunk in chunked(objects, self.chunk_size):
+            model.objects.bulk_create(chunk, **kwargs)
+            created += len(chunk)
+        return created
+
+    def past(self):
+        return self.now - timedelta(seconds=self.random.randint(0, self.days * 86400))
+
+    def create_references(self, brands):
+        # Справочники создаются идемпотентно, чтобы команду можно было запускать повторно
+        self.bulk_create(Brand, (
+            Brand(name=f'Brand {n}', slug=f'synthetic-brand-{n}') for n in range(brands)
+        ), ignore_conflicts=True)
+        for (root_name, size_type), children in CATEGORY_TREE.items():
+            root, _ = Category.objects.get_or_create(
+                slug=f'synthetic-{size_type}', defaults={'name': root_name, 'size_type': size_type},
+            )
+            for child_index, (child_name, leaves) in enumerate(children.items()):
+                child, _ = Category.objects.get_or_create(
+                    slug=f'{root.slug}-{child_index}',
+                    defaults={'name': child_name, 'parent': root, 'size_type': size_type},
+                )
+                self.bulk_create(Category, (
+                    Category(name=leaf, slug=f'{child.slug}-{n}', parent=child, size_type=size_type)
+                    for n, leaf in enumerate(leaves)
+                ), ignore_conflicts=True)
+        existing = set(Size.objects.values_list('size_type', 'value'))
+        self.bulk_create(Size, (
+            Size(size_type=size_type, value=value, display_value=value)
+            for size_type, values in SIZES.items()
+            for value in values
+            if (size_type, value) not in existing
+        ))
+        # bulk_create не отправляет post_save: сбрасываем кеш справочников явно
+        invalidate_references()
+        self.brand_ids = list(Brand.objects.values_list('id', flat=True))
+        self.leaf_categories = list(
+            Category.objects.filter(slug__startswith='synthetic-', parent__parent__isnull=False)
+            .values_list('id', 'size_type')
+        )
+        self.sizes = {}
+        for size_id, size_type in Size.objects.values_list('id', 'size_type'):
+            self.sizes.setdefault(size_type, []).append(size_id)
+        return f'{len(self.brand_ids)} брендов, {len(self.leaf_categories)} конечных категорий'
+
+    def create_users(self, sellers, customers):
+        password = make_password('password')
+        start = User.objects.count()
+        total = sellers + customers
+        self.bulk_create(User, (
+            User(username=f'synthetic{start + n}', email=f'synthetic{start + n}@example.com', password=password)
+            for n in range(total)
+        ))
+        user_ids = list(
+            User.objects.filter(username__startswith='synthetic').order_by('-id').values_list('id', flat=True)[:total]
+        )
+        phone = '+79990000000'
+        self.bulk_create(Seller, (
+            Seller(user_id=user_id, name=f'Seller {user_id}', email=f'seller{user_id}@example.com',
+                   phone=phone, is_verified=self.random.random() < 0.3)
+            for user_id in user_ids[:sellers]
+        ))
+        self.bulk_create(Customer, (
+            Customer(user_id=user_id, name=f'Customer {user_id}', email=f'customer{user_id}@example.com', phone=phone)
+            for user_id in user_ids[sellers:]
+        ))
+        self.seller_ids = list(Seller.objects.filter(user_id__in=user_ids[:sellers]).values_list('id', flat=True))
+        self.customer_ids = list(Customer.objects.filter(user_id__in=user_ids[sellers:]).values_list('id', flat=True))
+        return f'{sellers} продавцов, {customers} клиентов'
+
+    def create_products(self, count):
+        conditions = ProductCondition.values
+        first_id = (Product.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+        def products():
+            for _ in range(count):
+                category_id, size_type = self.random.choice(self.leaf_categories)
+                sold = self.random.random() < 0.1
+                yield Product(
+                    seller_id=self.random.choice(self.seller_ids),
+                    title=' '.join(self.random.sample(WORDS, 3)).title(),
+                    description=' '.join(self.random.choices(WORDS, k=30)),
+                    category_id=category_id,
+                    brand_id=self.random.choice(self.brand_ids),
+                    size_id=self.random.choice(self.sizes[size_type]),
+                    price=Decimal(self.random.randint(5, 500) * 100),
+                    quantity=0 if sold else self.random.randint(1, 3),
+                    condition=self.random.choice(conditions),
+                    is_active=self.random.random() < 0.95,
+                    is_sold=sold,
+                    created_at=self.past(),
+                )
+
+        created = self.bulk_create(Product, products())
+        self.product_ids = list(Product.objects.filter(id__gte=first_id).values_list('id', flat=True))
+        return created
+
+    def image_pool(self):
+        """Небольшой набор файлов, на который ссылаются все синтетические изображения"""
+        names = []
+        for n in range(IMAGE_POOL_SIZE):
+            name = f'products/images/synthetic/{n}.jpg'
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                color = tuple(self.random.randint(0, 255) for _ in range(3))
+                Image.new('RGB', (600, 800), color).save(buffer, 'JPEG', quality=80)
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def create_images(self):
+        pool = self.image_pool()
+
+        def images():
+            for product_id in self.product_ids:
+                created_at = self.past()
+                for order in range(self.random.randint(1, 3)):
+                    yield ProductImage(
+                        product_id=product_id, image=self.random.choice(pool),
+                        order=order, is_main=order == 0, created_at=created_at,
+                    )
+
+        return self.bulk_create(ProductImage, images())
+
+    def create_price_history(self):
+        if not self.product_ids:
+            return 0
+        products = Product.objects.filter(id__gte=self.product_ids[0]).order_by('id').values_list(
+            'id', 'price', 'brand_id', 'category_id', 'created_at',
+        )
+
+        def changes():
+            for product_id, price, brand_id, category_id, created_at in products.iterator(chunk_size=self.chunk_size):
+                # Цена при выставлении и до двух снижений; последняя строка - текущая цена товара
+                drops = self.random.choice([0, 0, 0, 1, 2])
+                moments = sorted(created_at + (self.now - created_at) * self.random.random() for _ in range(drops))
+                prices = [price]
+                for _ in range(drops):
+                    prices.insert(0, prices[0] + self.random.randint(1, 20) * 100)
+                for changed_at, value in zip([created_at, *moments], prices):
+                    yield PriceChange(
+                        product_id=product_id, price=value, brand_id=brand_id, category_id=category_id,
+                        changed_at=changed_at,
+                    )
+
+        return self.bulk_create(PriceChange, changes())
+
+    def sample_pairs(self, count):
+        # Различных пар не больше, чем клиентов на товары: иначе цикл не закончится
+        count = min(count, len(self.customer_ids) * len(self.product_ids))
+        pairs = set()
+        while len(pairs) < count:
+            pairs.add((self.random.choice(self.customer_ids), self.random.choice(self.product_ids)))
+        return pairs
+
+    def create_wishlists(self, count):
+        return self.bulk_create(Wishlist, (
+            Wishlist(customer_id=customer_id, product_id=product_id)
+            for customer_id, product_id in self.sample_pairs(count)
+        ), ignore_conflicts=True)
+
+    def create_carts(self, count):
+        customers = self.random.sample(self.customer_ids, min(count, len(self.customer_ids)))
+        self.bulk_create(Cart, (Cart(customer_id=customer_id, created_at=self.past()) for customer_id in customers))
+        cart_ids = Cart.objects.filter(customer_id__in=customers).values_list('id', flat=True)
+        return self.bulk_create(CartItem, (
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=1,
+                     price=Decimal(self.random.randint(5, 500) * 100), created_at=self.past())
+            for cart_id in cart_ids
+            for product_id in self.random.sample(self.product_ids, min(3, len(self.product_ids)))
+        ))
+
+    def create_orders(self, count):
+        first_id = (Order.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        self.bulk_create(Order, (
+            Order(customer_id=self.random.choice(self.customer_ids),
+                  status=self.random.choice(OrderStatus.values), created_at=self.past())
+            for _ in range(count)
+        ))
+        orders = list(Order.objects.filter(id__gte=first_id).values_list('id', 'created_at'))
+        items = self.bulk_create(OrderItem, (
+            OrderItem(order_id=order_id, product_id=product_id, quantity=1,
+                      price=Decimal(self.random.randint(5, 500) * 100), created_at=created_at)
+            for order_id, created_at in orders
+            for product_id in self.random.sample(self.product_ids, min(self.random.randint(1, 3), len(self.product_ids)))
+        ))
+        self.bulk_create(Payment, (
+            Payment(order_id=order_id, status=self.random.choice(PaymentStatus.values),
+                    method=self.random.choice(PaymentMethod.values),
+                    amount=Decimal(self.random.randint(5, 1500) * 100), created_at=created_at)
+            for order_id, created_at in orders
+        ))
+        return f'{len(orders)} заказов, {items} позиций'
+
+    def create_reviews(self, count):
+        sellers = dict(Product.objects.filter(id__in=self.product_ids).values_list('id', 'seller_id').iterator())
+        return self.bulk_create(Review, (
+            Review(customer_id=customer_id, seller_id=sellers[product_id], product_id=product_id,
+                   rating=self.random.choices(range(1, 6), weights=[1, 1, 2, 5, 10])[0],
+                   comment=' '.join(self.random.choices(WORDS, k=12)),
+                   is_approved=self.random.random() < 0.8, created_at=self.past())
+            for customer_id, product_id in self.sample_pairs(count)
+        ))
+
+    def create_views(self, count):
+        # viewed_at/searched_at заполняются текущим временем: auto_now_add не отключаем
+        return self.bulk_create(ProductView, (
+            ProductView(
+                product_id=self.random.choice(self.product_ids),
+                customer_id=self.random.choice(self.customer_ids) if self.random.random() < 0.5 else None,
+                ip_address=f'10.{self.random.randint(0, 255)}.{self.random.randint(0, 255)}.{self.random.randint(1, 254)}',
+            )
+            for _ in range(count)
+        ))
+
+    def create_searches(self, count):
+        return self.bulk_create(SearchQuery, (
+            SearchQuery(
+                query=' '.join(self.random.sample(WORDS, self.random.randint(1, 2))),
+                customer_id=self.random.choice(self.customer_ids) if self.random.random() < 0.5 else None,
+                results_count=self.random.randint(0, 500),
+                clicked_product_id=self.random.choice(self.product_ids) if self.random.random() < 0.3 else None,
+            )
+            for _ in range(count)
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.imports import CHUNK_SIZE, IMAGE_WORKERS, ProductImporter
+from apps.accounts.models import Seller
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт товаров продавца из CSV и zip-архива изображений (как в кабинете продавца)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('seller_id', type=int)
+        parser.add_argument('csv_file')
+        parser.add_argument('--images', help='zip-архив с изображениями')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=IMAGE_WORKERS, help='Потоков обработки изображений')
+
+    def handle(self, *args, **options):
+        try:
+            seller = Seller.objects.get(pk=options['seller_id'])
+        except Seller.DoesNotExist:
+            raise CommandError(f"Продавец {options['seller_id']} не найден")
+
+        importer = ProductImporter(seller, chunk_size=options['chunk_size'], workers=options['workers'])
+        with open(options['csv_file'], 'rb') as csv_file:
+            report = importer.run(csv_file, options['images'])
+
+        for line, message in report.errors:
+            self.stdout.write(self.style.WARNING(f'  строка {line}: {message}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано товаров: {report.created}, изображений: {report.images}, '
+            f'пропущено строк: {report.skipped} за {report.duration:.1f} с'
+        ))
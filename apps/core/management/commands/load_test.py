@@ -0,0 +1,296 @@
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from apps.accounts.models import Customer, Seller
+from apps.catalog.models import Product
+from apps.orders.models import CartItem, Order, OrderItem, PaymentMethod
+
+
+SCENARIO_DIR = Path(__file__).resolve().parents[2] / 'loadtests'
+
+DEFAULTS = {
+    'customers': 50,
+    'workers': 10,
+    'products': 5,
+    'stock': 1,
+    'items_per_customer': 1,
+    'cart_quantity': 1,
+    'steps': ['add_to_cart', 'checkout'],
+    'thresholds': {},
+}
+
+# Операторы, которые берут блокировку на запись; время в них считаем ожиданием блокировок
+WRITE_PREFIXES = ('BEGIN', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1]
+
+
+class Run:
+    """Результаты одного сценария, собираемые из потоков виртуальных покупателей"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.errors = Counter()
+        self.write_waits = []
+
+    def record(self, step, elapsed, error=None):
+        with self.lock:
+            self.requests.append((step, elapsed))
+            if error:
+                self.errors[error] += 1
+
+    def write_wrapper(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(WRITE_PREFIXES):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.write_waits.append((time.perf_counter() - started) * 1000)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест корзины и оформления заказа: виртуальные покупатели в пуле потоков '
+        'конкурируют за товары с ограниченным остатком. Запускается на отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'JSON-файлы сценариев, по умолчанию все из {SCENARIO_DIR}')
+        parser.add_argument('--workers', type=int, help='Переопределить число потоков')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Сохранить отчет в JSON')
+
+    def handle(self, *args, **options):
+        paths = [Path(path) for path in options['scenarios']] or sorted(SCENARIO_DIR.glob('*.json'))
+        scenarios = [self.load(path) for path in paths]
+        if options['workers']:
+            for scenario in scenarios:
+                scenario['workers'] = options['workers']
+        self.random = random.Random(options['seed'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            old_config = self.setup_database(tmp)
+            try:
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                    reports = [self.run_scenario(scenario) for scenario in scenarios]
+            finally:
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+
+        for report in reports:
+            self.print_report(report)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(reports, ensure_ascii=False, indent=2))
+
+        failed = [report['scenario'] for report in reports if not report['passed']]
+        if failed:
+            raise CommandError(f"Не пройдены сценарии: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS('Все сценарии пройдены'))
+
+    def load(self, path):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Не удалось прочитать сценарий {path}: {exc}')
+        unknown = set(data.get('steps', [])) - {'add_to_cart', 'update_cart_item', 'checkout'}
+        if unknown:
+            raise CommandError(f"{path}: неизвестные шаги {', '.join(sorted(unknown))}")
+        return {'name': path.stem, **DEFAULTS, **data}
+
+    def setup_database(self, tmp):
+        # SQLite в памяти не показывает настоящих блокировок, поэтому тестовая база - файл
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            test = settings_dict.setdefault('TEST', {})
+            if settings_dict['ENGINE'].endswith('sqlite3') and not test.get('MIRROR'):
+                test['NAME'] = str(Path(tmp) / f'{alias}.sqlite3')
+        self.stdout.write('Создание тестовой базы...')
+        return setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+
+    def seed(self, scenario):
+        prefix = f"load-{scenario['name']}-{time.monotonic_ns()}"
+        password = make_password('password')
+        seller_user = User.objects.create(username=f'{prefix}-seller', password=password)
+        seller = Seller.objects.create(user=seller_user, name='Load Seller', email='seller@example.com', phone='+79990000000')
+        Product.objects.bulk_create(
+            Product(seller=seller, title=f'Limited {n}', description='Load test', price=Decimal('1000.00'),
+                    quantity=scenario['stock'], condition='new')
+            for n in range(scenario['products'])
+        )
+        User.objects.bulk_create(
+            User(username=f'{prefix}-{n}', password=password) for n in range(scenario['customers'])
+        )
+        users = list(User.objects.filter(username__startswith=f'{prefix}-').exclude(pk=seller_user.pk))
+        Customer.objects.bulk_create(
+            Customer(user=user, name=user.username, email=f'{user.username}@example.com', phone='+79990000000')
+            for user in users
+        )
+        product_ids = list(Product.objects.filter(seller=seller).values_list('id', flat=True))
+        return users, product_ids
+
+    def run_scenario(self, scenario):
+        users, product_ids = self.seed(scenario)
+        connections.close_all()
+        run = Run()
+        picks = [
+            self.random.sample(product_ids, min(scenario['items_per_customer'], len(product_ids)))
+            for _ in users
+        ]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=scenario['workers']) as executor:
+            list(executor.map(lambda args: self.customer(run, scenario, *args), zip(users, picks)))
+        duration = time.perf_counter() - started
+
+        return self.build_report(scenario, run, duration, users, product_ids)
+
+    def customer(self, run, scenario, user, picks):
+        """Один виртуальный покупатель: свой клиент, своя сессия и свое соединение с базой"""
+        connection = connections['default']
+        client = Client()
+        try:
+            with connection.execute_wrapper(run.write_wrapper):
+                if not self.request(run, 'login', client.force_login, user):
+                    return
+                for step in scenario['steps']:
+                    if step == 'add_to_cart':
+                        for product_id in picks:
+                            self.request(run, step, client.post, reverse('orders:add_to_cart', args=[product_id]))
+                    elif step == 'update_cart_item':
+                        items = CartItem.objects.filter(cart__customer__user=user).values_list('id', flat=True)
+                        for item_id in list(items):
+                            self.request(run, step, client.post, reverse('orders:update_cart_item', args=[item_id]),
+                                         {'quantity': scenario['cart_quantity']})
+                    elif step == 'checkout':
+                        self.request(run, step, client.post, reverse('orders:checkout'),
+                                     {'payment_method': PaymentMethod.CASH})
+        finally:
+            connection.close()
+
+    def request(self, run, step, func, *args):
+        started = time.perf_counter()
+        error = None
+        try:
+            response = func(*args)
+        except Exception as exc:
+            error = f'{type(exc).__name__}: {exc}'
+        else:
+            if response is not None and response.status_code >= 500:
+                error = f'HTTP {response.status_code}'
+        run.record(step, (time.perf_counter() - started) * 1000, error)
+        return error is None
+
+    def build_report(self, scenario, run, duration, users, product_ids):
+        sold = dict(
+            OrderItem.objects.filter(product_id__in=product_ids)
+            .values_list('product_id').annotate(total=Sum('quantity'))
+        )
+        oversold = sum(max(0, total - scenario['stock']) for total in sold.values())
+        # Остаток должен сходиться с проданным количеством
+        inconsistent = sum(
+            1 for product_id, quantity in Product.objects.filter(id__in=product_ids).values_list('id', 'quantity')
+            if quantity != max(0, scenario['stock'] - sold.get(product_id, 0))
+        )
+        orders = Order.objects.filter(customer__user__in=users).count()
+
+        latencies = [elapsed for _, elapsed in run.requests]
+        by_step = {}
+        for step, elapsed in run.requests:
+            by_step.setdefault(step, []).append(elapsed)
+        error_count = sum(run.errors.values())
+        report = {
+            'scenario': scenario['name'],
+            'description': scenario.get('description', ''),
+            'database': connections['default'].vendor,
+            'customers': scenario['customers'],
+            'workers': scenario['workers'],
+            'duration_s': round(duration, 2),
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / duration, 1),
+            'orders': orders,
+            'orders_per_s': round(orders / duration, 1),
+            'errors': error_count,
+            'error_rate': round(error_count / len(latencies), 4) if latencies else 0,
+            'error_types': dict(run.errors.most_common(5)),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'steps': {
+                step: {'count': len(samples), 'p50_ms': round(percentile(samples, 50), 1),
+                       'p95_ms': round(percentile(samples, 95), 1)}
+                for step, samples in by_step.items()
+            },
+            'stock_total': scenario['stock'] * len(product_ids),
+            'sold': sum(sold.values()),
+            'oversold': oversold,
+            'inconsistent_products': inconsistent,
+            'lock_wait_total_ms': round(sum(run.write_waits), 1),
+            'lock_wait_p95_ms': round(percentile(run.write_waits, 95), 1),
+            'lock_wait_max_ms': round(max(run.write_waits, default=0), 1),
+        }
+        report['failures'] = self.check_thresholds(scenario['thresholds'], report)
+        report['passed'] = not report['failures']
+        return report
+
+    def check_thresholds(self, thresholds, report):
+        checks = [
+            ('max_error_rate', report['error_rate'], lambda value, limit: value <= limit),
+            ('max_oversold', report['oversold'], lambda value, limit: value <= limit),
+            ('min_throughput', report['throughput_rps'], lambda value, limit: value >= limit),
+            ('max_p95_ms', report['p95_ms'], lambda value, limit: value <= limit),
+            ('max_lock_wait_p95_ms', report['lock_wait_p95_ms'], lambda value, limit: value <= limit),
+        ]
+        failures = [
+            f'{name}: {value} (порог {thresholds[name]})'
+            for name, value, passes in checks
+            if name in thresholds and not passes(value, thresholds[name])
+        ]
+        if report['inconsistent_products']:
+            failures.append(f"остаток не сходится у {report['inconsistent_products']} товаров")
+        return failures
+
+    def print_report(self, report):
+        style = self.style.SUCCESS if report['passed'] else self.style.ERROR
+        self.stdout.write(style(f"[{'PASS' if report['passed'] else 'FAIL'}] {report['scenario']}"))
+        self.stdout.write(
+            f"  {report['requests']} запросов за {report['duration_s']} с, {report['throughput_rps']} rps, "
+            f"p50 {report['p50_ms']} мс, p95 {report['p95_ms']} мс"
+        )
+        self.stdout.write(
+            f"  заказов {report['orders']}, продано {report['sold']} из {report['stock_total']}, "
+            f"перепродано {report['oversold']}"
+        )
+        self.stdout.write(
+            f"  ошибок {report['errors']} ({report['error_rate']:.2%}), ожидание блокировок: "
+            f"p95 {report['lock_wait_p95_ms']} мс, max {report['lock_wait_max_ms']} мс"
+        )
+        for error, count in report['error_types'].items():
+            self.stdout.write(f'    {count} x {error}')
+        for failure in report['failures']:
+            self.stdout.write(f'  - {failure}')
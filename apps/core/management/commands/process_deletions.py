@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.deletion import CHUNK_SIZE, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Выполняет поставленные в очередь удаления порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Строк за транзакцию')
+
+    def handle(self, *args, **options):
+        for job in run_pending(chunk_size=options['chunk_size']):
+            total = sum(job.deleted.values())
+            self.stdout.write(f'{job}: удалено строк {total}')
+            if options['verbosity'] > 1:
+                for label, count in sorted(job.deleted.items()):
+                    self.stdout.write(f'  {label}: {count}')
+        self.stdout.write(self.style.SUCCESS('Очередь удалений пуста'))
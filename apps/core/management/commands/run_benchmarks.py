@@ -0,0 +1,216 @@
+import json
+import logging
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import Customer, Seller
+from apps.catalog.models import Product
+from apps.orders.models import Cart, CartItem, PaymentMethod
+
+
+def percentile(samples, q):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95 латентность и число SQL-запросов ключевых страниц через тестовый клиент. '
+        'Все изменения, сделанные запросами, откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*', default=None, help='Запустить только указанные сценарии')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+        parser.add_argument('--templates', action='store_true', help='Время рендеринга по шаблонам и include')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть положительным')
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        loggers = [logging.getLogger('onyx.queries'), logging.getLogger('onyx.templates')]
+        for logger in loggers:
+            logger.disabled = True
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            QUERY_INSTRUMENTATION=True,
+            TEMPLATE_PROFILING=options['templates'],
+        )
+        try:
+            with overrides, transaction.atomic():
+                scenarios = self.scenarios()
+                if options['only']:
+                    scenarios = [scenario for scenario in scenarios if scenario[0] in options['only']]
+                self.stdout.write(f"{'scenario':<24}{'code':>5}{'p50, ms':>10}{'p95, ms':>10}{'SQL':>8}")
+                results = {}
+                for name, user, method, url, data in scenarios:
+                    results[name] = self.measure(user, method, url, data, options['iterations'], options['warmup'])
+                    self.report(name, results[name], baseline)
+                    if options['templates']:
+                        self.report_templates(results[name])
+                # Суперпользователь, корзина и прочие подготовленные данные не сохраняются
+                transaction.set_rollback(True)
+        finally:
+            for logger in loggers:
+                logger.disabled = False
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'meta': self.meta(options),
+                'results': results,
+            }, ensure_ascii=False, indent=2))
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def load(self, path):
+        try:
+            return json.loads(Path(path).read_text())['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Не удалось прочитать {path}: {exc}')
+
+    def meta(self, options):
+        return {
+            'created_at': timezone.now().isoformat(),
+            'iterations': options['iterations'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'products': Product.objects.count(),
+        }
+
+    def scenarios(self):
+        product = Product.objects.filter(is_active=True, is_sold=False).order_by('-created_at').first()
+        seller = Seller.objects.annotate(total=Count('products')).order_by('-total').first()
+        customer = Customer.objects.annotate(total=Count('orders')).order_by('-total').first()
+        if product is None or seller is None or customer is None:
+            raise CommandError('Нет данных для замеров: сначала запустите generate_data')
+
+        cart, _ = Cart.objects.get_or_create(customer=customer)
+        cart.items.all().delete()
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=item, price=item.price, quantity=1)
+            for item in Product.objects.filter(is_active=True, is_sold=False, quantity__gte=1)
+            .exclude(seller__user=customer.user)[:3]
+        )
+        admin = User.objects.create_superuser('benchmark-admin', 'benchmark@example.com', None)
+
+        # Самая частая пара категории и бренда среди товаров в продаже: товары висят только
+        # на листовых категориях, а фильтр каталога точный, так что первая попавшаяся
+        # категория дала бы пустую страницу
+        pair = Product.objects.filter(
+            is_active=True, is_sold=False, category__isnull=False, brand__isnull=False,
+        ).values('category__slug', 'brand__slug').annotate(total=Count('pk')).order_by('-total').first()
+        filters = {'category': pair['category__slug'], 'brand': pair['brand__slug']} if pair else {}
+        catalog = reverse('catalog:product_list')
+        order = customer.orders.first()
+
+        scenarios = [
+            ('catalog', None, 'get', catalog, None),
+            ('catalog_search', None, 'get', catalog, {'q': product.title.split()[0]}),
+            ('catalog_filter', None, 'get', catalog, filters),
+            ('catalog_sort_price', None, 'get', catalog, {'sort': 'price_asc', 'page': 5}),
+            ('product_detail', None, 'get', reverse('catalog:product_detail', args=[product.pk]), None),
+            ('wishlist', customer.user, 'get', reverse('catalog:wishlist'), None),
+            ('cart', customer.user, 'get', reverse('orders:cart'), None),
+            ('checkout_form', customer.user, 'get', reverse('orders:checkout'), None),
+            ('checkout_submit', customer.user, 'post', reverse('orders:checkout'),
+             {'payment_method': PaymentMethod.CREDIT_CARD}),
+            ('order_list', customer.user, 'get', reverse('orders:order_list'), None),
+            ('seller_dashboard', seller.user, 'get', reverse('accounts:seller_dashboard'), None),
+            ('seller_products', seller.user, 'get', reverse('accounts:seller_products'), None),
+            ('seller_stats', seller.user, 'get', reverse('accounts:seller_stats'), None),
+            ('admin_products', admin, 'get', reverse('admin:catalog_product_changelist'), None),
+            ('admin_products_search', admin, 'get', reverse('admin:catalog_product_changelist'),
+             {'q': product.title.split()[0]}),
+            ('admin_orders', admin, 'get', reverse('admin:orders_order_changelist'), None),
+            ('admin_reviews', admin, 'get', reverse('admin:catalog_review_changelist'), None),
+            ('admin_product_views', admin, 'get', reverse('admin:analytics_productview_changelist'), None),
+            ('admin_search_queries', admin, 'get', reverse('admin:analytics_searchquery_changelist'), None),
+        ]
+        if order is not None:
+            scenarios.insert(10, ('order_detail', customer.user, 'get',
+                                  reverse('orders:order_detail', args=[order.pk]), None))
+        return scenarios
+
+    def measure(self, user, method, url, data, iterations, warmup):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        timings = []
+        queries = []
+        templates = {}
+        status = None
+        for n in range(warmup + iterations):
+            # Каждый запрос в своей точке сохранения: checkout и счётчики просмотров не копят изменения
+            savepoint = transaction.savepoint()
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - started
+            transaction.savepoint_rollback(savepoint)
+            status = response.status_code
+            if n >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(response.query_stats.count)
+                profile = response.query_stats.templates
+                for template, entry in (profile.templates.items() if profile else ()):
+                    total = templates.setdefault(template, {'renders': 0, 'total_ms': 0.0, 'self_ms': 0.0})
+                    total['renders'] += entry['count']
+                    total['total_ms'] += entry['total'] * 1000
+                    total['self_ms'] += entry['self'] * 1000
+        result = {
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': max(queries),
+        }
+        if templates:
+            # Среднее на один запрос
+            result['templates'] = {
+                template: {key: round(value / iterations, 2) for key, value in entry.items()}
+                for template, entry in templates.items()
+            }
+        return result
+
+    def report_templates(self, result):
+        templates = sorted(result.get('templates', {}).items(), key=lambda item: item[1]['self_ms'], reverse=True)
+        for template, entry in templates[:5]:
+            self.stdout.write(
+                f"    {template:<44}{entry['self_ms']:>8.2f} ms self{entry['total_ms']:>8.2f} ms total"
+                f"  x{entry['renders']:g}"
+            )
+
+    def report(self, name, result, baseline):
+        line = (
+            f"{name:<24}{result['status']:>5}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+            f"{result['queries']:>6} q"
+        )
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += (
+                f"   p50 {self.delta(result['p50_ms'], previous['p50_ms'])}"
+                f", p95 {self.delta(result['p95_ms'], previous['p95_ms'])}"
+                f", q {result['queries'] - previous['queries']:+d}"
+            )
+        self.stdout.write(line)
+
+    def delta(self, current, previous):
+        if not previous:
+            return 'n/a'
+        return f'{(current - previous) / previous * 100:+.0f}%'
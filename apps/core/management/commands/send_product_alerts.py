@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.catalog.alerts import BATCH_SIZE, send_alerts
+
+
+class Command(BaseCommand):
+    help = 'Рассылает оповещения о снижении цены и возвращении в продажу товаров из избранного'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Записей очереди за транзакцию')
+
+    def handle(self, *args, **options):
+        report = send_alerts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей очереди: {report.alerts}, товаров с оповещениями: {report.products}, '
+            f'адресатов: {report.recipients}'
+        ))
@@ -0,0 +1,169 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import QueryStats, TemplateProfile, get_query_budget, profile_templates
+from .routers import track_writes, use_primary
+
+
+logger = logging.getLogger('onyx.queries')
+template_logger = logging.getLogger('onyx.templates')
+
+
+PRIMARY_PIN_COOKIE = 'onyx_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class PrimaryReplicaMiddleware:
+    """
+    Read-your-writes для реплики: изменяющие запросы и все запросы пользователя
+    в течение REPLICA_PIN_SECONDS после записи читают с основной базы. Записью
+    считается и GET, который писал в модели, читаемые с реплики (например,
+    переключение избранного по ссылке).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if settings.REPLICA_DATABASE is None:
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            written = stack.enter_context(track_writes())
+            if self.pinned(request):
+                stack.enter_context(use_primary())
+            response = self.get_response(request)
+        return self.process_response(request, response, written)
+
+    async def __acall__(self, request):
+        if settings.REPLICA_DATABASE is None:
+            return await self.get_response(request)
+
+        # ContextVar переживает переход в sync_to_async, где выполняется ORM
+        with ExitStack() as stack:
+            written = stack.enter_context(track_writes())
+            if self.pinned(request):
+                stack.enter_context(use_primary())
+            response = await self.get_response(request)
+        return self.process_response(request, response, written)
+
+    def pinned(self, request):
+        return request.method not in SAFE_METHODS or PRIMARY_PIN_COOKIE in request.COOKIES
+
+    def process_response(self, request, response, written):
+        if request.method not in SAFE_METHODS or written:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает SQL-запросы, их суммарное время, повторяющиеся запросы и время рендеринга
+    шаблона, а при TEMPLATE_PROFILING - время каждого шаблона и include. Результат пишется в лог и заголовок Server-Timing, а также доступен
+    тестам как response.query_stats.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUERY_INSTRUMENTATION:
+            return self.get_response(request)
+
+        stats = request.query_stats = QueryStats()
+        started = time.perf_counter()
+        with self.instrument(stats):
+            response = self.get_response(request)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_INSTRUMENTATION:
+            return await self.get_response(request)
+
+        stats = request.query_stats = QueryStats()
+        started = time.perf_counter()
+        with self.instrument(stats):
+            response = await self.get_response(request)
+        return self.finish(request, response, stats, started)
+
+    def instrument(self, stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        if settings.TEMPLATE_PROFILING:
+            stats.templates = TemplateProfile()
+            stack.enter_context(profile_templates(stats.templates))
+        return stack
+
+    def finish(self, request, response, stats, started):
+        total = time.perf_counter() - started
+        response.query_stats = stats
+        response['Server-Timing'] = stats.server_timing(total)
+        self.log(request, stats, total)
+        self.log_templates(request, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            view_class = getattr(view_func, 'view_class', None)
+            stats.view_name = view_class.__name__ if view_class else view_func.__name__
+            stats.budget = get_query_budget(view_func)
+
+    def process_template_response(self, request, response):
+        stats = getattr(request, 'query_stats', None)
+        if stats is None:
+            return response
+        started = time.perf_counter()
+
+        def rendered(response):
+            stats.template_time += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, stats, total):
+        level = logging.WARNING if stats.over_budget or stats.suspicious else logging.DEBUG
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(
+            level,
+            '%s %s view=%s queries=%d budget=%s sql=%.1fms template=%.1fms total=%.1fms',
+            request.method, request.path, stats.view_name, stats.count, stats.budget,
+            stats.sql_time * 1000, stats.template_time * 1000, total * 1000,
+        )
+        for sql, count in stats.duplicates.items():
+            logger.log(level, 'duplicate x%d: %s', count, sql)
+
+    def log_templates(self, request, stats):
+        if stats.templates is None or not template_logger.isEnabledFor(logging.INFO):
+            return
+        for name, count, total, own in stats.templates.slowest():
+            template_logger.info(
+                '%s %s template=%s renders=%d total=%.1fms self=%.1fms',
+                request.method, request.path, name, count, total * 1000, own * 1000,
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_notification_user_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('order_created', 'Создан заказ'), ('order_status', 'Изменен статус заказа'), ('payment_received', 'Получен платеж'), ('new_message', 'Новое сообщение'), ('product_sold', 'Товар продан'), ('review_received', 'Получен отзыв'), ('price_drop', 'Снижение цены'), ('back_in_stock', 'Снова в наличии')], max_length=20),
+        ),
+    ]
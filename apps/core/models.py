@@ -8,6 +8,8 @@ class NotificationType(models.TextChoices):
     NEW_MESSAGE = 'new_message', 'Новое сообщение'
     PRODUCT_SOLD = 'product_sold', 'Товар продан'
     REVIEW_RECEIVED = 'review_received', 'Получен отзыв'
+    PRICE_DROP = 'price_drop', 'Снижение цены'
+    BACK_IN_STOCK = 'back_in_stock', 'Снова в наличии'
 
 class Notification(models.Model):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='notifications')
@@ -22,8 +24,32 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Счетчик непрочитанных, список уведомлений (непрочитанные сверху) и отметка о прочтении
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_unread_idx'),
+        ]
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+
+
+class DeletionJob(models.Model):
+    """Отложенное удаление объектов с большим числом связанных строк (apps.core.deletion)"""
+    model = models.CharField(max_length=100, help_text="Метка модели, например catalog.product")
+    object_ids = models.JSONField()
+    requested_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # {метка модели: удалено строк}
+    deleted = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Удаление в фоне"
+        verbose_name_plural = "Удаления в фоне"
+
+    def __str__(self):
+        return f"{self.model}: {len(self.object_ids)} объектов"
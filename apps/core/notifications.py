@@ -0,0 +1,216 @@
+"""
+Создание уведомлений.
+
+События копятся в пакете и записываются одним bulk_create после фиксации
+транзакции: откат заказа не оставляет уведомлений о нем, а заказ с товарами десяти
+продавцов - это один INSERT, а не одиннадцать. Вложенные пакеты (сервис внутри
+другого сервиса) сливаются во внешний, при исключении события вложенного пакета
+отбрасываются.
+
+    with notifications.batch() as batch:
+        batch.add(customer.user_id, NotificationType.ORDER_CREATED, 'Заказ оформлен', link=url)
+        batch.add(seller_user_id, NotificationType.PRODUCT_SOLD, 'Новый заказ', line, key=order.pk)
+
+Рассылка многим пользователям принимает queryset id и пишется порциями по CHUNK_SIZE.
+События одного пользователя и типа с общим key сливаются в одно уведомление
+(строки сообщения объединяются), точные повторы отбрасываются. window дополнительно
+отбрасывает событие, если такое же непрочитанное уведомление уже создано за этот срок.
+
+Число непрочитанных для значка в шапке хранится в кеше: новые уведомления и
+отметки о прочтении меняют счетчик, а раз в UNREAD_TIMEOUT он пересчитывается
+по базе (индекс user, is_read, -created_at). Счетчик один на все процессы только
+при общем кеше (CACHE_REDIS_URL): с LocMemCache изменения видит лишь процесс,
+обработавший запрос, и в других процессах значок отстает до UNREAD_TIMEOUT.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Notification
+from .signals import notifications_created
+
+
+CHUNK_SIZE = 1000
+UNREAD_TIMEOUT = 5 * 60
+# При рассылке большему числу пользователей счетчики сбрасываются, а не увеличиваются
+# по одному: пересчет при следующем показе значка стоит одного запроса по индексу
+UNREAD_INCR_LIMIT = 100
+
+_current = ContextVar('notification_batch', default=None)
+
+
+def iter_user_ids(users):
+    if isinstance(users, int):
+        yield users
+    elif isinstance(users, models.Model):
+        yield users.pk
+    elif isinstance(users, models.QuerySet):
+        yield from users.iterator(chunk_size=CHUNK_SIZE)
+    else:
+        yield from users
+
+
+class Event:
+    def __init__(self, user_id, notification_type, title, message, link, window):
+        self.user_id = user_id
+        self.notification_type = notification_type
+        self.title = title
+        self.lines = [message] if message else []
+        self.link = link
+        self.window = window
+
+    @property
+    def message(self):
+        return '\n'.join(self.lines)
+
+    def build(self):
+        return Notification(
+            user_id=self.user_id,
+            notification_type=self.notification_type,
+            title=self.title[:200],
+            message=self.message,
+            link=self.link,
+        )
+
+
+class NotificationBatch:
+    def __init__(self):
+        self.events = {}
+
+    def __bool__(self):
+        return bool(self.events)
+
+    def add(self, users, notification_type, title, message='', link=None, key=None, window=None):
+        """
+        users - пользователь, его id или итерируемое id (в том числе values_list из базы).
+        События с одинаковым key у одного пользователя и типа сливаются в одно уведомление.
+        """
+        for user_id in iter_user_ids(users):
+            event_key = (user_id, notification_type, key if key is not None else (title, message, link))
+            event = self.events.get(event_key)
+            if event is None:
+                self.events[event_key] = Event(user_id, notification_type, title, message, link, window)
+            elif key is not None and message and message not in event.lines:
+                event.lines.append(message)
+
+    def merge(self, other):
+        for event_key, event in other.events.items():
+            existing = self.events.get(event_key)
+            if existing is None:
+                self.events[event_key] = event
+            else:
+                existing.lines.extend(line for line in event.lines if line not in existing.lines)
+
+    def flush(self):
+        events = self.drop_recent(list(self.events.values()))
+        self.events = {}
+        if not events:
+            return []
+        created = Notification.objects.bulk_create([event.build() for event in events], batch_size=CHUNK_SIZE)
+        unread_added(Counter(notification.user_id for notification in created))
+        notifications_created.send(sender=Notification, notifications=created)
+        return created
+
+    def drop_recent(self, events):
+        """Отбрасывает события с window, повторяющие непрочитанные уведомления за этот срок"""
+        groups = {}
+        for event in events:
+            if event.window:
+                groups.setdefault((event.notification_type, event.window), []).append(event)
+        if not groups:
+            return events
+
+        duplicates = set()
+        now = timezone.now()
+        for (notification_type, window), group in groups.items():
+            user_ids = sorted({event.user_id for event in group})
+            for start in range(0, len(user_ids), CHUNK_SIZE):
+                duplicates.update(
+                    (notification_type, *row) for row in Notification.objects.filter(
+                        user_id__in=user_ids[start:start + CHUNK_SIZE],
+                        notification_type=notification_type,
+                        is_read=False,
+                        created_at__gte=now - window,
+                    ).values_list('user_id', 'title', 'message', 'link').order_by()
+                )
+        return [
+            event for event in events
+            if not event.window
+            or (event.notification_type, event.user_id, event.title[:200], event.message, event.link) not in duplicates
+        ]
+
+
+@contextmanager
+def batch():
+    parent = _current.get()
+    current = NotificationBatch()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+    if parent is not None:
+        parent.merge(current)
+    elif current:
+        transaction.on_commit(current.flush)
+
+
+def notify(users, notification_type, title, message='', link=None, key=None, window=None):
+    """Одно событие; внутри batch() попадает в общий пакет"""
+    with batch() as current:
+        current.add(users, notification_type, title, message, link, key=key, window=window)
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user):
+    key = unread_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = reconcile_unread(user)
+    return count
+
+
+def reconcile_unread(user):
+    count = Notification.objects.filter(user=user, is_read=False).count()
+    cache.set(unread_key(user.pk), count, UNREAD_TIMEOUT)
+    return count
+
+
+def unread_added(counts):
+    """counts - {user_id: сколько непрочитанных добавилось}"""
+    if len(counts) > UNREAD_INCR_LIMIT:
+        cache.delete_many([unread_key(user_id) for user_id in counts])
+        return
+    for user_id, added in counts.items():
+        try:
+            cache.incr(unread_key(user_id), added)
+        except ValueError:
+            # Счетчика нет в кеше - посчитается при следующем показе
+            pass
+
+
+def mark_read(user, pk):
+    updated = Notification.objects.filter(user=user, pk=pk, is_read=False).update(
+        is_read=True, read_at=timezone.now(),
+    )
+    if updated:
+        try:
+            if cache.decr(unread_key(user.pk)) < 0:
+                cache.delete(unread_key(user.pk))
+        except ValueError:
+            pass
+    return updated
+
+
+def mark_all_read(user):
+    """Один UPDATE по индексу непрочитанных пользователя"""
+    updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True, read_at=timezone.now())
+    cache.set(unread_key(user.pk), 0, UNREAD_TIMEOUT)
+    return updated
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+# Приложения, чтения из которых допустимо отдавать реплике
+REPLICA_READ_APPS = {'catalog', 'analytics'}
+
+_use_primary = ContextVar('use_primary', default=False)
+# Множество приложений из REPLICA_READ_APPS, в модели которых писали внутри track_writes()
+_written_apps = ContextVar('written_apps', default=None)
+
+
+@contextmanager
+def use_primary():
+    """Принудительно читает все данные с основной базы внутри блока"""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """
+    Отмечает записи в модели, чтения которых идут на реплику. После такой записи
+    чтения до конца блока идут с основной базы. Возвращает множество приложений, в
+    которые писали: изменяемый объект виден и из sync_to_async, где контекст копируется.
+    """
+    written = set()
+    token = _written_apps.set(written)
+    try:
+        yield written
+    finally:
+        _written_apps.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Отправляет чтения каталога и аналитики на реплику, все остальное - на основную базу"""
+
+    def replica_alias(self):
+        alias = settings.REPLICA_DATABASE
+        if alias is None:
+            return None
+        # Реплика, указывающая на ту же базу (например, тестовое зеркало SQLite),
+        # не дает выигрыша, а в тестах не видит данных незавершенной транзакции
+        replica, primary = connections[alias].settings_dict, connections['default'].settings_dict
+        if all(replica[key] == primary[key] for key in ('NAME', 'HOST', 'PORT')):
+            return None
+        return alias
+
+    def db_for_read(self, model, **hints):
+        replica = self.replica_alias()
+        if replica is None or _use_primary.get() or _written_apps.get():
+            return 'default'
+        if model._meta.app_label in REPLICA_READ_APPS:
+            return replica
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        written = _written_apps.get()
+        if written is not None and model._meta.app_label in REPLICA_READ_APPS:
+            written.add(model._meta.app_label)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,14 @@
+from django.dispatch import Signal, receiver
+
+from .events import publish_notifications
+
+
+# Отправляется после записи пакета уведомлений одним bulk_create.
+# Аргументы: notifications - список созданных Notification (с pk).
+notifications_created = Signal()
+
+
+@receiver(notifications_created)
+def stream_notifications(sender, notifications, **kwargs):
+    # Открытые потоки SSE получателей сразу показывают уведомление
+    publish_notifications(notifications)
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage, storages
+
+try:
+    # pip install "onyx[brotli]"; без пакета собираются только .gz
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot'}
+# Мелкие файлы не сжимаем: выигрыш меньше накладных расходов на заголовки
+MIN_COMPRESS_SIZE = 256
+# Сжатая копия сохраняется, только если она заметно меньше исходной
+MAX_COMPRESS_RATIO = 0.95
+COMPRESS_WORKERS = 4
+
+
+def compress_file(path):
+    """Пишет рядом с файлом path.gz и path.br; возвращает список созданных расширений"""
+    if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+
+    created = []
+    for suffix, compress in variants:
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            created.append(suffix)
+            continue
+        compressed = compress()
+        if len(compressed) >= len(data) * MAX_COMPRESS_RATIO:
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        created.append(suffix)
+    return created
+
+
+class StaticStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хешем содержимого в имени файла (base.3f2a9c.css), поэтому ее можно
+    кешировать навсегда. Пока collectstatic не запускался (тесты, локальный запуск
+    без DEBUG), манифеста нет и ссылки строятся без хеша.
+
+    После обработки манифестом collectstatic заранее сжимает текстовые файлы в .gz
+    (и .br, если установлен brotli), чтобы не сжимать их на каждый запрос.
+    """
+    manifest_strict = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._immutable = None
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def is_immutable(self, name):
+        """Имя с хешем содержимого: файл с таким именем никогда не изменится"""
+        if self._immutable is None:
+            self._immutable = set(self.hashed_files.values())
+        return name in self._immutable
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = sorted({
+            name for name in (*paths, *self.hashed_files.values())
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+        })
+        with ThreadPoolExecutor(max_workers=COMPRESS_WORKERS) as executor:
+            # zlib и brotli отпускают GIL, поэтому потоки действительно сжимают параллельно
+            for name, created in zip(names, executor.map(lambda name: compress_file(self.path(name)), names)):
+                for suffix in created:
+                    yield name, name + suffix, True
+        self._immutable = None
+
+
+# <каталог>/<первые два символа хеша>/<sha256>.<расширение>
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}\.[a-z0-9]+$')
+TEMP_PREFIX = '.upload-'
+
+
+def is_content_addressed(name):
+    """Имя файла задано его содержимым, поэтому по этому URL всегда отдается один и тот же файл"""
+    return bool(CONTENT_ADDRESSED_RE.search(name))
+
+
+def product_image_storage():
+    return storages['product_images']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файлы с именем по SHA-256 содержимого: одинаковые загрузки хранятся один раз,
+    а URL файла не меняется никогда и кешируется без ограничения срока.
+
+    Загрузка пишется во временный файл рядом с целевым и хешируется по частям, без
+    буферизации в памяти; затем переименовывается в имя по хешу. Если такой файл уже есть,
+    временный удаляется, а у существующего обновляется mtime. Удаление строк, ссылающихся
+    на файл, файл не трогает: другие строки могут ссылаться на него же. Файлы без ссылок
+    убирает сборка мусора в MEDIA_ROOT (apps.core.media, команда collect_media).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имени означает совпадение содержимого, переименовывать нечего
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        os.makedirs(self.path(directory or '.'), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path(directory or '.'), prefix=TEMP_PREFIX)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Свежая ссылка на старый файл не должна попасть под сборку мусора
+                os.utime(full_path)
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
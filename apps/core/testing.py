@@ -0,0 +1,170 @@
+import logging
+import shutil
+import tempfile
+from decimal import Decimal
+from itertools import count
+from types import ModuleType
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Count
+from django.test import override_settings
+from django.urls import include, path
+
+from apps.accounts.models import Customer, Seller
+from apps.catalog.models import Brand, Category, Product, ProductImage, Size, SizeType
+from apps.catalog.references import get_references, invalidate_references
+from apps.core.models import Notification
+from apps.core.notifications import UNREAD_TIMEOUT, unread_key
+
+
+_sequence = count(1)
+
+# Минимальный валидный GIF 1x1
+TINY_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,'
+    b'\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+def make_user(**kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('username', f'user{n}')
+    kwargs.setdefault('email', f'user{n}@example.com')
+    return User.objects.create_user(password='password', **kwargs)
+
+
+def make_customer(**kwargs):
+    user = kwargs.pop('user', None) or make_user()
+    kwargs.setdefault('name', f'Customer {user.pk}')
+    kwargs.setdefault('email', user.email)
+    kwargs.setdefault('phone', '+79990000000')
+    return Customer.objects.create(user=user, **kwargs)
+
+
+def make_seller(**kwargs):
+    user = kwargs.pop('user', None) or make_user()
+    kwargs.setdefault('name', f'Seller {user.pk}')
+    kwargs.setdefault('email', user.email)
+    kwargs.setdefault('phone', '+79990000000')
+    return Seller.objects.create(user=user, **kwargs)
+
+
+def make_category(**kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('name', f'Category {n}')
+    kwargs.setdefault('slug', f'category-{n}')
+    return Category.objects.create(**kwargs)
+
+
+def make_brand(**kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('name', f'Brand {n}')
+    kwargs.setdefault('slug', f'brand-{n}')
+    return Brand.objects.create(**kwargs)
+
+
+def make_size(**kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('size_type', SizeType.CLOTHING)
+    kwargs.setdefault('value', f'S{n}')
+    kwargs.setdefault('display_value', f'S{n}')
+    return Size.objects.create(**kwargs)
+
+
+def make_product(seller=None, images=0, **kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('title', f'Product {n}')
+    kwargs.setdefault('description', 'Description')
+    kwargs.setdefault('price', Decimal('1000.00'))
+    kwargs.setdefault('quantity', 1)
+    kwargs.setdefault('condition', 'new')
+    product = Product.objects.create(seller=seller or make_seller(), **kwargs)
+    for order in range(images):
+        ProductImage.objects.create(
+            product=product,
+            image=SimpleUploadedFile(f'p{n}-{order}.gif', TINY_GIF, content_type='image/gif'),
+            order=order,
+            is_main=order == 0,
+        )
+    return product
+
+
+def views_urlconf(use_async):
+    """
+    Корневой urlconf, в котором каталог и корзина обслуживаются синхронными
+    или асинхронными представлениями независимо от ASYNC_VIEWS.
+    Используется как override_settings(ROOT_URLCONF=views_urlconf(True)).
+    """
+    from apps.catalog import urls as catalog_urls
+    from apps.orders import urls as orders_urls
+    from onyx import urls
+
+    replacements = {
+        'catalog': catalog_urls.build_urlpatterns(use_async),
+        'orders': orders_urls.build_urlpatterns(use_async),
+    }
+    urlconf = ModuleType(f"onyx.urls.{'async' if use_async else 'sync'}")
+    urlconf.urlpatterns = [
+        path(str(pattern.pattern), include((replacements[pattern.namespace], pattern.namespace)))
+        if getattr(pattern, 'namespace', None) in replacements else pattern
+        for pattern in urls.urlpatterns
+    ]
+    return urlconf
+
+
+class TempMediaMixin:
+    """Загруженные в тестах файлы пишутся во временный MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class QueryBudgetMixin:
+    """
+    Проверка бюджета запросов, объявленного у view (атрибут query_budget
+    или декоратор apps.core.instrumentation.query_budget).
+    """
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(QUERY_INSTRUMENTATION=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Превышение бюджета проверяется тестом, в лог его не дублируем
+        logger = logging.getLogger('onyx.queries')
+        logger.disabled = True
+        self.addCleanup(setattr, logger, 'disabled', False)
+        # Бюджет меряется на прогретых кешах справочников и счетчиков непрочитанных, как в
+        # работающем процессе; кеши перечитываются, потому что откат данных прошлого теста
+        # сигналов не шлет
+        cache.clear()
+        invalidate_references()
+        get_references()
+        unread = dict(
+            Notification.objects.filter(is_read=False).values_list('user').annotate(count=Count('pk')).order_by()
+        )
+        cache.set_many({
+            unread_key(pk): unread.get(pk, 0) for pk in User.objects.values_list('pk', flat=True)
+        }, UNREAD_TIMEOUT)
+
+    def assertWithinQueryBudget(self, response):
+        stats = response.query_stats
+        self.assertIsNotNone(stats.budget, f'{stats.view_name} не объявляет query_budget')
+        self.assertLessEqual(
+            stats.count, stats.budget,
+            f'{stats.view_name}: {stats.count} запросов при бюджете {stats.budget}; '
+            f'повторы: {stats.duplicates}',
+        )
+        return stats
@@ -1,3 +1,456 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, models, router
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+
+from apps.analytics.models import ProductAnalytics, ProductView, SearchQuery
+from apps.catalog.models import Brand, Category, PriceChange, Product, Review, Size, Wishlist
+from apps.orders.models import Cart, CartItem, Order, OrderItem, Payment, PaymentMethod
+from . import admin_tools
+from .deletion import deletion_impact, run_pending, schedule_deletion
+from .instrumentation import fingerprint, get_query_budget
+from .middleware import PRIMARY_PIN_COOKIE, PrimaryReplicaMiddleware
+from .routers import PrimaryReplicaRouter, use_primary
+from . import notifications
+from .media import collect_garbage
+from .models import DeletionJob, Notification, NotificationType
+from .storage import is_content_addressed
+from .testing import TINY_GIF, TempMediaMixin, make_brand, make_customer, make_product, make_size, make_user
+
+
+class ReplicaRouter(PrimaryReplicaRouter):
+    def replica_alias(self):
+        return 'replica'
+
+
+@override_settings(
+    REPLICA_DATABASE='replica',
+    REPLICA_PIN_SECONDS=5,
+    DATABASE_ROUTERS=['apps.core.tests.ReplicaRouter'],
+)
+class PrimaryReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = {}
+
+        def view(request):
+            self.seen['product'] = Product.objects.all().db
+            self.seen['cart'] = Cart.objects.all().db
+            return HttpResponse()
+
+        self.middleware = PrimaryReplicaMiddleware(view)
+
+    def test_catalog_and_analytics_reads_go_to_replica(self):
+        self.assertEqual(Product.objects.all().db, 'replica')
+        self.assertEqual(ProductView.objects.all().db, 'replica')
+
+    def test_orders_and_writes_stay_on_primary(self):
+        self.assertEqual(Cart.objects.all().db, 'default')
+        self.assertEqual(Product.objects.all().select_for_update().db, 'default')
+        self.assertEqual(router.db_for_write(Product), 'default')
+
+    def test_use_primary_block(self):
+        with use_primary():
+            self.assertEqual(Product.objects.all().db, 'default')
+        self.assertEqual(Product.objects.all().db, 'replica')
+
+    def test_safe_request_reads_replica(self):
+        response = self.middleware(self.factory.get('/catalog/'))
+        self.assertEqual(self.seen, {'product': 'replica', 'cart': 'default'})
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_write_pins_user_to_primary(self):
+        response = self.middleware(self.factory.post('/orders/checkout/'))
+        self.assertEqual(self.seen['product'], 'default')
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/orders/orders/')
+        request.COOKIES[PRIMARY_PIN_COOKIE] = '1'
+        self.middleware(request)
+        self.assertEqual(self.seen['product'], 'default')
+
+    def test_get_with_catalog_write_pins_user(self):
+        def view(request):
+            self.seen['before'] = Product.objects.all().db
+            # Запись, как в переключении избранного по ссылке
+            router.db_for_write(Wishlist)
+            self.seen['after'] = Product.objects.all().db
+            return HttpResponse()
+
+        response = PrimaryReplicaMiddleware(view)(self.factory.get('/catalog/wishlist/toggle/1/'))
+        self.assertEqual(self.seen, {'before': 'replica', 'after': 'default'})
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        # Запись в модели, которые читаются с основной базы, не закрепляет пользователя
+        def cart_view(request):
+            router.db_for_write(Cart)
+            return HttpResponse()
+
+        response = PrimaryReplicaMiddleware(cart_view)(self.factory.get('/orders/cart/'))
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    @override_settings(REPLICA_DATABASE=None, DATABASE_ROUTERS=['apps.core.routers.PrimaryReplicaRouter'])
+    def test_without_replica_everything_uses_primary(self):
+        response = self.middleware(self.factory.post('/orders/checkout/'))
+        self.assertEqual(Product.objects.all().db, 'default')
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+
+class QueryInstrumentationTests(TestCase):
+    def test_fingerprint_collapses_literals(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 5 LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND x = 7 LIMIT 1'),
+        )
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('catalog:product_list'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total')
+        self.assertEqual(response.query_stats.view_name, 'ProductListView')
+        self.assertGreater(response.query_stats.template_time, 0)
+
+    @override_settings(QUERY_INSTRUMENTATION=True, TEMPLATE_PROFILING=True)
+    def test_template_profile(self):
+        with self.assertLogs('onyx.templates'):
+            response = self.client.get(reverse('accounts:register'))
+        profile = response.query_stats.templates
+        page = profile.templates['accounts/register.html']
+        self.assertEqual(page['count'], 1)
+        # Виджеты формы рендерятся вложенными шаблонами и входят в total страницы
+        widgets = [name for name in profile.templates if name.startswith('django/forms/widgets/')]
+        self.assertTrue(widgets)
+        self.assertGreater(page['total'], page['self'])
+        self.assertContains(response, 'css/base.css')
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('catalog:product_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_every_view_declares_budget(self):
+        resolver = get_resolver()
+        for namespace in ('catalog', 'orders', 'accounts'):
+            _, app_resolver = resolver.namespace_dict[namespace]
+            for pattern in app_resolver.url_patterns:
+                with self.subTest(view=f'{namespace}:{pattern.name}'):
+                    self.assertIsNotNone(get_query_budget(pattern.callback))
+
+
+class StaticServingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.static_root = tempfile.mkdtemp()
+        cls.static_override = override_settings(STATIC_ROOT=cls.static_root)
+        cls.static_override.enable()
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.static_override.disable()
+        shutil.rmtree(cls.static_root, ignore_errors=True)
+
+    def test_precompressed_variants(self):
+        url = static('css/base.css')
+        self.assertRegex(url, r'base\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, 'css', os.path.basename(url) + '.gz')))
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'body', b''.join(response.streaming_content))
+
+    def test_unhashed_name_is_not_immutable(self):
+        response = self.client.get('/static/css/base.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+
+class MediaServingTests(TempMediaMixin, SimpleTestCase):
+    def setUp(self):
+        os.makedirs(os.path.join(self.media_root, 'products'), exist_ok=True)
+        with open(os.path.join(self.media_root, 'products', 'a.jpg'), 'wb') as f:
+            f.write(b'0123456789')
+
+    def test_range(self):
+        response = self.client.get('/media/products/a.jpg', headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.client.get('/media/products/a.jpg', headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get('/media/products/a.jpg', headers={'Range': 'bytes=20-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_not_modified(self):
+        response = self.client.get('/media/products/a.jpg')
+        self.assertEqual(response['Content-Length'], '10')
+        response = self.client.get('/media/products/a.jpg', headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_path_outside_root(self):
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/products/missing.jpg').status_code, 404)
+
+    @override_settings(MEDIA_SERVING='x-accel-redirect')
+    def test_offload(self):
+        response = self.client.get('/media/products/a.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/products/a.jpg')
+        self.assertEqual(response.content, b'')
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+    def collect(self):
+        call_command('collect_media', grace_hours=0, stdout=io.StringIO())
+
+    def test_duplicate_uploads_share_file(self):
+        first = make_product(images=1).images.get()
+        second = make_product(images=1).images.get()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_content_addressed(first.image.name))
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+        response = self.client.get(first.image.url)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        path = first.image.path
+        first.product.delete()
+        self.collect()
+        self.assertTrue(os.path.exists(path))
+        second.product.delete()
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+
+
+class MediaGarbageCollectorTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.brand = make_brand(logo=SimpleUploadedFile('logo.gif', TINY_GIF))
+        self.orphan = os.path.join(self.media_root, 'brands', 'old.gif')
+        with open(self.orphan, 'wb') as f:
+            f.write(TINY_GIF)
+
+    def test_removes_unreferenced_files(self):
+        report = collect_garbage(grace_hours=0)
+        self.assertIn('brands/old.gif', [name for name, _ in report.orphans])
+        self.assertNotIn(self.brand.logo.name, [name for name, _ in report.orphans])
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.brand.logo.path))
+
+    def test_dry_run_and_grace_period(self):
+        report = collect_garbage(grace_hours=0, dry_run=True)
+        self.assertIn('brands/old.gif', [name for name, _ in report.orphans])
+        self.assertTrue(os.path.exists(self.orphan))
+
+        report = collect_garbage()
+        self.assertEqual(report.orphans, [])
+        self.assertTrue(os.path.exists(self.orphan))
+
+
+class NotificationServiceTests(TestCase):
+    def setUp(self):
+        self.users = [make_user() for _ in range(5)]
+
+    def test_fan_out_is_one_insert_after_commit(self):
+        user_ids = User.objects.filter(pk__in=[user.pk for user in self.users]).values_list('pk', flat=True)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with notifications.batch() as batch:
+                batch.add(user_ids, NotificationType.NEW_MESSAGE, 'Привет')
+                notifications.notify(self.users[0], NotificationType.ORDER_STATUS, 'Заказ отправлен')
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(Notification.objects.count(), 6)
+
+    def test_coalesce_and_dedup(self):
+        user = self.users[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            with notifications.batch() as batch:
+                batch.add(user, NotificationType.PRODUCT_SOLD, 'Новый заказ #1', 'Куртка', key=1)
+                batch.add(user, NotificationType.PRODUCT_SOLD, 'Новый заказ #1', 'Кеды', key=1)
+                batch.add(user, NotificationType.NEW_MESSAGE, 'Привет')
+                batch.add(user, NotificationType.NEW_MESSAGE, 'Привет')
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(
+            Notification.objects.get(notification_type=NotificationType.PRODUCT_SOLD).message, 'Куртка\nКеды',
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.notify(user, NotificationType.NEW_MESSAGE, 'Привет', window=timedelta(hours=1))
+            notifications.notify(user, NotificationType.NEW_MESSAGE, 'Пока', window=timedelta(hours=1))
+        self.assertEqual(Notification.objects.filter(notification_type=NotificationType.NEW_MESSAGE).count(), 2)
+
+    def test_nested_batch_discarded_on_error(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with notifications.batch() as outer:
+                outer.add(self.users[0], NotificationType.NEW_MESSAGE, 'Сохранится')
+                with self.assertRaises(ValueError), notifications.batch() as inner:
+                    inner.add(self.users[1], NotificationType.NEW_MESSAGE, 'Отбросится')
+                    raise ValueError
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['Сохранится'])
+
+
+class AdminChangelistTests(TempMediaMixin, TestCase):
+    # Справочники малы, фильтры по ним индексов не требуют
+    REFERENCE_MODELS = {Size, Category, Brand}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = make_user(is_staff=True, is_superuser=True)
+        cls.populate()
+
+    @classmethod
+    def populate(cls):
+        customer = make_customer()
+        product = make_product(images=1, size=make_size())
+        ProductView.objects.create(product=product, customer=customer, ip_address='127.0.0.1')
+        SearchQuery.objects.create(query='куртка', customer=customer, results_count=1, clicked_product=product)
+        ProductAnalytics.objects.create(product=product)
+        Wishlist.objects.create(customer=customer, product=product)
+        Review.objects.create(customer=customer, seller=product.seller, product=product, rating=5, comment='Ок')
+        CartItem.objects.create(cart=Cart.objects.create(customer=customer), product=product, price=product.price)
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, product=product, price=product.price)
+        Payment.objects.create(order=order, method=PaymentMethod.CREDIT_CARD, amount=product.price)
+        Notification.objects.create(
+            user=customer.user, notification_type=NotificationType.NEW_MESSAGE, title='Привет',
+        )
+
+    def project_admins(self):
+        return [
+            (model, model_admin) for model, model_admin in admin.site._registry.items()
+            if model._meta.app_config.name.startswith('apps.')
+        ]
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_changelists_do_not_query_per_row(self):
+        self.client.force_login(self.admin_user)
+        admins = self.project_admins()
+        before = {model: self.changelist_queries(model) for model, _ in admins}
+        self.populate()
+        for model, _ in admins:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.changelist_queries(model), before[model])
+
+    def test_filters_use_indexes(self):
+        def indexed(model, name):
+            field = model._meta.get_field(name)
+            if field.primary_key or field.unique or field.db_index or isinstance(field, models.BooleanField):
+                return True
+            return any(index.fields[0].lstrip('-') == name for index in model._meta.indexes)
+
+        for model, model_admin in self.project_admins():
+            if model in self.REFERENCE_MODELS:
+                continue
+            names = [name for name in model_admin.list_filter if isinstance(name, str)]
+            if model_admin.date_hierarchy:
+                names.append(model_admin.date_hierarchy)
+            for name in names:
+                with self.subTest(model=model.__name__, field=name):
+                    self.assertNotIn('__', name)
+                    self.assertTrue(indexed(model, name))
+
+    def test_estimated_count_paginator(self):
+        queryset = Notification.objects.order_by('-id')
+        with mock.patch.object(admin_tools, 'COUNT_LIMIT', 1), self.assertNumQueries(1) as context:
+            self.assertEqual(admin_tools.EstimatedCountPaginator(queryset, 10).count, 1)
+        self.assertIn('LIMIT 1', context.captured_queries[0]['sql'])
+
+
+class DeletionServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.product = make_product()
+        cls.kept = make_product()
+        for _ in range(5):
+            ProductView.objects.create(product=cls.product, ip_address='127.0.0.1')
+        ProductView.objects.create(product=cls.kept, ip_address='127.0.0.1')
+        Wishlist.objects.create(customer=cls.customer, product=cls.product)
+        cls.search = SearchQuery.objects.create(query='куртка', results_count=1, clicked_product=cls.product)
+
+    def test_impact_counts_without_loading_rows(self):
+        queryset = Product.objects.filter(pk=self.product.pk)
+        # COUNT по товарам и каждой из 10 связей, выборка - только из непустых
+        with self.assertNumQueries(16):
+            impact = deletion_impact(queryset, sample_size=2)
+        # Цена при выставлении товара записана в историю цен
+        self.assertEqual(impact.deleted, {Product: 1, Wishlist: 1, ProductView: 5, PriceChange: 1})
+        self.assertEqual(impact.detached, {SearchQuery: 1})
+        self.assertEqual(len(impact.samples[ProductView]), 2)
+        self.assertEqual(impact.model_count['Просмотры товаров'], 5)
+
+    def test_chunked_delete(self):
+        user = make_user()
+        job = schedule_deletion(Product.objects.filter(pk=self.product.pk), user)
+        self.assertEqual((job.object_ids, job.requested_by), ([str(self.product.pk)], user))
+
+        [job] = run_pending(chunk_size=2)
+        self.assertEqual(job.deleted, {
+            'analytics.ProductView': 5, 'catalog.Wishlist': 1, 'catalog.PriceChange': 1, 'catalog.Product': 1,
+        })
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
+        self.assertEqual(ProductView.objects.get().product, self.kept)
+        self.search.refresh_from_db()
+        self.assertIsNone(self.search.clicked_product)
+        self.assertEqual(run_pending(), [])
+
+
+class SessionTests(TestCase):
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        MESSAGE_STORAGE='django.contrib.messages.storage.cookie.CookieStorage',
+    )
+    def test_cart_flow_without_session_table(self):
+        customer = make_customer()
+        product = make_product()
+        self.client.force_login(customer.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('orders:add_to_cart', args=[product.pk]), follow=True)
+        self.assertContains(response, 'добавлен в корзину')
+        self.assertFalse([query for query in context.captured_queries if 'django_session' in query['sql']])
+
+    def test_cleanup_in_chunks(self):
+        for expired in (True,) * 5 + (False,) * 2:
+            session = SessionStore()
+            session.set_expiry(-60 if expired else 3600)
+            session.create()
+
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command('cleanup_sessions', chunk_size=2, stdout=out)
+        self.assertIn('Удалено истекших сессий: 5', out.getvalue())
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in context.captured_queries), 3)
@@ -1,3 +1,203 @@
-from django.shortcuts import render
+"""
+Раздача статики и медиафайлов без DEBUG.
 
-# Create your views here.
+Статика берется из STATIC_ROOT: если клиент принимает br/gzip и collectstatic собрал
+сжатую копию, отдается она. Файлы с хешем в имени кешируются на год с immutable.
+
+Медиафайлы (изображения товаров) по возможности отдает веб-сервер: MEDIA_SERVING
+выбирает X-Accel-Redirect (nginx) или X-Sendfile (Apache, lighttpd). Без него файл
+отдает Django через FileResponse: под gunicorn тело уходит через os.sendfile,
+поддерживаются Range-запросы и If-Modified-Since.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views import View
+from django.views.static import was_modified_since
+
+from .storage import is_content_addressed
+
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Порядок важен: brotli сжимает текст лучше gzip
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accepted_encodings(header):
+    encodings = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip().removeprefix('q=')
+        try:
+            if params and float(q) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def parse_range(header, size):
+    """(start, end) включительно для одного диапазона; None - отдать файл целиком; ValueError - 416"""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        # Несколько диапазонов и неизвестные единицы не поддерживаем: допустимо ответить 200
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class FileRange:
+    """
+    Часть файла для FileResponse. fileno() позволяет gunicorn отправить ее через
+    os.sendfile с текущей позиции на Content-Length байт; при чтении через read()
+    данные за концом диапазона не отдаются.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class FileView(View):
+    """Отдача файла из каталога root с поддержкой сжатых копий, Range и условных запросов"""
+    http_method_names = ['get', 'head']
+    query_budget = 0
+    precompressed = False
+
+    def get_root(self):
+        raise NotImplementedError
+
+    def get_cache_control(self, path):
+        raise NotImplementedError
+
+    def get(self, request, path):
+        try:
+            fullpath = safe_join(self.get_root(), path)
+        except SuspiciousFileOperation:
+            raise Http404(path)
+        if not os.path.isfile(fullpath):
+            raise Http404(path)
+
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        content_type = content_type or 'application/octet-stream'
+        content_encoding = None
+        if self.precompressed and not encoding:
+            accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+            for name, suffix in PRECOMPRESSED:
+                if name in accepted and os.path.isfile(fullpath + suffix):
+                    fullpath, content_encoding = fullpath + suffix, name
+                    break
+
+        stat = os.stat(fullpath)
+        if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            response = self.file_response(request, path, fullpath, stat, content_type)
+            if content_encoding:
+                response.headers['Content-Encoding'] = content_encoding
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        if self.precompressed:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, **self.get_cache_control(path))
+        return response
+
+    def file_response(self, request, path, fullpath, stat, content_type):
+        size = stat.st_size
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if range_header and self.range_applies(request, stat.st_mtime):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response.headers['Content-Range'] = f'bytes */{size}'
+                return response
+
+        file = open(fullpath, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response.headers['Content-Length'] = size
+        else:
+            start, end = byte_range
+            response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+            response.headers['Content-Length'] = end - start + 1
+            response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+
+    def range_applies(self, request, mtime):
+        """If-Range с датой: диапазон действителен, только если файл с тех пор не менялся"""
+        if_range = request.headers.get('If-Range')
+        if not if_range:
+            return True
+        date = parse_http_date_safe(if_range)
+        return date is not None and int(mtime) <= date
+
+
+class StaticFileView(FileView):
+    precompressed = True
+
+    def get_root(self):
+        return settings.STATIC_ROOT
+
+    def get_cache_control(self, path):
+        is_immutable = getattr(staticfiles_storage, 'is_immutable', None)
+        if is_immutable and is_immutable(path):
+            return {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+        return {'public': True, 'max_age': settings.STATIC_CACHE_MAX_AGE}
+
+
+class MediaFileView(FileView):
+
+    def get_root(self):
+        return settings.MEDIA_ROOT
+
+    def get_cache_control(self, path):
+        if is_content_addressed(path):
+            return {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+        return {'public': True, 'max_age': settings.MEDIA_CACHE_MAX_AGE}
+
+    def file_response(self, request, path, fullpath, stat, content_type):
+        if settings.MEDIA_SERVING == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+            return response
+        if settings.MEDIA_SERVING == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response.headers['X-Sendfile'] = fullpath
+            return response
+        return super().file_response(request, path, fullpath, stat, content_type)
@@ -10,16 +10,16 @@ class CartItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('created_at', 'updated_at')
     fields = ('product', 'quantity', 'price', 'created_at', 'updated_at')
+    raw_id_fields = ('product',)
 
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     """Админка для корзин"""
     list_display = ('id', 'customer', 'created_at', 'updated_at', 'delete_button')
-    list_filter = ('created_at', 'updated_at')
+    list_select_related = ('customer',)
     search_fields = ('customer__name', 'customer__email')
     readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
     raw_id_fields = ('customer',)
     inlines = [CartItemInline]
     
@@ -51,6 +51,7 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('created_at', 'updated_at')
     fields = ('product', 'quantity', 'price', 'created_at', 'updated_at')
+    raw_id_fields = ('product',)
 
 
 class PaymentInline(admin.TabularInline):
@@ -65,7 +66,8 @@ class PaymentInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     """Админка для заказов"""
     list_display = ('id', 'customer', 'status', 'created_at', 'updated_at', 'delete_button')
-    list_filter = ('status', 'created_at', 'updated_at')
+    list_select_related = ('customer',)
+    list_filter = ('status',)
     search_fields = ('customer__name', 'customer__email')
     readonly_fields = ('created_at', 'updated_at')
     date_hierarchy = 'created_at'
@@ -98,10 +100,11 @@ class OrderAdmin(admin.ModelAdmin):
 class PaymentAdmin(admin.ModelAdmin):
     """Админка для платежей"""
     list_display = ('id', 'order', 'status', 'method', 'amount', 'created_at', 'updated_at', 'delete_button')
-    list_filter = ('status', 'method', 'created_at', 'updated_at')
+    # Order.__str__ показывает имя покупателя
+    list_select_related = ('order__customer',)
+    list_filter = ('status',)
     search_fields = ('order__customer__name', 'order__id')
     readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
     raw_id_fields = ('order',)
     
     def delete_button(self, obj):
@@ -0,0 +1,89 @@
+"""
+Асинхронные действия с корзиной для запуска под ASGI (ASYNC_VIEWS=True).
+Отвечают JSON на fetch-запросы и редиректом с сообщением на обычные ссылки.
+"""
+from django.contrib import messages
+from django.shortcuts import aget_object_or_404
+from django.urls import reverse
+
+from apps.catalog.async_views import get_customer, respond
+from apps.catalog.models import Product
+from apps.core.instrumentation import query_budget
+from .models import Cart, CartItem
+
+
+# Первое добавление создает и корзину, и позицию: каждый get_or_create - в своей точке сохранения
+@query_budget(13)
+async def add_to_cart(request, product_id):
+    user, customer = await get_customer(request)
+    if not user.is_authenticated:
+        return respond(request, messages.ERROR, 'Необходимо войти в систему', 'accounts:login', status=401)
+    if customer is None:
+        return respond(request, messages.ERROR, 'Только клиенты могут добавлять товары в корзину',
+                       'catalog:product_list', status=403)
+
+    product = await aget_object_or_404(Product, id=product_id, is_active=True, is_sold=False)
+    if product.quantity < 1:
+        return respond(request, messages.ERROR, 'Товар закончился',
+                       reverse('catalog:product_detail', args=[product.id]), status=409)
+
+    cart, _ = await Cart.objects.aget_or_create(customer=customer)
+    cart_item, created = await CartItem.objects.aget_or_create(
+        cart=cart,
+        product=product,
+        defaults={'price': product.price, 'quantity': 1}
+    )
+
+    if created:
+        level, message = messages.SUCCESS, f'Товар "{product.title}" добавлен в корзину'
+    elif cart_item.quantity < product.quantity:
+        cart_item.quantity += 1
+        cart_item.price = product.price
+        await cart_item.asave()
+        level, message = messages.SUCCESS, f'Количество товара "{product.title}" увеличено'
+    else:
+        level, message = messages.WARNING, f'Максимальное количество товара "{product.title}" уже в корзине'
+
+    return respond(request, level, message, 'orders:cart',
+                   quantity=cart_item.quantity, cart_count=await cart.items.acount())
+
+
+@query_budget(6)
+async def remove_from_cart(request, item_id):
+    user, customer = await get_customer(request)
+    if customer is None:
+        return respond(request, messages.ERROR, 'Необходимо войти в систему', 'accounts:login', status=401)
+
+    cart_item = await aget_object_or_404(
+        CartItem.objects.select_related('product', 'cart'), id=item_id, cart__customer=customer
+    )
+    await cart_item.adelete()
+    return respond(request, messages.SUCCESS, f'Товар "{cart_item.product.title}" удален из корзины', 'orders:cart',
+                   cart_count=await cart_item.cart.items.acount())
+
+
+@query_budget(6)
+async def update_cart_item(request, item_id):
+    user, customer = await get_customer(request)
+    if customer is None:
+        return respond(request, messages.ERROR, 'Необходимо войти в систему', 'accounts:login', status=401)
+
+    cart_item = await aget_object_or_404(
+        CartItem.objects.select_related('product', 'cart'), id=item_id, cart__customer=customer
+    )
+    quantity = int(request.POST.get('quantity', 1))
+
+    if quantity < 1:
+        await cart_item.adelete()
+        level, message, quantity = messages.SUCCESS, 'Товар удален из корзины', 0
+    elif quantity > cart_item.product.quantity:
+        level, message = messages.WARNING, f'Максимальное количество: {cart_item.product.quantity}'
+        quantity = cart_item.quantity
+    else:
+        cart_item.quantity = quantity
+        cart_item.price = cart_item.product.price
+        await cart_item.asave()
+        level, message = messages.SUCCESS, 'Количество обновлено'
+
+    return respond(request, level, message, 'orders:cart',
+                   quantity=quantity, cart_count=await cart_item.cart.items.acount())
@@ -56,6 +56,10 @@ class Payment(models.Model):
     class Meta:
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
+        indexes = [
+            # Фильтр по статусу в админке
+            models.Index(fields=['status'], name='payment_status_idx'),
+        ]
 
     def __str__(self):
         return f"Payment {self.id} - Order {self.order.id}"
@@ -79,9 +83,21 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['-created_at']
+        indexes = [
+            # Список заказов в админке: порядок по умолчанию, фильтр по статусу и date_hierarchy
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.customer.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему post_save понимает, что статус сменился
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
     
     def get_total_price(self):
         return sum(item.price * item.quantity for item in self.items.all())
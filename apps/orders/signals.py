@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from apps.accounts.models import Customer
+from apps.core import events, notifications
+from apps.core.models import NotificationType
+from .models import Order
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or previous is None or previous == instance.status:
+        return
+
+    user_id = Customer.objects.filter(pk=instance.customer_id).values_list('user_id', flat=True).get()
+    label = instance.get_status_display()
+    notifications.notify(
+        user_id, NotificationType.ORDER_STATUS, f'Заказ #{instance.pk}: {label.lower()}',
+        link=reverse('orders:order_detail', args=[instance.pk]),
+    )
+    data = {'order': instance.pk, 'status': instance.status, 'label': label, 'previous': previous}
+    transaction.on_commit(lambda: events.publish(user_id, 'order_status', data))
@@ -1,3 +1,163 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.core.testing import (
+    QueryBudgetMixin, TempMediaMixin, make_brand, make_customer, make_product, make_seller, views_urlconf,
+)
+from apps.catalog.models import Product
+from apps.core.models import Notification, NotificationType
+from .models import Cart, CartItem, Order, OrderItem, OrderStatus, Payment, PaymentMethod, PaymentStatus
+
+
+class OrdersQueryBudgetTests(QueryBudgetMixin, TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = make_brand()
+        sellers = [make_seller() for _ in range(3)]
+        cls.products = [
+            make_product(seller=sellers[i % 3], brand=brand, quantity=5, images=2)
+            for i in range(12)
+        ]
+        cls.customer = make_customer()
+        cart = Cart.objects.create(customer=cls.customer)
+        cls.items = [
+            CartItem.objects.create(cart=cart, product=product, quantity=1, price=product.price)
+            for product in cls.products[:10]
+        ]
+        for _ in range(5):
+            order = Order.objects.create(customer=cls.customer)
+            for product in cls.products[:6]:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            Payment.objects.create(order=order, status=PaymentStatus.PENDING, method=PaymentMethod.CASH, amount=1)
+        cls.order = order
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.customer.user)
+
+    def test_cart(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('orders:cart')))
+
+    def test_cart_actions(self):
+        self.assertWithinQueryBudget(self.client.post(reverse('orders:add_to_cart', args=[self.products[0].pk])))
+        self.assertWithinQueryBudget(self.client.post(reverse('orders:add_to_cart', args=[self.products[-1].pk])))
+        self.assertWithinQueryBudget(
+            self.client.post(reverse('orders:update_cart_item', args=[self.items[1].pk]), {'quantity': 2})
+        )
+        self.assertWithinQueryBudget(self.client.post(reverse('orders:remove_from_cart', args=[self.items[2].pk])))
+
+    def test_checkout(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('orders:checkout')))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('orders:checkout'), {'payment_method': PaymentMethod.CREDIT_CARD})
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 6)
+
+        # Покупатель и три продавца: одно уведомление каждому, товары продавца - строками сообщения
+        notifications = Notification.objects.filter(notification_type=NotificationType.PRODUCT_SOLD)
+        self.assertEqual(notifications.count(), 3)
+        self.assertEqual(sorted(len(n.message.splitlines()) for n in notifications), [3, 3, 4])
+        self.assertTrue(Notification.objects.filter(
+            user=self.customer.user, notification_type=NotificationType.ORDER_CREATED,
+        ).exists())
+
+    def test_orders(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('orders:order_list')))
+        self.assertWithinQueryBudget(self.client.get(reverse('orders:order_detail', args=[self.order.pk])))
+
+
+class CheckoutStockTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.client.force_login(self.customer.user)
+
+    def add(self, product, quantity=1):
+        return CartItem.objects.create(cart=self.cart, product=product, quantity=quantity, price=product.price)
+
+    def checkout(self):
+        return self.client.post(reverse('orders:checkout'), {'payment_method': PaymentMethod.CASH})
+
+    def test_checkout_decrements_stock(self):
+        many = make_product(quantity=3)
+        last = make_product(quantity=1)
+        self.add(many, quantity=2)
+        self.add(last)
+        self.checkout()
+
+        many.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual((many.quantity, many.is_sold), (1, False))
+        self.assertEqual((last.quantity, last.is_sold), (0, True))
+        self.assertFalse(self.cart.items.exists())
+
+    def test_stock_taken_by_concurrent_order(self):
+        product = make_product(quantity=1)
+        self.add(product)
+        filter_products = Product.objects.filter
+
+        def sold_in_between(*args, **kwargs):
+            # Другой покупатель успевает купить товар после проверки корзины
+            Product.objects.get_queryset().filter(pk=product.pk).update(quantity=0, is_sold=True)
+            return filter_products(*args, **kwargs)
+
+        with mock.patch.object(Product.objects, 'filter', side_effect=sold_in_between):
+            response = self.checkout()
+
+        self.assertRedirects(response, reverse('orders:cart'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.filter(customer=self.customer).exists())
+        self.assertTrue(self.cart.items.exists())
+        self.assertFalse(OrderItem.objects.filter(product=product).exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+class OrderStatusEventsTests(TestCase):
+    def test_status_change_notifies_customer(self):
+        customer = make_customer()
+        order = Order.objects.create(customer=customer)
+        order = Order.objects.get(pk=order.pk)
+        order.status = OrderStatus.SHIPPED
+        with mock.patch('apps.core.events.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            order.save()
+            order.save()
+
+        publish.assert_called_once_with(customer.user_id, 'order_status', {
+            'order': order.pk, 'status': OrderStatus.SHIPPED, 'label': 'Отправлен', 'previous': OrderStatus.PENDING,
+        })
+        notification = Notification.objects.get(user=customer.user)
+        self.assertEqual(notification.notification_type, NotificationType.ORDER_STATUS)
+        self.assertEqual(notification.link, reverse('orders:order_detail', args=[order.pk]))
+
+
+@override_settings(ROOT_URLCONF=views_urlconf(use_async=True))
+class AsyncCartActionsTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = make_product(quantity=2)
+        cls.customer = make_customer()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.customer.user)
+
+    def post(self, name, pk, data=None):
+        response = self.client.post(reverse(name, args=[pk]), data, HTTP_ACCEPT='application/json')
+        self.assertWithinQueryBudget(response)
+        return response.json()
+
+    def test_add_update_remove(self):
+        self.assertEqual(self.post('orders:add_to_cart', self.product.pk)['quantity'], 1)
+        self.assertEqual(self.post('orders:add_to_cart', self.product.pk)['quantity'], 2)
+        data = self.post('orders:add_to_cart', self.product.pk)
+        self.assertEqual((data['quantity'], data['cart_count']), (2, 1))
+
+        item = CartItem.objects.get(cart__customer=self.customer)
+        self.assertEqual(self.post('orders:update_cart_item', item.pk, {'quantity': 5})['quantity'], 2)
+        self.assertEqual(self.post('orders:update_cart_item', item.pk, {'quantity': 1})['quantity'], 1)
+        self.assertEqual(self.post('orders:remove_from_cart', item.pk)['cart_count'], 0)
+
+    def test_redirects_without_json(self):
+        response = self.client.post(reverse('orders:add_to_cart', args=[self.product.pk]))
+        self.assertRedirects(response, reverse('orders:cart'), fetch_redirect_response=False)
@@ -1,23 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from .views import (
-    CartView,
-    add_to_cart,
-    remove_from_cart,
-    update_cart_item,
-    CheckoutView,
-    OrderListView,
-    OrderDetailView
-)
+from . import async_views, views
 
 app_name = 'orders'
 
-urlpatterns = [
-    path('cart/', CartView.as_view(), name='cart'),
-    path('cart/add/<int:product_id>/', add_to_cart, name='add_to_cart'),
-    path('cart/remove/<int:item_id>/', remove_from_cart, name='remove_from_cart'),
-    path('cart/update/<int:item_id>/', update_cart_item, name='update_cart_item'),
-    path('checkout/', CheckoutView.as_view(), name='checkout'),
-    path('orders/', OrderListView.as_view(), name='order_list'),
-    path('orders/<int:pk>/', OrderDetailView.as_view(), name='order_detail'),
-]
 
+def build_urlpatterns(use_async):
+    """Под ASGI (ASYNC_VIEWS=True) действия с корзиной обслуживаются асинхронными представлениями"""
+    module = async_views if use_async else views
+    return [
+        path('cart/', views.CartView.as_view(), name='cart'),
+        path('cart/add/<int:product_id>/', module.add_to_cart, name='add_to_cart'),
+        path('cart/remove/<int:item_id>/', module.remove_from_cart, name='remove_from_cart'),
+        path('cart/update/<int:item_id>/', module.update_cart_item, name='update_cart_item'),
+        path('checkout/', views.CheckoutView.as_view(), name='checkout'),
+        path('orders/', views.OrderListView.as_view(), name='order_list'),
+        path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order_detail'),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.ASYNC_VIEWS)
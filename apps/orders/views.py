@@ -3,9 +3,14 @@ from django.views.generic import ListView, DetailView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.db import transaction
-from django.urls import reverse_lazy
+from django.db.models import Case, F, Value, When
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from .models import Cart, CartItem, Order, OrderItem, Payment, PaymentStatus, OrderStatus
 from apps.catalog.models import Product
+from apps.core import notifications
+from apps.core.instrumentation import query_budget
+from apps.core.models import NotificationType
 from .forms import CheckoutForm
 
 
@@ -14,6 +19,23 @@ def get_or_create_cart(customer):
     return cart
 
 
+def notify_order_created(order, items, total_price):
+    """Покупателю - об оформлении, каждому продавцу - одно уведомление со списком его товаров"""
+    with notifications.batch() as batch:
+        batch.add(
+            order.customer.user_id, NotificationType.ORDER_CREATED,
+            f'Заказ #{order.pk} оформлен', f'Сумма заказа: {total_price} ₽',
+            link=reverse('orders:order_detail', args=[order.pk]),
+        )
+        for item in items:
+            batch.add(
+                item.product.seller.user_id, NotificationType.PRODUCT_SOLD,
+                f'Новый заказ #{order.pk}', f'{item.product.title} × {item.quantity}',
+                link=reverse('accounts:seller_dashboard'), key=order.pk,
+            )
+
+
+@query_budget(9)
 def add_to_cart(request, product_id):
     if not request.user.is_authenticated:
         messages.error(request, 'Необходимо войти в систему')
@@ -52,6 +74,7 @@ def add_to_cart(request, product_id):
     return redirect('orders:cart')
 
 
+@query_budget(6)
 def remove_from_cart(request, item_id):
     if not request.user.is_authenticated or not hasattr(request.user, 'customer'):
         messages.error(request, 'Необходимо войти в систему')
@@ -64,6 +87,7 @@ def remove_from_cart(request, item_id):
     return redirect('orders:cart')
 
 
+@query_budget(6)
 def update_cart_item(request, item_id):
     if not request.user.is_authenticated or not hasattr(request.user, 'customer'):
         messages.error(request, 'Необходимо войти в систему')
@@ -89,17 +113,18 @@ def update_cart_item(request, item_id):
 class CartView(LoginRequiredMixin, ListView):
     template_name = 'orders/cart.html'
     context_object_name = 'cart_items'
+    query_budget = 9
     
     def get_queryset(self):
         if hasattr(self.request.user, 'customer'):
-            cart = get_or_create_cart(self.request.user.customer)
-            return cart.items.select_related('product').prefetch_related('product__images')
+            self.cart = get_or_create_cart(self.request.user.customer)
+            return self.cart.items.select_related('product__brand').prefetch_related('product__images')
         return CartItem.objects.none()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if hasattr(self.request.user, 'customer'):
-            cart = get_or_create_cart(self.request.user.customer)
+            cart = self.cart
             context['cart'] = cart
             context['total_price'] = cart.get_total_price()
         return context
@@ -108,6 +133,7 @@ class CartView(LoginRequiredMixin, ListView):
 class CheckoutView(LoginRequiredMixin, FormView):
     form_class = CheckoutForm
     template_name = 'orders/checkout.html'
+    query_budget = 23
     
     def dispatch(self, request, *args, **kwargs):
         if not hasattr(request.user, 'customer'):
@@ -138,8 +164,9 @@ class CheckoutView(LoginRequiredMixin, FormView):
     def form_valid(self, form):
         customer = self.request.user.customer
         cart = get_or_create_cart(customer)
+        items = list(cart.items.select_related('product__seller'))
         
-        for item in cart.items.all():
+        for item in items:
             if item.product.quantity < item.quantity:
                 messages.error(
                     self.request,
@@ -153,24 +180,38 @@ class CheckoutView(LoginRequiredMixin, FormView):
                 )
                 return redirect('orders:cart')
         
+        # Списание остатка условным UPDATE: параллельный заказ не может увести товар в минус
+        for item in items:
+            reserved = Product.objects.filter(
+                pk=item.product_id, is_active=True, is_sold=False, quantity__gte=item.quantity
+            ).update(
+                quantity=F('quantity') - item.quantity,
+                is_sold=Case(When(quantity=item.quantity, then=Value(True)), default=Value(False)),
+                updated_at=timezone.now(),
+            )
+            if not reserved:
+                transaction.set_rollback(True)
+                messages.error(
+                    self.request,
+                    f'Товар "{item.product.title}" уже купили'
+                )
+                return redirect('orders:cart')
+        
         order = Order.objects.create(
             customer=customer,
             status=OrderStatus.PENDING
         )
         
-        for item in cart.items.all():
-            OrderItem.objects.create(
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 product=item.product,
                 quantity=item.quantity,
                 price=item.price
             )
-            item.product.quantity -= item.quantity
-            if item.product.quantity == 0:
-                item.product.is_sold = True
-            item.product.save()
-        
-        total_price = cart.get_total_price()
+            for item in items
+        ])
+        total_price = sum(item.price * item.quantity for item in items)
         Payment.objects.create(
             order=order,
             status=PaymentStatus.PENDING,
@@ -179,6 +220,7 @@ class CheckoutView(LoginRequiredMixin, FormView):
         )
         
         cart.items.all().delete()
+        notify_order_created(order, items, total_price)
         
         messages.success(self.request, f'Заказ #{order.id} успешно оформлен!')
         return redirect('orders:order_detail', pk=order.id)
@@ -190,12 +232,13 @@ class CheckoutView(LoginRequiredMixin, FormView):
 class OrderListView(LoginRequiredMixin, ListView):
     template_name = 'orders/order_list.html'
     context_object_name = 'orders'
+    query_budget = 9
     
     def get_queryset(self):
         if hasattr(self.request.user, 'customer'):
             return Order.objects.filter(
                 customer=self.request.user.customer
-            ).prefetch_related('items__product', 'payments').order_by('-created_at')
+            ).prefetch_related('items__product__images', 'payments').order_by('-created_at')
         return Order.objects.none()
     
     def get_context_data(self, **kwargs):
@@ -208,12 +251,13 @@ class OrderDetailView(LoginRequiredMixin, DetailView):
     model = Order
     template_name = 'orders/order_detail.html'
     context_object_name = 'order'
+    query_budget = 10
     
     def get_queryset(self):
         if hasattr(self.request.user, 'customer'):
             return Order.objects.filter(
                 customer=self.request.user.customer
-            ).prefetch_related('items__product__images', 'payments')
+            ).prefetch_related('items__product__brand', 'items__product__images', 'payments')
         return Order.objects.none()
     
     def get_context_data(self, **kwargs):
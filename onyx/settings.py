@@ -52,10 +52,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.middleware.PrimaryReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,12 +68,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'apps.core.context_processors.notifications',
+            ],
+            # Шаблоны компилируются один раз на процесс; при DEBUG автоперезагрузка
+            # сбрасывает кеш при изменении файлов
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -79,15 +89,150 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'onyx.wsgi.application'
 
+# Асинхронные представления каталога и корзины; включать при запуске под ASGI (onyx.asgi)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Доставка событий в поток SSE (apps.core.events): InMemoryBroker - в пределах процесса,
+# RedisBroker - между процессами (pip install "onyx[redis]")
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'apps.core.events.InMemoryBroker')
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+
+# Кеш Django. Версия справочников и счетчики непрочитанных уведомлений хранятся в нем,
+# поэтому при нескольких процессах нужен общий кеш (pip install "onyx[redis]",
+# CACHE_REDIS_URL); LocMemCache у каждого процесса свой и подходит для одного процесса
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль SQLite для продакшена: WAL позволяет читателям не ждать писателя,
+# BEGIN IMMEDIATE берет блокировку записи в начале транзакции (оформление заказа),
+# а не при первом UPDATE, когда ожидание уже невозможно.
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-65536;'  # 64 МБ
+        'PRAGMA mmap_size=268435456;'  # 256 МБ
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 5,  # busy_timeout, секунды
+}
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+DB_PROFILE = os.getenv('DB_PROFILE', 'default')
+
+if DB_ENGINE == 'postgresql':
+    # Встроенный пул соединений psycopg (pip install "onyx[postgres]"),
+    # CONN_MAX_AGE при этом должен оставаться 0
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'onyx'),
+            'USER': os.getenv('DB_USER', 'onyx'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+                },
+            },
+        }
+    }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
+    if DB_PROFILE == 'production':
+        DATABASES['default'].update({
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+        })
+    # Локальная реплика: второй файл SQLite, например скопированный с основного
+    if os.getenv('DB_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': BASE_DIR / os.getenv('DB_REPLICA_NAME'),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Чтения каталога и аналитики уходят на реплику, запись и корзина - на основную базу.
+# После записи пользователь читает с основной базы REPLICA_PIN_SECONDS секунд.
+REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+DATABASE_ROUTERS = ['apps.core.routers.PrimaryReplicaRouter']
+
+
+# Хранение сессий:
+# db - чтение и запись строки django_session на каждый запрос с сессией;
+# cached_db - чтение из кеша, в базу уходит только запись. Только с общим кешем
+#   (CACHE_REDIS_URL): с LocMemCache выход удаляет сессию из кеша одного процесса,
+#   а остальные продолжают считать пользователя вошедшим до истечения сессии;
+# cookie - подписанная cookie без обращений к базе и кешу: данные сессии видны
+#   клиенту, но не подделываются, а выход не отзывает уже выданные cookie
+SESSION_PROFILE = os.getenv('SESSION_PROFILE', 'cached_db' if CACHE_REDIS_URL else 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_PROFILE]
+
+# Сообщения после редиректа (корзина, избранное, вход) живут в cookie и не трогают сессию
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Учет SQL-запросов и времени рендеринга на каждый запрос (заголовок Server-Timing и лог onyx.queries)
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', str(DEBUG)) == 'True'
+
+# Время рендеринга по каждому шаблону и include (требует QUERY_INSTRUMENTATION)
+TEMPLATE_PROFILING = os.getenv('TEMPLATE_PROFILING', 'False') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'onyx.queries': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'onyx.templates': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -132,10 +277,28 @@ LOGOUT_REDIRECT_URL = 'accounts:login'
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'apps.core.storage.StaticStorage'},
+    # Изображения товаров: имя по хешу содержимого, дубликаты хранятся один раз
+    'product_images': {'BACKEND': 'apps.core.storage.ContentAddressedStorage'},
+}
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Без DEBUG статику и медиа отдают apps.core.views. Файлы с хешем в имени кешируются
+# на год с immutable, остальные - на STATIC_CACHE_MAX_AGE секунд.
+STATIC_CACHE_MAX_AGE = int(os.getenv('STATIC_CACHE_MAX_AGE', '3600'))
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', '86400'))
+# django - файл отдает Django (Range, sendfile под gunicorn);
+# x-accel-redirect - nginx, internal location MEDIA_ACCEL_PREFIX смотрит в MEDIA_ROOT;
+# x-sendfile - Apache mod_xsendfile или lighttpd
+MEDIA_SERVING = os.getenv('MEDIA_SERVING', 'django')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 
 # Django Unfold Settings
 # https://github.com/unfoldadmin/django-unfold
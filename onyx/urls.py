@@ -15,11 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.shortcuts import redirect
 
+from apps.core.views import MediaFileView, StaticFileView
+
 def home_view(request):
     """Главная страница - редирект на каталог"""
     return redirect('catalog:product_list')
@@ -32,7 +36,10 @@ urlpatterns = [
     path('', home_view, name='home'),
 ]
 
-# Добавляем поддержку медиа файлов в режиме разработки
+# В режиме разработки статика берется из приложений без collectstatic,
+# иначе - из STATIC_ROOT со сжатыми копиями и долгим кешированием
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    urlpatterns += staticfiles_urlpatterns()
+else:
+    urlpatterns.append(re_path(rf'^{re.escape(settings.STATIC_URL.lstrip("/"))}(?P<path>.+)$', StaticFileView.as_view()))
+urlpatterns.append(re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$', MediaFileView.as_view()))
@@ -0,0 +1,31 @@
+// Живые уведомления: поток SSE обновляет значок непрочитанных и статусы заказов на странице
+(function () {
+    var script = document.currentScript;
+    if (!window.EventSource || !script) {
+        return;
+    }
+    var badge = document.querySelector('[data-unread-badge]');
+    var unread = badge ? parseInt(badge.textContent, 10) || 0 : 0;
+
+    function setUnread(count) {
+        unread = count;
+        if (badge) {
+            badge.textContent = count;
+            badge.hidden = count === 0;
+        }
+    }
+
+    var source = new EventSource(script.dataset.stream);
+    source.addEventListener('unread', function (event) {
+        setUnread(JSON.parse(event.data).count);
+    });
+    source.addEventListener('notification', function () {
+        setUnread(unread + 1);
+    });
+    source.addEventListener('order_status', function (event) {
+        var data = JSON.parse(event.data);
+        document.querySelectorAll('[data-order-status="' + data.order + '"]').forEach(function (element) {
+            element.textContent = data.label;
+        });
+    });
+})();